@@ -0,0 +1,70 @@
+import json
+import os
+import numpy as np
+
+# --- FORMAT ---
+# MAGIC (8 bytes) | header length (uint64 LE) | JSON header | arrays, each 64-byte aligned
+# The header holds free-form `meta` plus {name: {dtype, shape, offset}} for every array.
+MAGIC = b"NXTARR01"
+ALIGN = 64
+
+def _pad(n):
+    return (-n) % ALIGN
+
+def save_arrays(path, arrays, meta=None):
+    """
+    Writes {name: ndarray} (+ JSON-able meta) to `path`.
+    Goes through a temp file + os.replace, so readers never see a half-written file.
+    """
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+
+    # Offsets are relative to the end of the header block
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    header = json.dumps({"meta": meta or {}, "arrays": layout}).encode()
+    preamble = len(MAGIC) + 8 + len(header)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        f.write(b"\0" * _pad(preamble))
+        for arr in arrays.values():
+            f.write(arr.tobytes())
+            f.write(b"\0" * _pad(arr.nbytes))
+    os.replace(tmp_path, path)
+
+def load_arrays(path, mmap=True):
+    """
+    Returns ({name: ndarray}, meta). With mmap the arrays are read-only views
+    into the page cache, so loading costs O(header) and is shared between processes.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array file")
+        header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_len))
+        preamble = len(MAGIC) + 8 + header_len
+        raw = None if mmap else f.read()
+
+    if mmap:
+        buf = np.memmap(path, dtype=np.uint8, mode='r')
+        base = preamble + _pad(preamble)
+    else:
+        # raw starts right after the header, before its alignment padding
+        buf = np.frombuffer(raw, dtype=np.uint8)
+        base = _pad(preamble)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        start = base + spec["offset"]
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        arrays[name] = buf[start:start + nbytes].view(dtype).reshape(shape)
+    return arrays, header["meta"]
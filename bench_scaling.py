@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import synthetic_catalog
+from pair_store import PairStore, PAIRS_FILE, IMPORTED
+from compute_recommendations import METRICS_FILE, MIN_RECALL
+
+# Scaling benchmark: runs the offline pipeline on synthetic catalogs of growing size,
+# recording wall time and peak RSS per stage, and writes everything to one JSON file.
+# compute_recommendations and web_lookup rows carry the recall@25 of the recommendations
+# they timed; an lsh run below MIN_RECALL is reported as rejected, without timings.
+#   python bench_scaling.py --sizes 10000 100000 --output bench_results.json
+#   python bench_scaling.py --compare bench_results.json --output bench_new.json
+
+# --- CONFIG ---
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10000, 100000, 1000000]
+EXACT_LIMIT = 50000      # Above this, compute_recommendations runs the lsh engine
+TRAINING_PAIRS = 20000   # Synthetic labelled pairs for train_weights
+LOOKUPS = 20000          # Web lookups timed per size
+LOOKUP_RESULT = "web_lookup.json"  # Written by the --lookup-worker child in the workdir
+# train_weights is timed on random labels, which fit meaningless weights; the stages after
+# it score with the repo's own weights (when present) so recall reflects real use
+SCORING_WEIGHTS = os.path.join(REPO_DIR, "learned_weights.pkl")
+REGRESSION_RATIO = 1.25  # --compare flags stages that got this much slower / bigger
+
+STAGES = [
+    ("keyword_weigher", ["keyword_weigher.py"]),
+    ("movie_vectorizer", ["movie_vectorizer.py"]),
+    ("train_weights", ["train_weights.py"]),
+    ("compute_recommendations", ["compute_recommendations.py"]),
+]
+
+def run_stage(name, args, workdir):
+    """Runs one pipeline script in `workdir`; returns seconds, peak RSS (MB) and status."""
+    log_path = os.path.join(workdir, f"{name}.log")
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, args[0])] + args[1:],
+                                cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives this child's own rusage (RUSAGE_CHILDREN would be the max so far)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+    return {"stage": name, "seconds": round(seconds, 3), "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+            "status": "ok" if proc.returncode == 0 else f"failed ({proc.returncode}), see {log_path}"}
+
+def write_training_pairs(path, size, count, seed=0):
+    rng = random.Random(seed)
+    with PairStore(path) as store:
+        for target in (0, 1):
+            store.add([(rng.randint(1, size), rng.randint(1, size)) for _ in range(count // 2)], target, IMPORTED)
+
+def compute_recall(workdir, engine):
+    """recall@25 of the run's recommendations: 1.0 for the exact engine, else the sampled one (None if unmeasured)."""
+    if engine != "lsh":
+        return 1.0
+    try:
+        with open(os.path.join(workdir, METRICS_FILE), 'r') as f:
+            counters = json.load(f)["counters"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if not counters.get("recall_expected"):
+        return None
+    return round(counters["recall_found"] / counters["recall_expected"], 4)
+
+def reject_timings(result, recall):
+    """Strips the timings of a run whose recommendations aren't good enough to time."""
+    for metric in ("seconds", "max_rss_mb"):
+        result.pop(metric, None)
+    measured = "not measured" if recall is None else f"{recall} < {MIN_RECALL}"
+    result["status"] = f"rejected (recall {measured}), timings not reported"
+    return result
+
+def lookup_worker(lookups, seed=0):
+    """
+    Child side of bench_web_lookups, run in the workdir: TopKStore lookups (the app's
+    hot path) against the artifact this run produced. Results go to LOOKUP_RESULT.
+    """
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sys.path.insert(0, os.path.join(REPO_DIR, "web"))
+    from topk_store import TopKStore
+
+    start = time.perf_counter()
+    store = TopKStore("recommendations.bin")
+    open_ms = (time.perf_counter() - start) * 1000
+
+    ids = np.asarray(store.source_ids)
+    rng = np.random.default_rng(seed)
+    samples = []
+    for source_id in rng.choice(ids, size=min(lookups, max(len(ids), 1))).tolist():
+        t = time.perf_counter()
+        store.lookup(source_id, 10)
+        samples.append((time.perf_counter() - t) * 1e6)
+    samples = np.array(samples)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(LOOKUP_RESULT, 'w') as f:
+        json.dump({"open_ms": round(open_ms, 3),
+                   "p50_us": round(float(np.percentile(samples, 50)), 2),
+                   "p99_us": round(float(np.percentile(samples, 99)), 2),
+                   # Peak growth past the interpreter + numpy baseline: the store's own footprint
+                   "store_rss_mb": round((peak_kb - base_kb) / 1024, 1)}, f)
+
+def bench_web_lookups(workdir, lookups):
+    """Lookup latency and peak RSS of the serving path, in a child process like the other stages."""
+    if not os.path.exists(os.path.join(workdir, "recommendations.bin")):
+        return {"stage": "web_lookup", "status": "skipped (no recommendations.bin)"}
+    result = run_stage("web_lookup", ["bench_scaling.py", "--lookup-worker", "--lookups", str(lookups)], workdir)
+    if result["status"] == "ok":
+        with open(os.path.join(workdir, LOOKUP_RESULT), 'r') as f:
+            result.update(json.load(f))
+    return result
+
+def bench_size(size, profile, keep, lookups=LOOKUPS):
+    workdir = tempfile.mkdtemp(prefix=f"nxt_bench_{size}_")
+    results = []
+    try:
+        start = time.perf_counter()
+        synthetic_catalog.write_catalog(os.path.join(workdir, "tmdb_10k_movies_detailed.ndjson"), size, profile)
+        results.append({"stage": "generate", "status": "ok", "seconds": round(time.perf_counter() - start, 3)})
+        write_training_pairs(os.path.join(workdir, PAIRS_FILE), size, TRAINING_PAIRS)
+
+        engine = "lsh" if size > EXACT_LIMIT else "sparse"
+        recall = None
+        for name, args in STAGES:
+            if name == "compute_recommendations":
+                args = args + ["--engine", engine]
+            result = run_stage(name, args, workdir)
+            if name == "compute_recommendations":
+                recall = compute_recall(workdir, engine)
+                result.update(engine=engine, recall=recall)
+                if recall is None or recall < MIN_RECALL:
+                    reject_timings(result, recall)
+            results.append(result)
+            print(f"  {name}: {result}")
+            if result["status"] != "ok":
+                break
+            if name == "train_weights" and os.path.exists(SCORING_WEIGHTS):
+                shutil.copy(SCORING_WEIGHTS, os.path.join(workdir, "learned_weights.pkl"))
+        else:
+            result = bench_web_lookups(workdir, lookups)
+            result["recall"] = recall
+            results.append(result)
+            print(f"  web_lookup: {result}")
+    finally:
+        if keep:
+            print(f"  Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return [dict(r, size=size) for r in results]
+
+def compare(old_path, new):
+    """Prints stages whose time or memory grew by more than REGRESSION_RATIO."""
+    with open(old_path, 'r') as f:
+        old = {(r["size"], r["stage"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in new["results"]:
+        prev = old.get((r["size"], r["stage"]))
+        if not prev:
+            continue
+        for metric in ("seconds", "max_rss_mb", "store_rss_mb", "p99_us"):
+            if metric in r and prev.get(metric):
+                ratio = r[metric] / prev[metric]
+                flag = "REGRESSION" if ratio > REGRESSION_RATIO else ""
+                regressions += bool(flag)
+                print(f"{r['size']:>8} {r['stage']:<24} {metric:<10} {prev[metric]:>10} -> {r[metric]:>10} "
+                      f"({ratio:.2f}x) {flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline scaling benchmark on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--profile", default=synthetic_catalog.REAL_FILE,
+                        help="Crawl to fit cardinalities from (built-in profile if missing)")
+    parser.add_argument("--compare", help="Previous results JSON to check for regressions")
+    parser.add_argument("--keep", action="store_true", help="Keep each size's working directory")
+    parser.add_argument("--lookups", type=int, default=LOOKUPS, help="Web lookups timed per size")
+    parser.add_argument("--lookup-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.lookup_worker:
+        lookup_worker(args.lookups)
+        return
+
+    profile = synthetic_catalog.load_profile(args.profile)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "profile_ref_size": profile["ref_size"],
+            "exact_limit": EXACT_LIMIT,
+            "min_recall": MIN_RECALL,
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        print(f"Size {size}:")
+        report["results"].extend(bench_size(size, profile, args.keep, args.lookups))
+        # Written after every size, so a long run that dies still leaves data behind
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"Results written to {args.output}")
+    if args.compare:
+        regressions = compare(args.compare, report)
+        print(f"{regressions} regression(s) above {REGRESSION_RATIO}x")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
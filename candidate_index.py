@@ -0,0 +1,110 @@
+import numpy as np
+
+# Bit per token group, OR-ed together for every candidate that shares a token
+GENRE, KEYWORD, CAST, DIRECTOR = 1, 2, 4, 8
+FIELDS = {KEYWORD: 'keywords', CAST: 'cast', DIRECTOR: 'directors'}  # Token groups held as store ID slices
+
+def _ratio(x, y):
+    hi = max(x, y)
+    return min(x, y) / hi if hi > 0 else 0.0
+
+def _postings(tokens, rows, n_tokens):
+    """Inverted CSR (ptr, rows): rows holding token t are rows[ptr[t]:ptr[t + 1]]."""
+    order = np.argsort(tokens, kind='stable')
+    ptr = np.zeros(n_tokens + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(tokens, minlength=n_tokens))
+    return ptr, rows[order]
+
+class CandidateIndex:
+    """
+    Inverted index token -> store rows over genres, keywords, cast and directors, built
+    from the MovieStore's columns (token IDs, genre bits). Only movies sharing at least
+    one token with the source are candidates, and each candidate gets a cheap upper
+    bound on its final score so the heap loop can stop before calling FeatureExtractor
+    on pairs that cannot make the Top-K. Movies are store row indices throughout.
+    """
+    def __init__(self, store, extractor):
+        self.store = store
+        self.extractor = extractor
+        n = len(store)
+        genres = np.asarray(store.genres, dtype=np.uint64)
+        self.genres = genres.tolist()
+        self.year = store.year.tolist()
+        self.rating = store.rating.tolist()
+
+        # Genre bits are the genre "tokens"
+        n_genres = len(store.genre_vocab)
+        bit_rows = [np.nonzero((genres >> np.uint64(b)) & np.uint64(1))[0] for b in range(n_genres)]
+        self.postings = {GENRE: _postings(np.repeat(np.arange(n_genres), [len(r) for r in bit_rows]),
+                                          np.concatenate(bit_rows) if bit_rows else np.zeros(0, dtype=np.int64),
+                                          n_genres)}
+        # Per-movie sizes the bounds are built from
+        masses = {}
+        for bit, field in FIELDS.items():
+            indptr = store.arrays[f'{field}.indptr']
+            tokens = store.arrays[f'{field}.ids']
+            rows = np.repeat(np.arange(n), np.diff(indptr))
+            self.postings[bit] = _postings(tokens, rows, len(store.vocab[field]))
+            if field == 'keywords':
+                kw_w = np.array(extractor.store_keyword_weights(store), dtype=np.float64)  # per keyword ID
+                masses[bit] = np.bincount(rows, weights=kw_w[tokens], minlength=n)
+            elif field == 'cast':
+                masses[bit] = np.bincount(rows, weights=store.cast_scores, minlength=n)
+            else:
+                masses[bit] = np.diff(indptr)
+        n_genre = [g.bit_count() for g in self.genres]
+        self.sizes = list(zip(n_genre, masses[KEYWORD].tolist(), masses[CAST].tolist(), masses[DIRECTOR].tolist()))
+
+    def _tokens(self, bit, row):
+        if bit == GENRE:
+            return [b for b in range(len(self.store.genre_vocab)) if (self.genres[row] >> b) & 1]
+        return self.store.tokens(FIELDS[bit], row).tolist()
+
+    def candidates(self, source_row, genre_filter=True):
+        """
+        Returns {target_row: group_mask} for every movie sharing a token with the source.
+        With genre_filter only genre-sharing targets are kept (same pruning as before).
+        """
+        rows, bits = [], []
+        for bit, (ptr, posting_rows) in self.postings.items():
+            for token in self._tokens(bit, source_row):
+                hit = posting_rows[ptr[token]:ptr[token + 1]]
+                rows.append(hit)
+                bits.append(np.full(len(hit), bit, dtype=np.int8))
+        if not rows:
+            return {}
+        rows = np.concatenate(rows)
+        order = np.argsort(rows, kind='stable')
+        rows, bits = rows[order], np.concatenate(bits)[order]
+        targets, starts = np.unique(rows, return_index=True)
+        masks = np.bitwise_or.reduceat(bits, starts)
+        keep = targets != source_row
+        if genre_filter:
+            keep &= (masks & GENRE) != 0
+        return dict(zip(targets[keep].tolist(), masks[keep].tolist()))
+
+    def upper_bound(self, source_row, target_row, mask, weights):
+        """
+        Upper bound on the weighted score, `weights` in feature order.
+        Set features use |A∩B| <= min and |A∪B| >= max (weighted the same way);
+        Year and Rating are cheap enough to use exactly.
+        """
+        w_genre, w_key, w_cast, w_dir, w_year, w_rate = weights
+        a = self.sizes[source_row]
+        b = self.sizes[target_row]
+
+        bound = (
+            w_year * self.extractor.year_similarity(self.year[source_row], self.year[target_row]) +
+            w_rate * self.extractor.rating_similarity(self.rating[source_row], self.rating[target_row])
+        )
+        if mask & GENRE:
+            bound += w_genre * _ratio(a[0], b[0])
+        if mask & KEYWORD:
+            bound += w_key * _ratio(a[1], b[1])
+        if mask & CAST:
+            # sum over shared of (a+b)/2 <= (mass_A + mass_B)/2, sum of max >= max mass
+            hi = max(a[2], b[2])
+            bound += w_cast * min(1.0, (a[2] + b[2]) / (2 * hi)) if hi > 0 else 0.0
+        if mask & DIRECTOR:
+            bound += w_dir * _ratio(a[3], b[3])
+        return bound
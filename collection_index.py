@@ -0,0 +1,148 @@
+import argparse
+import os
+from itertools import combinations
+import numpy as np
+from array_file import save_arrays, load_arrays
+from ndjson_io import iter_records, resolve
+from tmdb_cache import ResponseCache, CACHE_FILE
+from tmdb_client import MOVIE_DETAILS_PARAMS
+
+# Franchise (TMDB collection) membership of every crawled movie, as sorted arrays.
+# load_complete_data.py keeps `collection_id` from the /movie/{id} response it already
+# downloads; records crawled before that are backfilled from the response cache, so
+# building the index never sends a request.
+#   python collection_index.py   (after load_complete_data.py)
+
+# --- CONFIG ---
+INPUT_FILE = "tmdb_10k_movies_detailed.ndjson"
+OUTPUT_FILE = "collection_index.bin"
+NO_COLLECTION = -1
+
+def cached_collection(movie_id, cache):
+    """
+    (known, collection ID or None) from a cached /movie/{id} response, for records that
+    predate `collection_id`. Never fetches: an uncached movie is simply unknown.
+    """
+    entry = cache.peek(f"/movie/{movie_id}", MOVIE_DETAILS_PARAMS)
+    if entry is None or entry['status'] != 200 or entry['body'] is None:
+        return False, None
+    collection = entry['body'].get('belongs_to_collection')
+    return True, collection['id'] if collection else None
+
+class CollectionIndex:
+    """
+    movie ID -> collection ID and collection ID -> member IDs, both binary searches
+    over memory-mappable arrays. Only movies that belong to a collection are stored.
+    - ids / collection: movie IDs (sorted) and their collection IDs
+    - collections / ptr / members: members of each collection (sorted), CSR style
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.ids = arrays['ids']
+        self.collection = arrays['collection']
+        self.collections = arrays['collections']
+        self.ptr = arrays['ptr']
+        self.members_flat = arrays['members']
+
+    @classmethod
+    def from_membership(cls, membership):
+        """Builds the index from {movie_id: collection_id or None}."""
+        pairs = sorted((mid, cid) for mid, cid in membership.items() if cid is not None)
+        ids = np.array([mid for mid, _ in pairs], dtype=np.int64)
+        collection = np.array([cid for _, cid in pairs], dtype=np.int64)
+
+        by_collection = np.lexsort((ids, collection))
+        collections, starts = np.unique(collection[by_collection], return_index=True)
+        ptr = np.append(starts, len(ids)).astype(np.int64)
+        return cls({
+            'ids': ids,
+            'collection': collection,
+            'collections': collections.astype(np.int64),
+            'ptr': ptr,
+            'members': ids[by_collection],
+        })
+
+    @classmethod
+    def from_crawl(cls, path=INPUT_FILE, cache=None):
+        """
+        Scans the crawl (duplicate IDs: last copy wins). Records without `collection_id`
+        are looked up in `cache` (a tmdb_cache.ResponseCache) when one is given.
+        Returns (index, stats).
+        """
+        membership = {}
+        stats = {"movies": 0, "backfilled": 0, "unknown": 0}
+        for m in iter_records(resolve(path)):
+            if 'collection_id' in m:
+                membership[m['id']] = m['collection_id']
+                continue
+            known, cid = cached_collection(m['id'], cache) if cache is not None else (False, None)
+            membership[m['id']] = cid
+            stats["backfilled" if known else "unknown"] += 1
+        stats["movies"] = len(membership)
+        return cls.from_membership(membership), stats
+
+    def save(self, path=OUTPUT_FILE):
+        save_arrays(path, self.arrays, meta={"kind": "collection_index", "collections": len(self)})
+
+    @classmethod
+    def load(cls, path=OUTPUT_FILE, mmap=True):
+        arrays, meta = load_arrays(path, mmap=mmap)
+        if meta.get("kind") != "collection_index":
+            raise ValueError(f"{path} is not a collection index")
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.collections)
+
+    # --- LOOKUPS ---
+    def collections_of(self, movie_ids):
+        """Collection ID of every movie in `movie_ids` (NO_COLLECTION for none), vectorized."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        out = np.full(movie_ids.shape, NO_COLLECTION, dtype=np.int64)
+        if not len(self.ids):
+            return out
+        pos = np.minimum(np.searchsorted(self.ids, movie_ids), len(self.ids) - 1)
+        found = self.ids[pos] == movie_ids
+        out[found] = self.collection[pos[found]]
+        return out
+
+    def collection_of(self, movie_id):
+        cid = int(self.collections_of([movie_id])[0])
+        return None if cid == NO_COLLECTION else cid
+
+    def same_collection(self, ids_a, ids_b):
+        """Boolean array: does pair i belong to one collection? (For scoring pair batches.)"""
+        a = self.collections_of(ids_a)
+        return (a == self.collections_of(ids_b)) & (a != NO_COLLECTION)
+
+    def members(self, collection_id):
+        i = int(np.searchsorted(self.collections, collection_id))
+        if i == len(self.collections) or self.collections[i] != collection_id:
+            return self.members_flat[:0]
+        return self.members_flat[self.ptr[i]:self.ptr[i + 1]]
+
+    def pairs(self):
+        """Every unordered (id_A, id_B) pair of movies sharing a collection, id_A < id_B."""
+        for i in range(len(self.collections)):
+            yield from combinations(self.members_flat[self.ptr[i]:self.ptr[i + 1]].tolist(), 2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index TMDB collection membership of the crawled movies.")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Don't backfill old records from the TMDB response cache")
+    args = parser.parse_args()
+
+    if not os.path.exists(resolve(args.input)):
+        print(f"Error: {args.input} not found. Run load_complete_data.py first.")
+    else:
+        use_cache = not args.no_cache and os.path.exists(CACHE_FILE)
+        cache = ResponseCache() if use_cache else None
+        index, stats = CollectionIndex.from_crawl(args.input, cache)
+        index.save(args.output)
+        if stats["unknown"]:
+            print(f"Warning: {stats['unknown']} movies predate collection_id and aren't in the response cache "
+                  f"(treated as belonging to no collection).")
+        print(f"SUCCESS: {len(index)} collections over {len(index.ids)}/{stats['movies']} movies "
+              f"({stats['backfilled']} backfilled from cache) saved to {args.output}")
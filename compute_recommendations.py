@@ -1,40 +1,79 @@
 import sqlite3
 import pickle
+import argparse
+import hashlib
+import json
+from collections import defaultdict
+import multiprocessing as mp
 import pandas as pd
 import numpy as np
 import time
 import heapq
+import os
 from feature_extractor import FeatureExtractor
+from sparse_scorer import SparseScorer, FEATURE_NAMES
+from movie_store import MovieStore
+from array_file import save_arrays
+import recs_db
+from candidate_index import CandidateIndex
+import shared_catalog
+from lsh_index import MinHashLSH, token_sets, genre_neighbour_pairs, merge_pairs, LSH_BANDS, LSH_ROWS, GENRE_WINDOWS
+from metrics import Metrics, profiled
 
 # --- CONFIG ---
 MOVIES_FILE = "movie_vectors.pkl"
+STORE_FILE = "movie_store.bin"  # Preferred over MOVIES_FILE when present
 WEIGHTS_FILE = "learned_weights.pkl"
 KEYWORD_W_FILE = "keyword_weights.pkl"
 DB_FILE = "recommendations.db"
+TOPK_FILE = "recommendations.bin"  # Memory-mapped copy of preds for the web app
 TOP_K = 25
+BLOCK_SIZE = 256  # Sources scored per matrix product (sparse engine)
+PAIR_CHUNK = 1 << 20  # Candidate pairs rescored per batch (lsh engine)
+RECALL_SAMPLE = 200   # Sources checked against the exact engine after an lsh run
+MIN_RECALL = 0.9      # An lsh build whose sampled recall@TOP_K is lower is discarded, not published
+METRICS_FILE = "precompute_metrics.json"  # Counters and timers of the last run
 
-def compute():
-    print("Loading resources...")
-    movies = pickle.load(open(MOVIES_FILE, "rb"))
-    learned_weights = pickle.load(open(WEIGHTS_FILE, "rb"))
-    keyword_weights = pickle.load(open(KEYWORD_W_FILE, "rb"))
-    
+# Filled in by the engines and compute()/update(); reset at the start of each run
+METRICS = Metrics()
+
+def record_heap_engine(considered, pruned, pruned_key, evaluated, pushes, replacements, feature_seconds):
+    """Adds one heap engine's local tallies (kept as plain ints in the hot loop) to METRICS."""
+    METRICS.add("pairs_considered", considered)
+    METRICS.add(pruned_key, pruned)
+    METRICS.add("feature_evaluations", evaluated)
+    METRICS.add("heap_pushes", pushes)
+    METRICS.add("heap_replacements", replacements)
+    for name, seconds in zip(FEATURE_NAMES, feature_seconds):
+        METRICS.add_time(f"feature.{name}", seconds, evaluated)
+
+def load_catalog():
+    """MovieStore from STORE_FILE (memory-mapped), or built from the pickled vectors."""
+    if os.path.exists(STORE_FILE):
+        return MovieStore.load(STORE_FILE)
+    return MovieStore.from_vectors(pickle.load(open(MOVIES_FILE, "rb")))
+
+def shares_token(store, i, j):
+    """Do store rows i and j share a genre, keyword, cast or director token?"""
+    if int(store.genres[i]) & int(store.genres[j]):
+        return True
+    return any(not set(store.tokens(field, i).tolist()).isdisjoint(store.tokens(field, j).tolist())
+               for field in MovieStore.SET_FIELDS)
+
+def python_top_k(store, learned_weights, keyword_weights, genre_filter=True):
+    """
+    Reference engine: nested loop over FeatureExtractor.
+    Yields (source_id, [(score, target_id), ...]) best first.
+    Without genre_filter (cross-genre discovery) a target only has to share any
+    genre/keyword/cast/director token with the source.
+    """
     extractor = FeatureExtractor(keyword_weights)
-    
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS preds")
-    c.execute("CREATE TABLE preds (source_id INTEGER, target_id INTEGER, score REAL)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_source ON preds (source_id)")
-    
-    print("Building lookup maps...")
-    movies_map = {m['id']: m for m in movies}
-    all_ids = list(movies_map.keys())
-    
-    print(f"Computing recommendations for {len(all_ids)} movies...")
-    start_time = time.time()
-    batch_data = []
-    
+
+    # Movies are store rows, scored straight from the columns
+    all_ids = store.ids.tolist()
+    genres = store.genres.tolist()
+    n = len(all_ids)
+
     # Pre-fetch weights for speed
     w_genre = learned_weights.get('Genres', 0)
     w_key = learned_weights.get('Keywords', 0)
@@ -43,26 +82,34 @@ def compute():
     w_year = learned_weights.get('Year', 0)
     w_rate = learned_weights.get('Rating', 0)
 
-    for i, source_id in enumerate(all_ids):
-        source_movie = movies_map[source_id]
-        
+    pruned_key = "pairs_pruned_genre" if genre_filter else "pairs_pruned_disjoint"
+    pruned = evaluated = pushes = replacements = 0
+    feature_seconds = [0.0] * len(FEATURE_NAMES)
+    for i in range(n):
+        source_id = all_ids[i]
+
         # The Min-Heap to store Top K
         # Stores tuples: (score, target_id)
         # We use a Min-Heap so heap[0] is always the lowest score we've accepted so far.
         top_k_heap = []
         
-        for target_id in all_ids:
-            if source_id == target_id: continue
-            
-            target_movie = movies_map[target_id]
-            
+        for j in range(n):
+            if i == j: continue
+            target_id = all_ids[j]
+
             # Optimization: Pre-filter (Genre Disjoint)
             # If genres don't overlap, score is usually too low to beat Top 20.
-            # (Remove this check if you want cross-genre discovery)
-            if not source_movie['genres'].intersection(target_movie['genres']):
+            # (Run with --cross-genre if you want cross-genre discovery)
+            if genre_filter:
+                if not genres[i] & genres[j]:
+                    pruned += 1
+                    continue
+            elif not shares_token(store, i, j):
+                pruned += 1
                 continue
 
-            feats = extractor.get_features(source_movie, target_movie)
+            feats = extractor.timed_features_by_index(store, i, j, feature_seconds)
+            evaluated += 1
             
             final_score = (
                 feats[0] * w_genre +
@@ -77,35 +124,524 @@ def compute():
             if len(top_k_heap) < TOP_K:
                 # If heap isn't full, just push
                 heapq.heappush(top_k_heap, (final_score, target_id))
+                pushes += 1
             else:
                 # If heap is full, check if new score is better than the worst in heap
                 if final_score > top_k_heap[0][0]:
                     # Replace the smallest element with this new one
                     heapq.heapreplace(top_k_heap, (final_score, target_id))
+                    replacements += 1
         
         # After loop, top_k_heap has the best items, but in heap order.
         # Sort them descending for final storage.
-        top_k_sorted = sorted(top_k_heap, key=lambda x: x[0], reverse=True)
-        
-        for score, tid in top_k_sorted:
-            # Threshold check: Don't save garbage even if it made the Top 20
-            
-            batch_data.append((source_id, tid, score))
-            if score < 0.05:
-                print("Found in top 25, score < 0.05")
-            
-        if len(batch_data) > 10000:
-            c.executemany("INSERT INTO preds VALUES (?,?,?)", batch_data)
+        yield source_id, sorted(top_k_heap, key=lambda x: x[0], reverse=True)
+
+    considered = n * (n - 1)
+    record_heap_engine(considered, pruned, pruned_key, evaluated, pushes, replacements, feature_seconds)
+
+def indexed_top_k(store, learned_weights, keyword_weights, genre_filter=True):
+    """
+    Heap loop over inverted-index candidates only, visited in order of their score
+    upper bound. Once the heap is full, the first candidate whose bound cannot beat
+    heap[0] ends the source: every later one has a lower bound still.
+    """
+    extractor = FeatureExtractor(keyword_weights)
+    all_ids = store.ids.tolist()
+
+    print("Building inverted index...")
+    index = CandidateIndex(store, extractor)
+    weights = [learned_weights.get(name, 0) for name in
+               ('Genres', 'Keywords', 'Cast', 'Director', 'Year', 'Rating')]
+
+    evaluated = 0
+    pruned = 0
+    n_candidates = pushes = replacements = 0
+    feature_seconds = [0.0] * len(FEATURE_NAMES)
+    for source_row, source_id in enumerate(all_ids):
+        candidates = index.candidates(source_row, genre_filter)
+        n_candidates += len(candidates)
+        # Ties on the bound are visited in descending movie ID order
+        bounded = sorted(
+            ((index.upper_bound(source_row, row, mask, weights), all_ids[row], row) for row, mask in candidates.items()),
+            reverse=True,
+        )
+
+        top_k_heap = []
+        for n_seen, (bound, target_id, target_row) in enumerate(bounded):
+            if len(top_k_heap) == TOP_K and bound + 1e-9 <= top_k_heap[0][0]:
+                pruned += len(bounded) - n_seen
+                break
+
+            feats = extractor.timed_features_by_index(store, source_row, target_row, feature_seconds)
+            evaluated += 1
+            final_score = sum(f * w for f, w in zip(feats, weights))
+
+            if len(top_k_heap) < TOP_K:
+                heapq.heappush(top_k_heap, (final_score, target_id))
+                pushes += 1
+            elif final_score > top_k_heap[0][0]:
+                heapq.heapreplace(top_k_heap, (final_score, target_id))
+                replacements += 1
+
+        yield source_id, sorted(top_k_heap, key=lambda x: x[0], reverse=True)
+
+    print(f"Feature evaluations: {evaluated} (skipped by score bound: {pruned})")
+    # Pairs outside the inverted-index candidates are the ones the filter drops
+    considered = len(all_ids) * (len(all_ids) - 1)
+    record_heap_engine(considered, considered - n_candidates,
+                       "pairs_pruned_genre" if genre_filter else "pairs_pruned_disjoint",
+                       evaluated, pushes, replacements, feature_seconds)
+    METRICS.add("pairs_pruned_bound", pruned)
+
+def sparse_top_k(store, learned_weights, keyword_weights, genre_filter=True, block_size=BLOCK_SIZE):
+    """
+    Vectorized engine: scores BLOCK_SIZE sources at a time with sparse matrix products.
+    Same output shape as python_top_k.
+    """
+    print("Encoding catalog as sparse matrices...")
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    scorer.metrics = METRICS
+    n = len(scorer.ids)
+    for start in range(0, n, block_size):
+        rows = np.arange(start, min(start + block_size, n))
+        yield from scorer.top_k(rows, learned_weights, TOP_K, genre_filter)
+
+def lsh_top_k(store, learned_weights, keyword_weights, genre_filter=True,
+              bands=LSH_BANDS, rows=LSH_ROWS, windows=GENRE_WINDOWS, recall_sample=RECALL_SAMPLE,
+              min_recall=MIN_RECALL):
+    """
+    Approximate engine: candidates are the union of MinHash/LSH collisions over keyword,
+    cast and director sets and genre/year neighbourhoods (lsh_index.py); they are then
+    rescored exactly with the learned weights (so every listed score is exact, but a
+    target that is never proposed is missed).
+    Measures recall@TOP_K against sparse_top_k on `recall_sample` random sources and
+    raises (so compute() discards the build) when it is below `min_recall`.
+    """
+    print("Encoding catalog as sparse matrices...")
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    scorer.metrics = METRICS
+    n = len(scorer.ids)
+
+    print(f"Building candidates (MinHash {bands} bands x {rows} rows, genre/year windows {tuple(windows)})...")
+    with METRICS.timer("lsh_candidates"):
+        lsh = MinHashLSH(*token_sets(store), bands=bands, rows=rows)
+        src, tgt = merge_pairs([lsh.candidate_pairs(), genre_neighbour_pairs(store, windows)], n)
+    print(f"{len(src)} candidate pairs ({len(src) / max(n, 1):.1f} per movie, exact: {n * (n - 1)})")
+
+    # Only the sampled sources' lists are kept for the recall check
+    sample = np.zeros(0, dtype=np.int64)
+    if recall_sample and n:
+        sample = np.sort(np.random.default_rng(0).choice(n, size=min(recall_sample, n), replace=False))
+    sampled = set(sample.tolist())
+    approx = {}
+
+    bounds = np.searchsorted(src, np.arange(n + 1))
+    row = 0
+    while row < n:
+        # Whole sources per chunk, so each source's list is ranked in one place
+        stop = int(np.searchsorted(bounds, bounds[row] + PAIR_CHUNK, side='right')) - 1
+        stop = min(max(stop, row + 1), n)
+        lo, hi = bounds[row], bounds[stop]
+        a, b = src[lo:hi], tgt[lo:hi]
+
+        feats = scorer.pair_features(a, b)
+        scores = SparseScorer.combine([feats[:, j] for j in range(feats.shape[1])], learned_weights)
+        if genre_filter:
+            keep = feats[:, 0] > 0
+        else:
+            keep = (feats[:, :4] > 0).any(axis=1)
+        METRICS.add("pairs_considered", len(keep))
+        METRICS.add("pairs_pruned_genre" if genre_filter else "pairs_pruned_disjoint", len(keep) - int(keep.sum()))
+        a, b, scores = a[keep], b[keep], scores[keep]
+
+        # Same ordering as the exact engines: score desc, then lower target ID
+        order = np.lexsort((scorer.ids[b], -scores, a))
+        a, b, scores = a[order], b[order], scores[order]
+        starts = np.searchsorted(a, np.arange(row, stop + 1))
+        for r in range(row, stop):
+            sel = slice(starts[r - row], min(starts[r + 1 - row], starts[r - row] + TOP_K))
+            top = [(float(sc), int(scorer.ids[t])) for sc, t in zip(scores[sel], b[sel])]
+            if r in sampled:
+                approx[r] = top
+            yield int(scorer.ids[r]), top
+        row = stop
+
+    if len(sample):
+        # The exact re-run is a check, not part of the build: keep it out of the counters
+        scorer.metrics = Metrics()
+        found = expected = 0
+        for source_id, exact in scorer.top_k(sample, learned_weights, TOP_K, genre_filter):
+            got = {tid for _, tid in approx[store.index[source_id]]}
+            found += sum(1 for _, tid in exact if tid in got)
+            expected += len(exact)
+        recall = found / expected if expected else 1.0
+        METRICS.add("recall_found", found)
+        METRICS.add("recall_expected", expected)
+        print(f"Recall@{TOP_K} vs exact on {len(sample)} sources: {recall:.3f}")
+        if recall < min_recall:
+            raise RuntimeError(f"lsh recall@{TOP_K} {recall:.3f} is below {min_recall}; build discarded. "
+                               f"Widen the genre windows or add bands, or use the sparse engine.")
+
+# --- MULTI-CORE ---
+# Worker state, set once per process by _init_worker
+# (the shared blocks must stay referenced for as long as the scorer is used)
+_worker_scorer = None
+_worker_blocks = None
+_worker_weights = None
+_worker_genre_filter = True
+
+def _init_worker(spec, learned_weights, genre_filter):
+    global _worker_scorer, _worker_blocks, _worker_weights, _worker_genre_filter
+    _worker_scorer, _worker_blocks = shared_catalog.attach_scorer(spec)
+    _worker_scorer.metrics = Metrics()
+    _worker_weights = learned_weights
+    _worker_genre_filter = genre_filter
+
+def _score_block(bounds):
+    # Each block's counters travel back with its lists and are merged into METRICS
+    rows = np.arange(*bounds)
+    block = list(_worker_scorer.top_k(rows, _worker_weights, TOP_K, _worker_genre_filter))
+    metrics = _worker_scorer.metrics.to_dict()
+    _worker_scorer.metrics.reset()
+    return block, metrics
+
+def parallel_top_k(store, learned_weights, keyword_weights, workers, genre_filter=True, block_size=BLOCK_SIZE):
+    """
+    Sparse engine over a process pool. The encoded catalog lives in shared memory
+    (built once here), workers only receive (start, stop) row ranges and send back
+    their Top-K lists. imap keeps source order, so rows match the single-process run.
+    """
+    print("Encoding catalog as sparse matrices...")
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    spec, blocks = shared_catalog.share_scorer(scorer)
+    n = len(scorer.ids)
+    del scorer
+
+    bounds = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+    try:
+        with mp.Pool(workers, initializer=_init_worker, initargs=(spec, learned_weights, genre_filter)) as pool:
+            for block, metrics in pool.imap(_score_block, bounds):
+                METRICS.merge(metrics)
+                yield from block
+    finally:
+        shared_catalog.release(blocks)
+
+ENGINES = {"python": python_top_k, "indexed": indexed_top_k, "sparse": sparse_top_k, "lsh": lsh_top_k}
+
+def compute(engine="sparse", workers=1, genre_filter=True, **engine_options):
+    METRICS.reset()
+    print("Loading resources...")
+    store = load_catalog()
+    learned_weights = pickle.load(open(WEIGHTS_FILE, "rb"))
+    keyword_weights = pickle.load(open(KEYWORD_W_FILE, "rb"))
+    
+    # Everything is written to a staging copy; the live DB_FILE is only replaced at the end
+    conn = recs_db.open_staging(DB_FILE)
+    c = conn.cursor()
+    recs_db.create_preds(conn)
+    
+    print(f"Computing recommendations for {len(store)} movies ({engine} engine, {workers} worker(s))...")
+    start_time = time.time()
+    batch_data = []
+    total_rows = 0
+    total_lists = 0
+
+    if workers > 1:
+        results = parallel_top_k(store, learned_weights, keyword_weights, workers, genre_filter)
+    else:
+        results = ENGINES[engine](store, learned_weights, keyword_weights, genre_filter, **engine_options)
+
+    try:
+        for i, (source_id, top_k_sorted) in enumerate(results):
+            for rank, (score, tid) in enumerate(top_k_sorted):
+                # Threshold check: Don't save garbage even if it made the Top 20
+
+                batch_data.append((source_id, rank, tid, score))
+                if score < 0.05:
+                    print("Found in top 25, score < 0.05")
+            if top_k_sorted:
+                total_lists += 1
+
+            if len(batch_data) > 10000:
+                with METRICS.timer("sqlite_write"):
+                    c.executemany("INSERT INTO preds VALUES (?,?,?,?)", batch_data)
+                total_rows += len(batch_data)
+                batch_data = []
+                print(f"Processed {i+1}/{len(store)} movies... ({(time.time()-start_time)/60:.1f} min)")
+
+        with METRICS.timer("sqlite_write"):
+            if batch_data:
+                c.executemany("INSERT INTO preds VALUES (?,?,?,?)", batch_data)
+                total_rows += len(batch_data)
             conn.commit()
-            batch_data = []
-            print(f"Processed {i+1}/{len(all_ids)} movies... ({(time.time()-start_time)/60:.1f} min)")
+        METRICS.add("rows_written", total_rows)
+        METRICS.add("lists_written", total_lists)
+        METRICS.add_time("score_loop", time.time() - start_time)
 
-    if batch_data:
-        c.executemany("INSERT INTO preds VALUES (?,?,?)", batch_data)
-        conn.commit()
-        
-    conn.close()
+        print("Building indexes...")
+        with METRICS.timer("sqlite_index"):
+            recs_db.build_indexes(conn)
+        recs_db.validate(conn, total_rows, total_lists)
+
+        # Remember what this table was built from, for --incremental
+        with METRICS.timer("sqlite_write"):
+            save_state(conn, movie_fingerprints(store), build_fingerprint(genre_filter))
+        with METRICS.timer("export_topk"):
+            export_topk(conn, recs_db.staging_path(TOPK_FILE))
+    except BaseException:
+        recs_db.discard(conn, DB_FILE, [TOPK_FILE])
+        save_metrics()  # Still useful for a discarded build (e.g. the lsh recall that failed it)
+        raise
+
+    recs_db.publish(conn, DB_FILE, [TOPK_FILE])
+    save_metrics()
     print("Done! Database ready.")
 
+def save_metrics(path=METRICS_FILE):
+    print("Metrics:")
+    METRICS.report()
+    METRICS.save(path)
+    print(f"Metrics saved to {path}")
+
+def export_topk(conn, path=TOPK_FILE):
+    """
+    Writes preds as a fixed-width artifact for the web tier:
+    - source_ids: sorted int64, position = dense movie index
+    - offsets: int64 (n+1), list of source i is targets[offsets[i]:offsets[i+1]]
+    - targets: int32 target IDs, scores: float32, best first
+    Stamps the database with a new build_id and tags the artifact with it. Callers
+    write to a staging path and let recs_db.publish move it in after the database.
+    """
+    build_id = recs_db.stamp_build(conn)
+    rows = conn.execute("SELECT source_id, target_id, score FROM preds ORDER BY source_id, rank").fetchall()
+    sources = np.array([r[0] for r in rows], dtype=np.int64)
+    source_ids, counts = np.unique(sources, return_counts=True)
+    offsets = np.zeros(len(source_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    save_arrays(path, {
+        "source_ids": source_ids,
+        "offsets": offsets,
+        "targets": np.array([r[1] for r in rows], dtype=np.int32),
+        "scores": np.array([r[2] for r in rows], dtype=np.float32),
+    }, meta={"kind": "topk", "top_k": TOP_K, "build_id": build_id})
+    print(f"Top-K artifact saved to {path} ({len(source_ids)} lists, {len(rows)} rows).")
+
+# --- INCREMENTAL UPDATES ---
+def _string_digests(strings):
+    """8-byte digest of every string, as an (n, 8) uint8 array."""
+    digests = b"".join(hashlib.blake2b(t.encode(), digest_size=8).digest() for t in strings)
+    return np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8)
+
+def movie_fingerprints(store):
+    """
+    {movie_id: hash of everything in the movie that feeds the score}, read from the
+    store's columns. Tokens enter as digests of their strings (hashed once per vocab
+    entry), not as store IDs or genre bits: those shift whenever the vocab changes.
+    """
+    genre_digests = _string_digests(store.genre_vocab)
+    genre_bytes = {}
+    tokens, indptr = {}, {}
+    for field in MovieStore.SET_FIELDS:
+        # Vocab IDs follow string order, so a row's sorted IDs list its digests in string order
+        tokens[field] = _string_digests(store.vocab[field].tolist())[store.arrays[f'{field}.ids']]
+        indptr[field] = store.arrays[f'{field}.indptr'].tolist()
+    cast_scores = np.asarray(store.cast_scores, dtype='<f8')
+    year = np.asarray(store.year, dtype='<i8')
+    rating = np.asarray(store.rating, dtype='<f8')
+
+    fingerprints = {}
+    for i, (movie_id, mask) in enumerate(zip(store.ids.tolist(), store.genres.tolist())):
+        if mask not in genre_bytes:
+            genre_bytes[mask] = genre_digests[[b for b in range(len(store.genre_vocab)) if (mask >> b) & 1]].tobytes()
+        h = hashlib.sha1(genre_bytes[mask])
+        for field in MovieStore.SET_FIELDS:
+            lo, hi = indptr[field][i], indptr[field][i + 1]
+            h.update(np.int64(hi - lo).tobytes())
+            h.update(tokens[field][lo:hi].tobytes())
+            if field == 'cast':
+                h.update(cast_scores[lo:hi].tobytes())
+        h.update(year[i].tobytes())
+        h.update(rating[i].tobytes())
+        fingerprints[movie_id] = h.hexdigest()
+    return fingerprints
+
+def build_fingerprint(genre_filter):
+    """Hash of the weight files and settings; any change invalidates every list."""
+    h = hashlib.sha1()
+    for path in (WEIGHTS_FILE, KEYWORD_W_FILE):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    h.update(f"top_k={TOP_K};genre_filter={genre_filter}".encode())
+    return h.hexdigest()
+
+def save_state(conn, fingerprints, build_fp):
+    c = conn.cursor()
+    c.execute("DROP TABLE IF EXISTS movie_state")
+    c.execute("CREATE TABLE movie_state (movie_id INTEGER PRIMARY KEY, fingerprint TEXT)")
+    c.executemany("INSERT INTO movie_state VALUES (?,?)", fingerprints.items())
+    c.execute("CREATE TABLE IF NOT EXISTS build_meta (key TEXT PRIMARY KEY, value TEXT)")
+    c.execute("INSERT OR REPLACE INTO build_meta VALUES ('build_fingerprint', ?)", (build_fp,))
+    conn.commit()
+
+def load_state(conn):
+    """Returns (build_fingerprint, {movie_id: fingerprint}), or (None, {}) if there is no state."""
+    try:
+        row = conn.execute("SELECT value FROM build_meta WHERE key = 'build_fingerprint'").fetchone()
+        fingerprints = dict(conn.execute("SELECT movie_id, fingerprint FROM movie_state"))
+    except sqlite3.OperationalError:
+        return None, {}
+    return (row[0] if row else None), fingerprints
+
+def _key(entry):
+    # Ranking order of a (score, target_id) entry: best score first, then lower ID
+    return (-entry[0], entry[1])
+
+def update(genre_filter=True, workers=1):
+    """
+    Brings preds up to date with the current catalog without rescoring the whole catalog.
+    - new/changed movies get their own list computed from scratch
+    - every other list gets the new/changed movies merged in (one N x changes block)
+    - lists that lose an entry to a removed/changed target (found through the
+      "who lists me" index) and can't prove their new tail is still exact are refilled
+    Falls back to compute() when the weights or settings changed.
+    """
+    print("Loading resources...")
+    store = load_catalog()
+    learned_weights = pickle.load(open(WEIGHTS_FILE, "rb"))
+    keyword_weights = pickle.load(open(KEYWORD_W_FILE, "rb"))
+
+    conn = sqlite3.connect(DB_FILE)
+    build_fp = build_fingerprint(genre_filter)
+    old_build_fp, old_state = load_state(conn)
+    if old_build_fp != build_fp:
+        conn.close()
+        print("No previous build state, or weights/settings changed. Running a full rebuild...")
+        return compute("sparse", workers, genre_filter)
+
+    new_state = movie_fingerprints(store)
+    added = [mid for mid in new_state if mid not in old_state]
+    changed = [mid for mid in new_state if mid in old_state and old_state[mid] != new_state[mid]]
+    removed = [mid for mid in old_state if mid not in new_state]
+    print(f"Changes: {len(added)} added, {len(changed)} changed, {len(removed)} removed.")
+    if not (added or changed or removed):
+        conn.close()
+        print("Nothing to do. Database is up to date.")
+        return
+
+    METRICS.reset()
+    start_time = time.time()
+    print("Encoding catalog as sparse matrices...")
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    scorer.metrics = METRICS
+    n = len(scorer.ids)
+    dirty = set(added) | set(changed)
+    gone = dirty | set(removed)  # Targets whose stored scores are no longer valid
+    dirty_cols = np.array(sorted(scorer.index[mid] for mid in dirty), dtype=np.int64)
+    dirty_ids = scorer.ids[dirty_cols]
+
+    # Current lists + reverse "who lists me" index
+    old_lists = defaultdict(list)
+    listed_by = defaultdict(set)
+    for sid, tid, score in conn.execute("SELECT source_id, target_id, score FROM preds ORDER BY source_id, rank"):
+        old_lists[sid].append((score, tid))
+        listed_by[tid].add(sid)
+    touched = set().union(*(listed_by[mid] for mid in gone))
+
+    new_lists = {}
+    refill = set()
+    for start in range(0, n, BLOCK_SIZE):
+        rows = np.arange(start, min(start + BLOCK_SIZE, n))
+        block = scorer.masked_scores(rows, learned_weights, genre_filter, cols=dirty_cols)
+        for b, r in enumerate(rows):
+            sid = int(scorer.ids[r])
+            if sid in dirty:
+                continue
+            old = old_lists.get(sid, [])
+            full = len(old) == TOP_K
+            hits = np.nonzero(np.isfinite(block[b]))[0]
+            incoming = [(float(block[b, j]), int(dirty_ids[j])) for j in hits]
+            if full:
+                incoming = [e for e in incoming if _key(e) < _key(old[-1])]
+            if sid not in touched and not incoming:
+                continue
+
+            merged = sorted([e for e in old if e[1] not in gone] + incoming, key=_key)
+            # A full list is only exact if its new last entry ranks at least as high as
+            # the old one: anything outside the old list ranked below that.
+            if full and (len(merged) < TOP_K or _key(merged[TOP_K - 1]) > _key(old[-1])):
+                refill.add(sid)
+                continue
+            new_lists[sid] = merged[:TOP_K]
+
+    rescore = sorted(scorer.index[mid] for mid in dirty | refill)
+    print(f"Rescoring {len(rescore)} lists from scratch ({len(refill)} refills), "
+          f"patching {len(new_lists)}...")
+    for start in range(0, len(rescore), BLOCK_SIZE):
+        rows = np.array(rescore[start:start + BLOCK_SIZE], dtype=np.int64)
+        for sid, top_k_sorted in scorer.top_k(rows, learned_weights, TOP_K, genre_filter):
+            new_lists[sid] = top_k_sorted
+
+    conn.close()
+
+    # Patch a staging copy, then swap it in like a full build
+    replaced = set(new_lists) | set(removed)
+    expected_rows = (sum(len(top) for sid, top in old_lists.items() if sid not in replaced) +
+                     sum(len(top) for top in new_lists.values()))
+    conn = recs_db.open_staging(DB_FILE, copy_existing=True)
+    try:
+        c = conn.cursor()
+        with METRICS.timer("sqlite_write"):
+            c.executemany("DELETE FROM preds WHERE source_id = ?", [(sid,) for sid in replaced])
+            c.executemany("INSERT INTO preds VALUES (?,?,?,?)",
+                          [(sid, rank, tid, score) for sid, top in new_lists.items()
+                           for rank, (score, tid) in enumerate(top)])
+            c.executemany("DELETE FROM movie_state WHERE movie_id = ?", [(mid,) for mid in removed])
+            c.executemany("INSERT OR REPLACE INTO movie_state VALUES (?,?)", [(mid, new_state[mid]) for mid in dirty])
+            conn.commit()
+        recs_db.validate(conn, expected_rows)
+        with METRICS.timer("export_topk"):
+            export_topk(conn, recs_db.staging_path(TOPK_FILE))
+    except BaseException:
+        recs_db.discard(conn, DB_FILE, [TOPK_FILE])
+        raise
+    recs_db.publish(conn, DB_FILE, [TOPK_FILE])
+    METRICS.add("lists_patched", len(new_lists))
+    METRICS.add("lists_rescored", len(rescore))
+    save_metrics()
+    print(f"Done! Updated {len(new_lists)} lists in {time.time() - start_time:.1f}s.")
+
 if __name__ == "__main__":
-    compute()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Precompute Top-K recommendations into SQLite.")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="sparse",
+                        help="sparse = vectorized matrix engine, indexed = inverted index + score-bound "
+                             "pruning, python = reference nested loop, lsh = approximate MinHash/LSH candidates")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to score with (sparse engine only)")
+    parser.add_argument("--cross-genre", action="store_true",
+                        help="Drop the genre-disjoint filter; any shared genre/keyword/cast/director qualifies")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rescore what changed since the last build (sparse engine)")
+    parser.add_argument("--lsh-bands", type=int, default=LSH_BANDS,
+                        help="LSH bands (lsh engine): more bands, higher recall, more candidates")
+    parser.add_argument("--lsh-rows", type=int, default=LSH_ROWS,
+                        help="MinHash rows per band (lsh engine): more rows, stricter buckets")
+    parser.add_argument("--lsh-windows", type=int, nargs=3, default=GENRE_WINDOWS, metavar=("SET", "SUBSET", "GENRE"),
+                        help="Genre/year neighbours per side (lsh engine): same genre set, set minus one "
+                             "genre, one shared genre")
+    parser.add_argument("--recall-sample", type=int, default=RECALL_SAMPLE,
+                        help="Sources to check against the exact engine after an lsh run (0 = skip)")
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL,
+                        help="Discard an lsh build whose sampled recall is lower (0 = always publish)")
+    args = parser.parse_args()
+    if (args.workers > 1 or args.incremental) and args.engine != "sparse":
+        parser.error("--workers and --incremental require the sparse engine")
+    # NXT_PROFILE=<dir> also dumps a cProfile of the whole run there
+    with profiled("compute_recommendations"):
+        if args.incremental:
+            update(genre_filter=not args.cross_genre, workers=args.workers)
+        elif args.engine == "lsh":
+            compute(args.engine, args.workers, genre_filter=not args.cross_genre,
+                    bands=args.lsh_bands, rows=args.lsh_rows, windows=args.lsh_windows,
+                    recall_sample=args.recall_sample, min_recall=args.min_recall)
+        else:
+            compute(args.engine, args.workers, genre_filter=not args.cross_genre)
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import numpy as np
+from array_file import save_arrays, load_arrays
+
+CACHE_DIR = "feature_cache"
+
+def file_digest(path):
+    """SHA-256 of a file's bytes (hex)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def pair_keys(ids_a, ids_b):
+    """Ordered (A, B) movie ID pairs packed into one int64 (TMDB IDs fit in 31 bits)."""
+    return (np.asarray(ids_a, dtype=np.int64) << 32) | np.asarray(ids_b, dtype=np.int64)
+
+class FeatureCache:
+    """
+    Pair features computed against one catalog + keyword weights version.
+    The file name is derived from both content hashes, so editing either one starts
+    a fresh cache. Rows are keyed per pair rather than per pair file, so a new or
+    edited pair file only computes the pairs not seen before.
+    Stored as sorted pair keys + a (pairs x 6) matrix in the array_file format.
+    """
+    def __init__(self, catalog_hash, weights_hash, cache_dir=CACHE_DIR):
+        self.catalog_hash = catalog_hash
+        self.weights_hash = weights_hash
+        self.path = os.path.join(cache_dir, f"features_{catalog_hash[:16]}_{weights_hash[:16]}.bin")
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.features = None
+        if os.path.exists(self.path):
+            arrays, _ = load_arrays(self.path, mmap=False)
+            self.keys = arrays['keys']
+            self.features = arrays['features']
+
+    def lookup(self, keys):
+        """Returns (features, found): cached rows for `keys` (zeros where not found)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        out = np.zeros((len(keys), 6))
+        if not len(self.keys):
+            return out, np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[pos] == keys
+        out[found] = self.features[pos[found]]
+        return out, found
+
+    def add(self, keys, features):
+        """Merges new rows in and rewrites the cache file (atomic replace)."""
+        keys, first = np.unique(np.asarray(keys, dtype=np.int64), return_index=True)
+        features = np.asarray(features)[first]
+        if self.features is not None:
+            keys = np.concatenate([self.keys, keys])
+            features = np.concatenate([self.features, features])
+            keys, first = np.unique(keys, return_index=True)
+            features = features[first]
+        self.keys, self.features = keys, features
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        meta = {"kind": "pair_features", "catalog_hash": self.catalog_hash, "weights_hash": self.weights_hash}
+        save_arrays(self.path, {"keys": self.keys, "features": self.features}, meta)
@@ -1,8 +1,11 @@
 import math
+import time
 
 class FeatureExtractor:
     def __init__(self, keyword_weights):
         self.weights = keyword_weights
+        self._store = None
+        self._store_weights = None
 
     def get_features(self, mov_A, mov_B):
         """
@@ -18,6 +21,58 @@ class FeatureExtractor:
             self.rating_similarity(mov_A['rating'], mov_B['rating'])
         ]
 
+    def timed_features(self, mov_A, mov_B, seconds):
+        """get_features(), also adding each feature's wall time to seconds[0..5]."""
+        clock = time.perf_counter
+        t0 = clock()
+        genre = self.jaccard(mov_A['genres'], mov_B['genres'])
+        t1 = clock()
+        keyword = self.weighted_jaccard(mov_A['keywords'], mov_B['keywords'])
+        t2 = clock()
+        cast = self.cast_similarity(mov_A['cast'], mov_B['cast'])
+        t3 = clock()
+        director = self.jaccard(mov_A['directors'], mov_B['directors'])
+        t4 = clock()
+        year = self.year_similarity(mov_A['year'], mov_B['year'])
+        t5 = clock()
+        rating = self.rating_similarity(mov_A['rating'], mov_B['rating'])
+        t6 = clock()
+        for i, dt in enumerate((t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            seconds[i] += dt
+        return [genre, keyword, cast, director, year, rating]
+
+    def timed_features_by_index(self, store, i, j, seconds):
+        """
+        timed_features() for rows i and j of a MovieStore, read straight from its columns:
+        genres are bitmasks and the set features compare int token-ID slices, so no
+        per-movie dicts of strings are built.
+        """
+        kw_w = self.store_keyword_weights(store)
+        clock = time.perf_counter
+        t0 = clock()
+        genre = self.bitmask_jaccard(int(store.genres[i]), int(store.genres[j]))
+        t1 = clock()
+        keyword = self.id_weighted_jaccard(store.tokens('keywords', i), store.tokens('keywords', j), kw_w)
+        t2 = clock()
+        cast = self.id_cast_similarity(store.cast(i), store.cast(j))
+        t3 = clock()
+        director = self.id_jaccard(store.tokens('directors', i), store.tokens('directors', j))
+        t4 = clock()
+        year = self.year_similarity(int(store.year[i]), int(store.year[j]))
+        t5 = clock()
+        rating = self.rating_similarity(float(store.rating[i]), float(store.rating[j]))
+        t6 = clock()
+        for k, dt in enumerate((t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            seconds[k] += dt
+        return [genre, keyword, cast, director, year, rating]
+
+    def store_keyword_weights(self, store):
+        # Keyword weights indexed by the store's keyword IDs, built once per store
+        if self._store is not store:
+            self._store = store
+            self._store_weights = [self.weights.get(k, 0) for k in store.vocab['keywords'].tolist()]
+        return self._store_weights
+
     # --- HELPERS ---
     def jaccard(self, set_A, set_B):
         if not set_A or not set_B: return 0.0
@@ -46,6 +101,37 @@ class FeatureExtractor:
         den = sum([max(cast_A.get(a,0), cast_B.get(a,0)) for a in union])
         return num / den if den > 0 else 0.0
 
+    # --- TOKEN-ID HELPERS (MovieStore rows) ---
+    # Rows hold a handful of tokens: Python sets of small ints beat numpy set routines here
+    def bitmask_jaccard(self, mask_A, mask_B):
+        if not mask_A or not mask_B: return 0.0
+        # Popcount of AND / OR
+        return (mask_A & mask_B).bit_count() / (mask_A | mask_B).bit_count()
+
+    def id_jaccard(self, ids_A, ids_B):
+        return self.jaccard(set(ids_A.tolist()), set(ids_B.tolist()))
+
+    def id_weighted_jaccard(self, ids_A, ids_B, kw_w):
+        # kw_w: keyword weight per keyword ID
+        ids_A, ids_B = ids_A.tolist(), ids_B.tolist()
+        num = sum([kw_w[k] for k in set(ids_A).intersection(ids_B)])
+        den = sum([kw_w[k] for k in ids_A]) + sum([kw_w[k] for k in ids_B]) - num
+        return num / den if den > 0 else 0.0
+
+    def id_cast_similarity(self, cast_A, cast_B):
+        # cast_A is (cast IDs, aligned RelevanceScores)
+        scores_A = dict(zip(cast_A[0].tolist(), cast_A[1].tolist()))
+        scores_B = cast_B[1].tolist()
+        if not scores_A and not scores_B: return 0.0
+        num = shared_min = 0.0
+        for a, score in zip(cast_B[0].tolist(), scores_B):
+            if a in scores_A:
+                num += (scores_A[a] + score) / 2
+                shared_min += min(scores_A[a], score)
+        # sum of max over the union = sum(A) + sum(B) - sum of min over the intersection
+        den = sum(scores_A.values()) + sum(scores_B) - shared_min
+        return num / den if den > 0 else 0.0
+
     def year_similarity(self, yA, yB):
         if yA == 0 or yB == 0: return 0.0
         diff = abs(yA - yB)
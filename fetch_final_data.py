@@ -1,12 +1,44 @@
 import pickle
-import requests
+import json
 import time
 import os
+import argparse
+from datetime import datetime, timedelta, timezone
+from tmdb_client import TMDBFetcher, MOVIE_DETAILS_PARAMS
+from tmdb_cache import ResponseCache
 
 # --- CONFIGURATION ---
 API_KEY = "NOTHING_TO_SEE_HERE"
 INPUT_VECTORS = "movie_vectors.pkl"
 OUTPUT_FILE = "movie_data.pkl"
+FINAL_FILE = "movie_data_final.pkl"       # What the web app serves; --refresh patches it in place
+SYNC_STATE_FILE = "movie_data_sync.json"  # Last /movie/changes sync + IDs still to retry
+CHANGES_WINDOW_DAYS = 14                  # TMDB serves at most 14 days of changes per query
+
+def apply_metadata(movie, meta):
+    movie_id = movie['id']
+
+    # 1. Get Poster
+    poster_path = meta.get('poster_path')
+    if poster_path:
+        movie['poster_url'] = f"https://image.tmdb.org/t/p/w200{poster_path}"
+    else:
+        # Fallback image
+        movie['poster_url'] = "https://image.tmdb.org/t/p/w200"
+    
+    # 2. Get Overview (Description)
+    overview = meta.get('overview', "")
+    movie['overview'] = overview if overview else "No description found on TMDB."
+    
+    # 3. Create Official Link
+    movie['tmdb_url'] = f"https://www.themoviedb.org/movie/{movie_id}"
+
+    # 4. Popularity signals (ranks the title search in the web app)
+    movie['popularity'] = meta.get('popularity', 0)
+    movie['vote_count'] = meta.get('vote_count', 0)
+
+    # `rating` is deliberately left alone: it has to stay the value movie_vectors.pkl
+    # (and so the precomputed scores and the online scorer) were built from
 
 def fetch_and_enrich():
     print("Loading existing vectors...")
@@ -21,52 +53,24 @@ def fetch_and_enrich():
     print(f"Fetching metadata for {total_movies} movies from TMDB...")
     print("This may take 10-15 minutes depending on your connection.")
     
-    session = requests.Session()
+    # Shares the response cache with load_complete_data: the same /movie/{id} request
+    # was already made by the crawl, so a warm cache means no network calls here.
+    fetcher = TMDBFetcher(API_KEY, cache=ResponseCache())
     enriched_data = []
     
     start_time = time.time()
     
-    for i, movie in enumerate(movies_data):
-        movie_id = movie['id']
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-        
-        try:
-            r = session.get(url, params={"api_key": API_KEY, "language": "en-US"})
+    results = fetcher.map(lambda movie: fetcher.movie_details(movie['id']), movies_data)
+    for i, (movie, meta) in enumerate(results):
+        if meta is not None:
+            apply_metadata(movie, meta)
             
-            if r.status_code == 200:
-                meta = r.json()
-                
-                # 1. Get Poster
-                poster_path = meta.get('poster_path')
-                if poster_path:
-                    movie['poster_url'] = f"https://image.tmdb.org/t/p/w200{poster_path}"
-                else:
-                    # Fallback image
-                    movie['poster_url'] = "https://image.tmdb.org/t/p/w200"
-                
-                # 2. Get Overview (Description)
-                overview = meta.get('overview', "")
-                movie['overview'] = overview if overview else "No description found on TMDB."
-                
-                # 3. Create Official Link
-                movie['tmdb_url'] = f"https://www.themoviedb.org/movie/{movie_id}"
-                
-            elif r.status_code == 429:
-                # Rate limit hit - reuse old data if possible, or add placeholders
-                print(f"Rate limit hit at movie {i}. Sleeping...")
-                time.sleep(0.02)
-                movie['poster_url'] = "https://via.placeholder.com/200x300?text=Error"
-                movie['overview'] = "Could not fetch description."
-                movie['tmdb_url'] = f"https://www.themoviedb.org/movie/{movie_id}"
-                
-            else:
-                # Movie might have been deleted from TMDB or ID is wrong
-                movie['poster_url'] = "https://via.placeholder.com/200x300?text=Not+Found"
-                movie['overview'] = "Description unavailable."
-                movie['tmdb_url'] = "#"
-
-        except Exception as e:
-            print(f"Error fetching {movie_id}: {e}")
+        else:
+            # Movie might have been deleted from TMDB or ID is wrong
+            # (429s and 5xx were already retried by the fetcher)
+            movie['poster_url'] = "https://via.placeholder.com/200x300?text=Not+Found"
+            movie['overview'] = "Description unavailable."
+            movie['tmdb_url'] = "#"
         
         # Add to new list
         enriched_data.append(movie)
@@ -77,9 +81,8 @@ def fetch_and_enrich():
             rate = (i + 1) / elapsed
             remaining = (total_movies - (i + 1)) / rate / 60
             print(f"Processed {i + 1}/{total_movies} movies... (~{remaining:.1f} mins left)")
-        
-        # Respect API Rate Limits (40-50 reqs/sec is usually safe)
-        time.sleep(0.02)
+
+    print(f"Fetch stats: {fetcher.summary()}")
 
     # Save Final File
     print(f"\nSaving enriched data to {OUTPUT_FILE}...")
@@ -88,8 +91,103 @@ def fetch_and_enrich():
     
     print("Done! You can now run your Flask app.")
 
+# --- DELTA REFRESH ---
+def load_sync_state():
+    if os.path.exists(SYNC_STATE_FILE):
+        with open(SYNC_STATE_FILE, 'r') as f:
+            return json.load(f)
+    # First refresh: everything since FINAL_FILE was last written
+    mtime = datetime.fromtimestamp(os.path.getmtime(FINAL_FILE), timezone.utc)
+    return {'last_sync': mtime.date().isoformat(), 'pending': []}
+
+def save_sync_state(state):
+    tmp_path = f"{SYNC_STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, SYNC_STATE_FILE)
+
+def changed_ids_since(fetcher, since, until):
+    """
+    Movie IDs listed by /movie/changes between two dates (inclusive), queried in
+    CHANGES_WINDOW_DAYS windows. Raises RuntimeError if any page can't be fetched,
+    since a partial feed would silently skip changes.
+    """
+    ids = set()
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=CHANGES_WINDOW_DAYS - 1), until)
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            params = {"start_date": start.isoformat(), "end_date": end.isoformat(), "page": page}
+            data = fetcher.get("/movie/changes", params, cached=False)
+            if data is None:
+                raise RuntimeError(f"/movie/changes failed for {start}..{end} page {page}")
+            ids.update(item['id'] for item in data.get('results', []))
+            total_pages = data.get('total_pages', 1)
+            page += 1
+        start = end + timedelta(days=1)
+    return ids
+
+def refresh():
+    """
+    Re-fetches only movies TMDB reports as changed since the last sync, with
+    conditional requests against the response cache, and patches FINAL_FILE.
+    A failed fetch keeps the movie's previous values and retries it next time.
+    """
+    if not os.path.exists(FINAL_FILE):
+        print(f"Error: {FINAL_FILE} not found. Run a full fetch first.")
+        return
+
+    with open(FINAL_FILE, 'rb') as f:
+        movies_data = pickle.load(f)
+    by_id = {m['id']: m for m in movies_data}
+
+    state = load_sync_state()
+    since = datetime.fromisoformat(state['last_sync']).date()
+    today = datetime.now(timezone.utc).date()
+
+    fetcher = TMDBFetcher(API_KEY, cache=ResponseCache())
+    try:
+        changed = changed_ids_since(fetcher, since, today)
+    except RuntimeError as e:
+        print(f"Error: {e}. Nothing was changed; try again later.")
+        return
+
+    todo = sorted((changed | set(state.get('pending', []))) & by_id.keys())
+    print(f"{len(changed)} movies changed on TMDB since {since}, {len(todo)} of them in the catalog.")
+
+    updated, failed = 0, []
+    fetch = lambda mid: fetcher.get(f"/movie/{mid}", MOVIE_DETAILS_PARAMS, revalidate=True)
+    for mid, meta in fetcher.map(fetch, todo):
+        if meta is None:
+            failed.append(mid)
+            continue
+        before = dict(by_id[mid])
+        apply_metadata(by_id[mid], meta)
+        if by_id[mid] != before:
+            updated += 1
+
+    print(f"Fetch stats: {fetcher.summary()}")
+
+    if updated:
+        tmp_path = f"{FINAL_FILE}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(movies_data, f)
+        os.replace(tmp_path, FINAL_FILE)
+
+    save_sync_state({'last_sync': today.isoformat(), 'pending': failed})
+    print(f"Done! {updated} movies updated in {FINAL_FILE}, {len(failed)} kept their previous values "
+          f"(retried on the next refresh).")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--refresh', action='store_true',
+                        help=f"Only re-fetch movies changed since the last sync and patch {FINAL_FILE}")
+    args = parser.parse_args()
+
     if API_KEY == "NOTHING_TO_SEE_HERE":
         print("ERROR: Please set your API Key inside the script.")
+    elif args.refresh:
+        refresh()
     else:
         fetch_and_enrich()
\ No newline at end of file
@@ -1,32 +1,33 @@
-import json
 import math
+import os
 import pickle
 from collections import Counter
+from ndjson_io import iter_records, resolve
 
 # --- CONFIG ---
-INPUT_FILE = "tmdb_10k_movies_detailed.json"
+INPUT_FILE = "tmdb_10k_movies_detailed.ndjson"
 OUTPUT_WEIGHTS_FILE = "keyword_weights.pkl"
 
 def build_normalized_weights():
-    print("Loading raw data.")
-    try:
-        with open(INPUT_FILE, 'r') as f:
-            raw_movies = json.load(f)
-    except FileNotFoundError:
+    print("Streaming raw data.")
+    input_file = resolve(INPUT_FILE)
+    if not os.path.exists(input_file):
         print(f"Error: {INPUT_FILE} not found.")
         return
 
-    total_movies = len(raw_movies)
+    total_movies = 0
     keyword_counts = Counter()
 
-    # 1. Count Frequencies
-    print(f"Scanning {total_movies} movies...")
-    for m in raw_movies:
+    # 1. Count Frequencies (one movie in memory at a time)
+    for m in iter_records(input_file):
+        total_movies += 1
         # We use a set to avoid double counting if a keyword appears twice in one movie description
         unique_kws = set(m.get('keywords', []))
         for k in unique_kws:
             keyword_counts[k] += 1
 
+    print(f"Scanned {total_movies} movies.")
+
     # 2. Calculate Normalized IDF
     # Max possible IDF is when a word appears in only 1 movie: log(1 + total/1)
     max_idf = math.log(1 + total_movies)
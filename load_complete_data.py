@@ -1,40 +1,29 @@
 import pandas as pd
-import requests
-import json
 import time
 import os
+from tmdb_client import TMDBFetcher, CONCURRENCY, RATE_LIMIT
+from tmdb_cache import ResponseCache
+from ndjson_io import NDJSONWriter, existing_ids
 
 # --- CONFIGURATION ---
 API_KEY = "NOTHING_TO_SEE_HERE"
 INPUT_CSV = "tmdb_10k_movies.csv"
-OUTPUT_JSON = "tmdb_10k_movies_detailed.json"
+OUTPUT_JSON = "tmdb_10k_movies_detailed.ndjson"  # One movie per line, appended as fetched
+FSYNC_EVERY = 100                # Records between durable checkpoints
+FETCH_CONCURRENCY = CONCURRENCY  # Requests in flight
+FETCH_RATE = RATE_LIMIT          # Requests per second (token bucket)
 
-def fetch_movie_details(movie_id, session):
+def fetch_movie_details(movie_id, fetcher):
     """
     Fetches full details for a single movie using append_to_response.
-    Gets: Basic Info + Credits (Cast/Crew) + Keywords
+    Gets: Basic Info + Credits (Cast/Crew) + Keywords + Collection (franchise)
+    Rate limiting, retries (429, 5xx) and the response cache are handled by the fetcher.
     """
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}"
-    params = {
-        "api_key": API_KEY,
-        "append_to_response": "credits,keywords", # THE MAGIC PARAMETER
-        "language": "en-US"
-    }
-    
     try:
-        response = session.get(url, params=params)
-        
-        # Handle Rate Limiting (429)
-        if response.status_code == 429:
-            print("Rate limit hit! Sleeping for 5 seconds...")
-            time.sleep(5)
-            return fetch_movie_details(movie_id, session) # Retry
-            
-        if response.status_code != 200:
-            print(f"Error {response.status_code} for ID {movie_id}")
+        data = fetcher.movie_details(movie_id)  # append_to_response=credits,keywords
+        if data is None:
+            print(f"Could not fetch ID {movie_id}")
             return None
-            
-        data = response.json()
         
         # --- PARSE THE DATA IMMEDIATELY TO SAVE SPACE ---
         
@@ -52,6 +41,9 @@ def fetch_movie_details(movie_id, session):
         
         # 3. Extract Keywords
         keywords = [k['name'] for k in data.get('keywords', {}).get('keywords', [])]
+
+        # 4. Franchise: same response, so collection_index.py needs no second pass
+        collection = data.get('belongs_to_collection')
         
         return {
             "id": data['id'],
@@ -62,7 +54,8 @@ def fetch_movie_details(movie_id, session):
             "genres": [g['name'] for g in data.get('genres', [])],
             "keywords": keywords,
             "cast": top_cast,
-            "directors": directors
+            "directors": directors,
+            "collection_id": collection['id'] if collection else None
         }
 
     except Exception as e:
@@ -82,35 +75,35 @@ if __name__ == "__main__":
             movie_ids = df['id'].tolist()
             
             print(f"Loaded {len(movie_ids)} movie IDs to fetch.")
+
+            # Resume: whatever already reached the output file is not fetched again
+            done = existing_ids(OUTPUT_JSON)
+            todo = [mid for mid in dict.fromkeys(movie_ids) if mid not in done]
+            if done:
+                print(f"Resuming: {len(done)} movies already in {OUTPUT_JSON}, {len(todo)} left.")
+
+            fetcher = TMDBFetcher(API_KEY, rate=FETCH_RATE, concurrency=FETCH_CONCURRENCY, cache=ResponseCache())
             
-            detailed_data = []
-            session = requests.Session()
-            
-            # 2. Loop and Fetch
-            # Note: 10,000 requests will take time. 
-            # TMDB allows ~40 requests per 10 seconds.
+            # 2. Fetch concurrently
+            # The token bucket keeps us under the API budget, so crawl time is
+            # bounded by FETCH_RATE rather than by round-trip latency.
             
             start_time = time.time()
+            saved = 0
             
-            for i, mid in enumerate(movie_ids):
-                details = fetch_movie_details(mid, session)
-                if details:
-                    detailed_data.append(details)
-                
-                # Progress Bar
-                if (i + 1) % 100 == 0:
-                    elapsed = time.time() - start_time
-                    print(f"Processed {i + 1}/{len(movie_ids)} movies. Time: {elapsed:.2f}s")
+            with NDJSONWriter(OUTPUT_JSON, fsync_every=FSYNC_EVERY) as out:
+                results = fetcher.map(lambda mid: fetch_movie_details(mid, fetcher), todo)
+                for i, (mid, details) in enumerate(results):
+                    # Each record is appended once; no periodic rewrite of the whole file
+                    if details and details['id'] not in done:
+                        out.write(details)
+                        done.add(details['id'])
+                        saved += 1
                     
-                    # Periodic Save (Safety check)
-                    with open(OUTPUT_JSON, 'w') as f:
-                        json.dump(detailed_data, f)
-                
-                # Polite Sleep (approx 30-40 req/sec max)
-                time.sleep(0.26) 
+                    # Progress Bar
+                    if (i + 1) % 100 == 0:
+                        elapsed = time.time() - start_time
+                        print(f"Processed {i + 1}/{len(todo)} movies. Time: {elapsed:.2f}s")
 
-            # 3. Final Save
-            with open(OUTPUT_JSON, 'w') as f:
-                json.dump(detailed_data, f)
-            
-            print(f"DONE! Full dataset saved to {OUTPUT_JSON}")
\ No newline at end of file
+            print(f"Fetch stats: {fetcher.summary()}")
+            print(f"DONE! {saved} new movies appended, {len(done)} total in {OUTPUT_JSON}")
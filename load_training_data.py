@@ -1,26 +1,28 @@
-import requests
-import json
-import random
-import pandas as pd
-import time
+import numpy as np
+import scipy.sparse as sp
 import os
+from ndjson_io import iter_records, resolve
+from tmdb_client import TMDBFetcher
+from tmdb_cache import ResponseCache
+from pair_store import PairStore, PAIRS_FILE, TMDB_RECOMMENDATION, NEGATIVE_SAMPLER
 
 # --- CONFIGURATION ---
 API_KEY = "NOTHING_TO_SEE_HERE"
-INPUT_FILE = "tmdb_10k_movies_detailed.json"
-OUTPUT_FILE = "training_pairs.csv"
+INPUT_FILE = "tmdb_10k_movies_detailed.ndjson"
+OUTPUT_FILE = PAIRS_FILE  # Appended to; re-runs only add pairs not already stored
 NUM_SOURCE_MOVIES = 500
+SEED = 42                  # Negative sampling, for reproducible pairs
+NEGATIVE_BATCH = 8192      # Candidate pairs drawn per vectorized batch
+MAX_STALLED_BATCHES = 20   # Give up on a kind of negative after this many batches add nothing
 
 def load_movies_as_dict(filepath):
+    filepath = resolve(filepath)
     if not os.path.exists(filepath):
         print(f"ERROR: {filepath} not found.")
         return {}
     
-    with open(filepath, 'r') as f:
-        movies = json.load(f)
-    
     movie_lookup = {}
-    for m in movies:
+    for m in iter_records(filepath):
         movie_lookup[m['id']] = {
             'genres': set(m.get('genres', [])),
             'cast': set([c['name'] for c in m.get('cast', [])]),
@@ -30,73 +32,112 @@ def load_movies_as_dict(filepath):
 
 def fetch_positive_pairs(movie_ids, api_key):
     positive_pairs = []
-    session = requests.Session()
+    fetcher = TMDBFetcher(api_key, cache=ResponseCache())
     source_subset = movie_ids[:NUM_SOURCE_MOVIES]
     
     print(f"\n--- Fetching Positive Pairs (Target = 1) ---")
     
-    for i, source_id in enumerate(source_subset):
-        url = f"https://api.themoviedb.org/3/movie/{source_id}/recommendations"
-        try:
-            r = session.get(url, params={"api_key": api_key})
-            if r.status_code == 200:
-                for rec in r.json().get('results', [])[:5]:
-                    if rec['id'] in movie_ids: 
-                        positive_pairs.append({
-                            "movie_A": source_id,
-                            "movie_B": rec['id'],
-                            "target": 1
-                        })
-            elif r.status_code == 429:
-                time.sleep(1.0) 
-        except: pass
+    results = fetcher.map(lambda mid: fetcher.get(f"/movie/{mid}/recommendations"), source_subset)
+    for i, (source_id, data) in enumerate(results):
+        if data is not None:
+            for rec in data.get('results', [])[:5]:
+                if rec['id'] in movie_ids: 
+                    positive_pairs.append({
+                        "movie_A": source_id,
+                        "movie_B": rec['id'],
+                        "target": 1
+                    })
         
         if (i + 1) % 50 == 0: 
             print(f"Fetched recommendations for {i + 1}/{len(source_subset)} movies...")
         
-        time.sleep(0.02) # Fast sleep as requested
-        
+    print(f"Fetch stats: {fetcher.summary()}")
     print(f"Collected {len(positive_pairs)} positive pairs.")
     return positive_pairs
 
-def generate_safe_negative_pairs(movie_ids, movie_lookup, target_count):
+def _incidence(token_sets):
+    """CSR movie x token matrix (1 = movie has the token) for a list of sets."""
+    # Sorted, so column order doesn't depend on string hashing (draws stay reproducible)
+    vocab = {}
+    indices = [vocab.setdefault(tok, len(vocab)) for toks in token_sets for tok in sorted(toks)]
+    indptr = np.cumsum([0] + [len(toks) for toks in token_sets])
+    data = np.ones(len(indices), dtype=np.float32)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(token_sets), max(len(vocab), 1)))
+
+def _shared(mat, a, b):
+    """Number of tokens movie a[i] and b[i] have in common, for every i."""
+    return np.asarray(mat[a].multiply(mat[b]).sum(axis=1)).ravel()
+
+class NegativeSampler:
+    """
+    Draws negative pairs (disjoint cast and keywords) in vectorized batches.
+    - Hard: a random movie + a random movie from one of its genres' posting lists
+      (shared genre by construction)
+    - Easy: two random movies, kept if their genres are disjoint
+    Seeded, so the same catalog always gives the same pairs.
+    """
+    def __init__(self, movie_lookup, seed=SEED):
+        self.ids = np.array(list(movie_lookup.keys()), dtype=np.int64)
+        movies = list(movie_lookup.values())
+        self.rng = np.random.default_rng(seed)
+
+        self.genres = _incidence([m['genres'] for m in movies])
+        self.postings = self.genres.T.tocsr()  # genre -> movies
+        self.tokens = _incidence([{('cast', c) for c in m['cast']} | {('kw', k) for k in m['keywords']}
+                                  for m in movies])
+        self.seen = set()
+
+    def _draw_hard(self, size):
+        n_genres = np.diff(self.genres.indptr)
+        a = self.rng.integers(len(self.ids), size=size)
+        a = a[n_genres[a] > 0]
+        g = self.genres.indices[self.genres.indptr[a] + (self.rng.random(len(a)) * n_genres[a]).astype(np.int64)]
+        n_movies = np.diff(self.postings.indptr)[g]
+        b = self.postings.indices[self.postings.indptr[g] + (self.rng.random(len(a)) * n_movies).astype(np.int64)]
+        return a, b
+
+    def _draw_easy(self, size):
+        a = self.rng.integers(len(self.ids), size=size)
+        b = self.rng.integers(len(self.ids), size=size)
+        keep = _shared(self.genres, a, b) == 0
+        return a[keep], b[keep]
+
+    def sample(self, count, hard):
+        """Up to `count` new (id_A, id_B) pairs; stops early if the catalog runs out of them."""
+        draw = self._draw_hard if hard else self._draw_easy
+        pairs = []
+        stalled = 0
+        while len(pairs) < count and stalled < MAX_STALLED_BATCHES:
+            a, b = draw(NEGATIVE_BATCH)
+            keep = a != b
+            a, b = a[keep], b[keep]
+            keep = _shared(self.tokens, a, b) == 0
+            before = len(pairs)
+            for x, y in zip(self.ids[a[keep]].tolist(), self.ids[b[keep]].tolist()):
+                key = (x, y) if x < y else (y, x)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    pairs.append((x, y))
+                    if len(pairs) == count:
+                        break
+            stalled = stalled + 1 if len(pairs) == before else 0
+        if len(pairs) < count:
+            kind = "hard" if hard else "easy"
+            print(f"Warning: only {len(pairs)}/{count} {kind} negatives exist in this catalog.")
+        return pairs
+
+def generate_safe_negative_pairs(movie_ids, movie_lookup, target_count, seed=SEED):
     print(f"\n--- Generating {target_count} Mixed Negative Pairs ---")
-    negative_pairs = []
+    sampler = NegativeSampler({mid: movie_lookup[mid] for mid in movie_ids if mid in movie_lookup}, seed)
     
     # We want 50% Easy (Different Genres) and 50% Hard (Same Genre, different Cast)
+    # Cast and Keywords are ALWAYS disjoint (Safe) in both kinds.
     target_hard = target_count // 2
-    
-    while len(negative_pairs) < target_count:
-        id_a = random.choice(movie_ids)
-        id_b = random.choice(movie_ids)
-        if id_a == id_b: continue
-            
-        data_a = movie_lookup.get(id_a)
-        data_b = movie_lookup.get(id_b)
-        if not data_a or not data_b: continue
-        
-        # LOGIC:
-        # We ALWAYS require Cast and Keywords to be disjoint (Safe).
-        # But we will sometimes ALLOW Genre overlap to create "Hard" examples.
-        
-        # 1. Cast & Keywords MUST be different (Base Safety)
-        if not data_a['cast'].isdisjoint(data_b['cast']) or \
-           not data_a['keywords'].isdisjoint(data_b['keywords']):
-            continue
-
-        # 2. Decide Type: Hard vs Easy
-        is_hard_negative = not data_a['genres'].isdisjoint(data_b['genres'])
-        
-        # If we still need Hard Negatives (Same Genre), accept this pair.
-        if is_hard_negative and (len(negative_pairs) < target_hard):
-            negative_pairs.append({"movie_A": id_a, "movie_B": id_b, "target": 0})
-            
-        # If we need Easy Negatives (Diff Genre), accept this pair.
-        elif (not is_hard_negative) and (len(negative_pairs) >= target_hard):
+    negative_pairs = []
+    for hard, count in ((True, target_hard), (False, target_count - target_hard)):
+        for id_a, id_b in sampler.sample(count, hard):
             negative_pairs.append({"movie_A": id_a, "movie_B": id_b, "target": 0})
-            
-        if len(negative_pairs) % 500 == 0:
-            print(f"Generated {len(negative_pairs)} pairs...")
+        print(f"Generated {len(negative_pairs)} pairs...")
 
     print(f"Finished. Generated {len(negative_pairs)} negatives.")
     return negative_pairs
@@ -116,9 +157,8 @@ if __name__ == "__main__":
             target_negatives = len(pos_data) if len(pos_data) > 0 else 2500
             neg_data = generate_safe_negative_pairs(all_ids, movie_lookup, target_negatives)
             
-            full_data = pos_data + neg_data
-            random.shuffle(full_data)
-            
-            df = pd.DataFrame(full_data)
-            df.to_csv(OUTPUT_FILE, index=False)
-            print(f"\nSUCCESS! Saved {len(df)} pairs to {OUTPUT_FILE}")
\ No newline at end of file
+            with PairStore(OUTPUT_FILE) as store:
+                for label, rows, source in ((1, pos_data, TMDB_RECOMMENDATION), (0, neg_data, NEGATIVE_SAMPLER)):
+                    stats = store.add([(p["movie_A"], p["movie_B"]) for p in rows], label, source)
+                    print(f"{source}: {stats}")
+                print(f"\nSUCCESS! {OUTPUT_FILE} now holds {len(store)} pairs")
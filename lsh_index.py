@@ -0,0 +1,157 @@
+import numpy as np
+
+# --- CONFIG ---
+# Two candidate sources, OR-ed together (see lsh_top_k in compute_recommendations.py):
+# - MinHash/LSH over keywords, cast and directors (content overlap)
+# - genre/year neighbourhoods: Genres and Year carry most of the learned weight, and a
+#   token sketch never sees them. On synthetic_catalog.py catalogs of 3k / 20k / 100k
+#   movies the defaults reach recall@25 of 0.94 / 0.96 / 0.96 (target: 0.9) with
+#   ~160 / 245 / 275 candidates per movie; the 32x4 keyword-only sketch this replaced
+#   was at 0.002.
+LSH_BANDS = 16     # More bands: more candidates, higher recall
+LSH_ROWS = 2       # More rows per band: stricter buckets, fewer candidates
+MAX_BUCKET = 500   # Buckets larger than this are skipped (one ubiquitous token, not similarity)
+PRIME = (1 << 31) - 1
+# Neighbours per side, in (year, rating) order, among movies with...
+GENRE_WINDOWS = (
+    48,  # ...the same genre set
+    24,  # ...the same genre set once one genre is dropped from either ({A,B} ~ {A,B,C})
+    16,  # ...one genre in common
+)
+
+def token_sets(store):
+    """
+    One integer token set per movie: keywords, cast and directors from the store's
+    CSR arrays, shifted into disjoint ranges. Returns (indptr, tokens).
+    """
+    n = len(store)
+    parts = []
+    counts = np.zeros(n, dtype=np.int64)
+    offset = 0
+    for field in ('keywords', 'cast', 'directors'):
+        indptr = np.asarray(store.arrays[f'{field}.indptr'])
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        parts.append((rows, np.asarray(store.arrays[f'{field}.ids'], dtype=np.int64) + offset))
+        counts += np.diff(indptr)
+        offset += len(store.vocab[field])
+    rows = np.concatenate([r for r, _ in parts])
+    tokens = np.concatenate([t for _, t in parts])
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(counts)
+    return indptr, tokens[order]
+
+class MinHashLSH:
+    """
+    MinHash signatures (bands * rows hash functions of the form (a*x + b) mod p)
+    over each movie's token set, bucketed band by band: two movies become candidates
+    when all `rows` values of at least one band agree. For Jaccard similarity s that
+    happens with probability 1 - (1 - s^rows)^bands.
+    Movies with an empty token set get no signature and no candidates.
+    """
+    def __init__(self, indptr, tokens, bands=LSH_BANDS, rows=LSH_ROWS, seed=1):
+        self.bands = bands
+        self.rows = rows
+        self.n = len(indptr) - 1
+        sizes = np.diff(indptr)
+        self.members = np.nonzero(sizes > 0)[0]
+
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, PRIME, size=bands * rows, dtype=np.uint64)
+        b = rng.integers(0, PRIME, size=bands * rows, dtype=np.uint64)
+        x = tokens.astype(np.uint64)
+        starts = indptr[:-1][self.members]
+
+        self.signatures = np.empty((len(self.members), bands * rows), dtype=np.uint32)
+        for h in range(bands * rows):
+            hashed = (a[h] * x + b[h]) % PRIME
+            self.signatures[:, h] = np.minimum.reduceat(hashed, starts) if len(starts) else []
+
+    def _band_pairs(self, band):
+        sig = np.ascontiguousarray(self.signatures[:, band * self.rows:(band + 1) * self.rows])
+        _, bucket = np.unique(sig.view(np.dtype((np.void, sig.dtype.itemsize * self.rows))).ravel(),
+                              return_inverse=True)
+        order = np.argsort(bucket, kind='stable')
+        in_bucket = bucket[order]
+        size_of = np.bincount(bucket)[in_bucket]
+        keep = (size_of >= 2) & (size_of <= MAX_BUCKET)
+        order, in_bucket, size_of = order[keep], in_bucket[keep], size_of[keep]
+        if not len(order):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Every member is paired with every member of its bucket (itself dropped below)
+        pos = np.arange(len(order))
+        new_bucket = np.concatenate([[True], in_bucket[1:] != in_bucket[:-1]])
+        first = np.maximum.accumulate(np.where(new_bucket, pos, 0))
+
+        src = np.repeat(order, size_of)
+        step = np.arange(size_of.sum()) - np.repeat(np.cumsum(size_of) - size_of, size_of)
+        tgt = order[np.repeat(first, size_of) + step]
+        keep = src != tgt
+        return self.members[src[keep]], self.members[tgt[keep]]
+
+    def candidate_pairs(self):
+        """Directed (source_row, target_row) pairs colliding in any band, sorted by source."""
+        return merge_pairs([self._band_pairs(band) for band in range(self.bands)], self.n)
+
+def _window_pairs(rows, keys, order, window):
+    """
+    Directed pairs of rows sharing a key that are at most `window` apart once each key's
+    rows are sorted by `order` (sorted-neighbourhood blocking; linear in rows * window).
+    """
+    o = np.lexsort((order[rows], keys))
+    rows, keys = rows[o], keys[o]
+    src, tgt = [], []
+    for d in range(1, min(window, len(rows) - 1) + 1):
+        same = keys[d:] == keys[:-d]
+        a, b = rows[:-d][same], rows[d:][same]
+        src += [a, b]
+        tgt += [b, a]
+    if not src:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    src, tgt = np.concatenate(src), np.concatenate(tgt)
+    keep = src != tgt
+    return src[keep], tgt[keep]
+
+def genre_neighbour_pairs(store, windows=GENRE_WINDOWS):
+    """
+    Directed (source_row, target_row) candidates from genre/year neighbourhoods: for
+    each genre key family (exact set, set minus one genre, single genre), the movies
+    closest in year (then rating) among those sharing the key. Movies without genres
+    get none.
+    """
+    genres = np.asarray(store.genres, dtype=np.uint64)
+    order = np.asarray(store.year, dtype=np.float64) + np.asarray(store.rating, dtype=np.float64) / 100.0
+    rows_all = np.arange(len(genres))
+    has_genre = genres != 0
+    bits = [np.uint64(1) << np.uint64(b) for b in range(len(store.genre_vocab))]
+
+    # (rows, keys) of every family; masks are compared as int64 (bit 63 just flips the sign)
+    families = [(rows_all[has_genre], genres[has_genre].view(np.int64))]
+    dropped_rows, dropped_keys, single_rows, single_keys = [], [], [], []
+    for b, bit in enumerate(bits):
+        member = (genres & bit) != 0
+        multi = member & (genres != bit)
+        dropped_rows.append(rows_all[multi])
+        dropped_keys.append((genres[multi] & ~bit).view(np.int64))
+        single_rows.append(rows_all[member])
+        single_keys.append(np.full(int(member.sum()), b, dtype=np.int64))
+    # A set and the sets one genre larger meet in the "dropped" family through the set itself
+    families.append((np.concatenate([families[0][0]] + dropped_rows),
+                     np.concatenate([families[0][1]] + dropped_keys)))
+    families.append((np.concatenate(single_rows) if single_rows else rows_all[:0],
+                     np.concatenate(single_keys) if single_keys else rows_all[:0]))
+
+    pairs = [_window_pairs(rows, keys, order, window) for (rows, keys), window in zip(families, windows)]
+    return merge_pairs(pairs, len(genres))
+
+def merge_pairs(pairs, n):
+    """Union of several (src, tgt) candidate lists, deduplicated and sorted by source."""
+    keys = [src * n + tgt for src, tgt in pairs if len(src)]
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Sort + adjacent dedupe: several times faster than np.unique on tens of millions of keys
+    keys = np.concatenate(keys)
+    keys.sort()
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return keys // n, keys % n
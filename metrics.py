@@ -0,0 +1,92 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+class Metrics:
+    """
+    Named counters and timers for a batch job.
+    Timers accumulate seconds and calls; to_dict()/merge() let worker processes
+    send their numbers back to the parent.
+    """
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(lambda: [0.0, 0])
+
+    def add(self, name, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name, seconds, calls=1):
+        t = self.timers[name]
+        t[0] += seconds
+        t[1] += calls
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def to_dict(self):
+        return {"counters": dict(self.counters),
+                "timers": {name: {"seconds": round(s, 6), "calls": c} for name, (s, c) in self.timers.items()}}
+
+    def merge(self, other):
+        for name, n in other["counters"].items():
+            self.add(name, n)
+        for name, t in other["timers"].items():
+            self.add_time(name, t["seconds"], t["calls"])
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+
+    def report(self):
+        for name, n in sorted(self.counters.items()):
+            print(f"  {name.ljust(28)} {n:>16,}")
+        for name, (seconds, calls) in sorted(self.timers.items(), key=lambda kv: -kv[1][0]):
+            print(f"  {name.ljust(28)} {seconds:>12.3f} s  ({calls:,} calls)")
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+class NullMetrics:
+    """Drop-in for Metrics when nothing is being recorded."""
+    def add(self, name, n=1):
+        pass
+
+    def add_time(self, name, seconds, calls=1):
+        pass
+
+    def timer(self, name):
+        return nullcontext()
+
+NULL_METRICS = NullMetrics()
+
+# --- PROFILING ---
+# NXT_PROFILE=<dir> runs the wrapped block under cProfile and dumps <dir>/<name>.prof
+# (read it with `python -m pstats` or snakeviz). Sampling profilers need no hook:
+#   py-spy record -o profile.svg -- python compute_recommendations.py
+PROFILE_ENV = "NXT_PROFILE"
+
+@contextmanager
+def profiled(name):
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not profile_dir:
+        yield
+        return
+    import cProfile
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, f"{name}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
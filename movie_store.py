@@ -0,0 +1,143 @@
+import numpy as np
+from array_file import save_arrays, load_arrays
+
+class StringTable:
+    """Read-only list of strings stored as one UTF-8 blob + offsets (mmap friendly)."""
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings):
+        encoded = [s.encode() for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
+
+class MovieStore:
+    """
+    Columnar replacement for the list of movie vectors.
+    - keywords / cast / directors: tokens interned to int32 IDs (vocab sorted, so IDs
+      follow string order), stored per movie as sorted CSR slices (indptr + ids)
+    - cast scores (rank decay) aligned with the cast IDs
+    - genres: one uint64 bitmask per movie
+    - year / rating: numpy columns
+    save()/load() use array_file, so a loaded store is a set of memory-mapped views.
+    """
+    SET_FIELDS = ['keywords', 'cast', 'directors']
+
+    def __init__(self, arrays, genre_vocab):
+        self.arrays = arrays
+        self.genre_vocab = list(genre_vocab)
+        self.ids = arrays['ids']
+        self.year = arrays['year']
+        self.rating = arrays['rating']
+        self.genres = arrays['genres']
+        self.cast_scores = arrays['cast.scores']
+        self.titles = StringTable(arrays['titles.blob'], arrays['titles.offsets'])
+        self.vocab = {field: StringTable(arrays[f'{field}.vocab.blob'], arrays[f'{field}.vocab.offsets'])
+                      for field in self.SET_FIELDS}
+        self.index = {mid: i for i, mid in enumerate(self.ids.tolist())}
+        self._csr = {field: (arrays[f'{field}.indptr'], arrays[f'{field}.ids']) for field in self.SET_FIELDS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- BUILD ---
+    @classmethod
+    def from_vectors(cls, movies):
+        """Builds a store from movie_vectorizer.process_movie() dicts (duplicate IDs: last copy wins)."""
+        movies = list({m['id']: m for m in movies}.values())
+        n = len(movies)
+
+        genre_vocab = sorted(set().union(*(m['genres'] for m in movies))) if movies else []
+        if len(genre_vocab) > 64:
+            raise ValueError(f"{len(genre_vocab)} genres do not fit a 64-bit mask")
+        genre_bit = {g: 1 << b for b, g in enumerate(genre_vocab)}
+
+        arrays = {
+            'ids': np.array([m['id'] for m in movies], dtype=np.int64),
+            'year': np.array([m['year'] for m in movies], dtype=np.int32),
+            'rating': np.array([m['rating'] for m in movies], dtype=np.float64),
+            'genres': np.array([sum(genre_bit[g] for g in m['genres']) for m in movies], dtype=np.uint64),
+        }
+        titles = StringTable.from_list([m.get('title', '') for m in movies])
+        arrays['titles.blob'], arrays['titles.offsets'] = titles.blob, titles.offsets
+
+        for field in cls.SET_FIELDS:
+            vocab = sorted(set().union(*(m[field] for m in movies))) if movies else []
+            token_id = {t: j for j, t in enumerate(vocab)}
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            ids = []
+            scores = []
+            for i, m in enumerate(movies):
+                row = sorted(token_id[t] for t in m[field])
+                ids.extend(row)
+                if field == 'cast':
+                    scores.extend(m['cast'][vocab[j]] for j in row)
+                indptr[i + 1] = len(ids)
+            arrays[f'{field}.indptr'] = indptr
+            arrays[f'{field}.ids'] = np.array(ids, dtype=np.int32)
+            if field == 'cast':
+                arrays['cast.scores'] = np.array(scores, dtype=np.float64)
+            table = StringTable.from_list(vocab)
+            arrays[f'{field}.vocab.blob'], arrays[f'{field}.vocab.offsets'] = table.blob, table.offsets
+
+        return cls(arrays, genre_vocab)
+
+    def save(self, path):
+        save_arrays(path, self.arrays, meta={"kind": "movie_store", "genres": self.genre_vocab})
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        arrays, meta = load_arrays(path, mmap=mmap)
+        if meta.get("kind") != "movie_store":
+            raise ValueError(f"{path} is not a MovieStore file")
+        return cls(arrays, meta["genres"])
+
+    # --- ROW ACCESS ---
+    def tokens(self, field, i):
+        """Sorted int32 token IDs of movie row i for 'keywords', 'cast' or 'directors'."""
+        indptr, ids = self._csr[field]
+        return ids[indptr[i]:indptr[i + 1]]
+
+    def cast(self, i):
+        """(sorted cast IDs, aligned rank-decay scores) of movie row i."""
+        indptr, ids = self._csr['cast']
+        lo, hi = indptr[i], indptr[i + 1]
+        return ids[lo:hi], self.cast_scores[lo:hi]
+
+    def genre_names(self, mask):
+        return {g for b, g in enumerate(self.genre_vocab) if (mask >> b) & 1}
+
+    def genre_matrix(self):
+        """(n_movies, n_genres) 0/1 matrix unpacked from the bitmasks."""
+        bits = np.arange(len(self.genre_vocab), dtype=np.uint64)
+        return ((self.genres[:, None] >> bits[None, :]) & np.uint64(1)).astype(np.float64)
+
+    def vectors(self):
+        """Rebuilds the legacy list of movie dicts (for code that still works on sets of strings)."""
+        vocab = {field: self.vocab[field].tolist() for field in self.SET_FIELDS}
+        movies = []
+        for i in range(len(self)):
+            cast_ids, cast_scores = self.cast(i)
+            movies.append({
+                "id": int(self.ids[i]),
+                "title": self.titles[i],
+                "year": int(self.year[i]),
+                "rating": float(self.rating[i]),
+                "keywords": {vocab['keywords'][j] for j in self.tokens('keywords', i)},
+                "cast": {vocab['cast'][j]: float(s) for j, s in zip(cast_ids, cast_scores)},
+                "directors": {vocab['directors'][j] for j in self.tokens('directors', i)},
+                "genres": self.genre_names(int(self.genres[i])),
+            })
+        return movies
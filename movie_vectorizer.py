@@ -1,11 +1,14 @@
-import json
 import math
+import os
 import pickle
+from movie_store import MovieStore
+from ndjson_io import iter_records, resolve
 
 # --- CONFIG ---
-RAW_DATA_FILE = "tmdb_10k_movies_detailed.json"
+RAW_DATA_FILE = "tmdb_10k_movies_detailed.ndjson"
 WEIGHTS_FILE = "keyword_weights.pkl"
 OUTPUT_VECTORS_FILE = "movie_vectors.pkl"
+OUTPUT_STORE_FILE = "movie_store.bin"  # Columnar, memory-mappable copy of the vectors
 
 def load_weights():
     try:
@@ -58,20 +61,19 @@ def main():
     weights = load_weights()
     if not weights: return
 
-    try:
-        with open(RAW_DATA_FILE, 'r') as f:
-            raw_movies = json.load(f)
-    except FileNotFoundError:
+    raw_file = resolve(RAW_DATA_FILE)
+    if not os.path.exists(raw_file):
         print(f"Error: {RAW_DATA_FILE} not found.")
         return
 
-    # 2. Vectorize
-    print(f"Vectorizing {len(raw_movies)} movies...")
+    # 2. Vectorize (raw records are streamed, only the vectors are kept)
+    print(f"Vectorizing movies from {raw_file}...")
     processed_data = []
     
-    for movie in raw_movies:
+    for movie in iter_records(raw_file):
         vec = process_movie(movie, weights)
         processed_data.append(vec)
+    print(f"Vectorized {len(processed_data)} movies.")
 
     # 3. Save
     # We save ONLY the movies list. The weights are already safe in the other file.
@@ -80,5 +82,9 @@ def main():
 
     print(f"SUCCESS: Processed movie vectors saved to {OUTPUT_VECTORS_FILE}")
 
+    # 4. Columnar store (what train_weights / compute_recommendations load first)
+    MovieStore.from_vectors(processed_data).save(OUTPUT_STORE_FILE)
+    print(f"SUCCESS: MovieStore saved to {OUTPUT_STORE_FILE}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
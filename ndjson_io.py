@@ -0,0 +1,101 @@
+import json
+import os
+
+class NDJSONWriter:
+    """
+    Append-only writer, one JSON record per line.
+    A checkpoint is a flush + fsync every `fsync_every` records, so its cost doesn't
+    grow with the file. A torn last line from a crash is cut off when reopening.
+    """
+    def __init__(self, path, fsync_every=100):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._pending = 0
+        _truncate_partial_line(path)
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self._pending = 0
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _truncate_partial_line(path):
+    # Everything after the last newline is a record that never finished writing
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                f.truncate(pos + nl + 1)
+                return
+        f.truncate(0)
+
+def iter_records(path):
+    """
+    Streams records from an NDJSON file one at a time (flat memory).
+    A legacy JSON array file (starts with '[') is still accepted, but loaded whole.
+    A malformed final line (interrupted write) is skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        if head == '[':
+            f.seek(0)
+            yield from json.load(f)
+            return
+        f.seek(0)
+
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: skipping malformed line {line_no} in {path}")
+
+def resolve(path):
+    """
+    Returns path, or the legacy JSON array written by older crawls
+    (same name, .json) when the NDJSON file doesn't exist yet.
+    """
+    if not os.path.exists(path):
+        legacy = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(legacy):
+            return legacy
+    return path
+
+def existing_ids(path):
+    """IDs already present in a crawl output (empty set if it doesn't exist yet)."""
+    if not os.path.exists(path):
+        return set()
+    return {record['id'] for record in iter_records(path)}
@@ -0,0 +1,140 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# Labelled training pairs, one row per unordered movie pair (SQLite, WAL mode).
+# Every script that produces labels appends here; nothing rewrites the file.
+#   python pair_store.py import training_pairs.csv   (migrate a legacy pair CSV)
+#   python pair_store.py stats
+
+# --- CONFIG ---
+PAIRS_FILE = "training_pairs.db"
+SEED = 42  # Default seed for read-time shuffles/splits
+
+# Where a label came from
+TMDB_RECOMMENDATION = "tmdb_recommendation"
+FRANCHISE = "franchise"
+NEGATIVE_SAMPLER = "negative_sampler"
+IMPORTED = "imported"  # Legacy CSV rows (source unknown)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    id_lo INTEGER NOT NULL,
+    id_hi INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (id_lo, id_hi)
+) WITHOUT ROWID
+"""
+
+def seeded_split(n, test_size=0.2, seed=SEED):
+    """(train indices, test indices) of a seeded permutation of range(n)."""
+    order = np.random.default_rng(seed).permutation(n)
+    n_test = int(round(n * test_size))
+    return order[n_test:], order[:n_test]
+
+class PairStore:
+    """
+    Training pairs keyed on the unordered pair (min ID, max ID), so (A, B) and (B, A)
+    are the same row. Inserts dedupe against the primary key, so adding a batch costs
+    O(new pairs log n) regardless of the store's size. The first label of a pair is
+    kept, except that a positive replaces a sampled (or legacy imported) negative: the
+    sampler only guesses that two movies are unrelated, a TMDB recommendation or a
+    shared collection doesn't.
+    """
+    def __init__(self, path=PAIRS_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def add(self, pairs, target, source):
+        """
+        Adds (id_A, id_B) pairs with one label and source. Self-pairs are dropped.
+        Returns {'added', 'relabelled', 'duplicates'} counts.
+        """
+        now = time.time()
+        rows = [(min(a, b), max(a, b), int(target), source, now) for a, b in pairs if a != b]
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO pairs VALUES (?,?,?,?,?)", rows)
+            added = self.conn.total_changes - before
+            relabelled = 0
+            if target == 1:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    "UPDATE pairs SET target = 1, source = ?, added_at = ? "
+                    "WHERE id_lo = ? AND id_hi = ? AND target = 0 AND source IN (?, ?)",
+                    [(source, now, lo, hi, NEGATIVE_SAMPLER, IMPORTED) for lo, hi, *_ in rows])
+                relabelled = self.conn.total_changes - before
+        return {"added": added, "relabelled": relabelled, "duplicates": len(rows) - added - relabelled}
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+    def counts(self):
+        """{(source, target): pairs}."""
+        return {(source, target): n for source, target, n in
+                self.conn.execute("SELECT source, target, COUNT(*) FROM pairs GROUP BY source, target")}
+
+    def load(self, sources=None, seed=None):
+        """
+        DataFrame (movie_A, movie_B, target, source) in key order, or shuffled with a
+        seeded permutation when `seed` is given. `sources` restricts to those labels.
+        """
+        query = "SELECT id_lo, id_hi, target, source FROM pairs"
+        params = ()
+        if sources:
+            query += f" WHERE source IN ({','.join('?' * len(sources))})"
+            params = tuple(sources)
+        df = pd.DataFrame(self.conn.execute(query, params).fetchall(),
+                          columns=['movie_A', 'movie_B', 'target', 'source'])
+        if seed is not None:
+            df = df.iloc[np.random.default_rng(seed).permutation(len(df))].reset_index(drop=True)
+        return df
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def import_csv(store, csv_path, source=IMPORTED):
+    """Adds a legacy movie_A,movie_B,target CSV; positives first so conflicts resolve the same way."""
+    df = pd.read_csv(csv_path)
+    stats = {}
+    for target in (1, 0):
+        part = df[df['target'] == target]
+        stats[target] = store.add(zip(part['movie_A'].astype(int).tolist(), part['movie_B'].astype(int).tolist()),
+                                  target, source)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or fill the training pair store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Add the pairs of a movie_A,movie_B,target CSV")
+    imp.add_argument("csv", nargs="+")
+    imp.add_argument("--source", default=IMPORTED)
+    sub.add_parser("stats", help="Pairs per label source")
+    parser.add_argument("--store", default=PAIRS_FILE)
+    args = parser.parse_args()
+
+    if args.command == "stats" and not os.path.exists(args.store):
+        parser.error(f"{args.store} not found")
+    with PairStore(args.store) as store:
+        if args.command == "import":
+            for path in args.csv:
+                for target, stats in import_csv(store, path, args.source).items():
+                    print(f"{path} (target={target}): {stats}")
+        for (source, target), n in sorted(store.counts().items()):
+            print(f"{source:<22} target={target}  {n}")
+        print(f"Total: {len(store)} pairs")
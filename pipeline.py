@@ -0,0 +1,311 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from feature_cache import file_digest
+import load_data
+import load_complete_data
+import keyword_weigher
+import movie_vectorizer
+import collection_index
+import load_training_data
+import add_franchise_pairs
+import train_weights
+import compute_recommendations
+import fetch_final_data
+
+# Offline pipeline runner. Every stage declares the artifacts it reads and writes; a
+# manifest records their content hashes (plus the hash of the stage's code) after each
+# successful run, and a stage only re-executes when one of them changed, an output is
+# missing, or an upstream stage just re-ran. Stages whose inputs are ready run in parallel.
+#   python pipeline.py                     # bring everything up to date
+#   python pipeline.py --dry-run           # show what would run and why
+#   python pipeline.py train_weights       # one stage (and whatever it needs)
+#   python pipeline.py --force load_complete_data
+
+# --- CONFIG ---
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))  # Scripts; artifacts live in the working directory
+MANIFEST_FILE = "pipeline_manifest.json"
+LOG_DIR = "pipeline_logs"
+DEFAULT_JOBS = 2
+
+def local_imports(script, seen=None):
+    """Repo modules `script` imports, directly or through other repo modules (sorted file names)."""
+    seen = set() if seen is None else seen
+    with open(os.path.join(REPO_DIR, script), 'r') as f:
+        tree = ast.parse(f.read(), filename=script)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            path = name.split('.')[0] + ".py"
+            if path not in seen and path != script and os.path.exists(os.path.join(REPO_DIR, path)):
+                seen.add(path)
+                local_imports(path, seen)
+    return sorted(seen - {script})
+
+class Stage:
+    """One step of the pipeline: scripts run in order, with the artifacts they read and write."""
+    def __init__(self, name, scripts, inputs, outputs, code=(), adopt=False):
+        self.name = name
+        self.scripts = scripts  # [[script, args...], ...]
+        self.inputs = inputs
+        self.outputs = outputs
+        # Files whose content defines the stage besides its inputs: its scripts, every repo
+        # module they import (transitively) and any extra helpers named in `code`
+        files = [s[0] for s in scripts]
+        files += [path for script in files for path in local_imports(script)] + list(code)
+        self.code = [os.path.join(REPO_DIR, path) for path in dict.fromkeys(files)]
+        # TMDB stages: outputs that predate the manifest (or were edited) are taken as they
+        # are instead of being fetched again (--force re-fetches)
+        self.adopt = adopt
+
+CRAWL = load_complete_data.OUTPUT_JSON
+
+STAGES = [
+    Stage("load_data", [["load_data.py"]], [], [load_data.OUTPUT_FILE], adopt=True),
+    Stage("load_complete_data", [["load_complete_data.py"]], [load_complete_data.INPUT_CSV], [CRAWL],
+          adopt=True),
+    Stage("keyword_weigher", [["keyword_weigher.py"]], [keyword_weigher.INPUT_FILE],
+          [keyword_weigher.OUTPUT_WEIGHTS_FILE]),
+    Stage("movie_vectorizer", [["movie_vectorizer.py"]],
+          [movie_vectorizer.RAW_DATA_FILE, movie_vectorizer.WEIGHTS_FILE],
+          [movie_vectorizer.OUTPUT_VECTORS_FILE, movie_vectorizer.OUTPUT_STORE_FILE]),
+    # Offline: collection IDs come from the crawl (old records from the response cache)
+    Stage("collection_index", [["collection_index.py"]], [collection_index.INPUT_FILE],
+          [collection_index.OUTPUT_FILE]),
+    # Both scripts append to the same pair store, so they are one stage
+    Stage("training_pairs", [["load_training_data.py"], ["add_franchise_pairs.py"]],
+          [load_training_data.INPUT_FILE, add_franchise_pairs.INDEX_FILE], [load_training_data.OUTPUT_FILE],
+          adopt=True),
+    Stage("train_weights", [["train_weights.py"]],
+          [train_weights.STORE_FILE, train_weights.WEIGHTS_FILE, train_weights.TRAINING_DATA],
+          [train_weights.OUTPUT_MODEL]),
+    Stage("compute_recommendations", [["compute_recommendations.py"]],
+          [compute_recommendations.STORE_FILE, compute_recommendations.WEIGHTS_FILE,
+           compute_recommendations.KEYWORD_W_FILE],
+          [compute_recommendations.DB_FILE, compute_recommendations.TOPK_FILE]),
+    Stage("fetch_final_data", [["fetch_final_data.py"]], [fetch_final_data.INPUT_VECTORS],
+          [fetch_final_data.OUTPUT_FILE], adopt=True),
+]
+
+# --- MANIFEST ---
+class Manifest:
+    """
+    pipeline_manifest.json: the hashes each stage last ran with, plus a
+    (size, mtime) -> sha256 cache so unchanged multi-GB artifacts aren't re-read.
+    """
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.data = {"stages": {}, "files": {}}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.data = json.load(f)
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        """sha256 of `path`, or None when it doesn't exist."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            entry = self.data["files"].get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        digest = file_digest(path)
+        with self._lock:
+            self.data["files"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def snapshot(self, paths):
+        return {path: self.digest(path) for path in paths}
+
+    def reason_to_run(self, stage):
+        """Why `stage` is out of date (None when its recorded run still matches)."""
+        with self._lock:
+            record = self.data["stages"].get(stage.name)
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            return f"missing {', '.join(missing)}"
+        if record is None:
+            return "never ran"
+        checks = [("inputs", stage.inputs)]
+        if not stage.adopt:
+            # Fetching stages only re-run for new inputs (or --force): a code change or a
+            # hand-edited output (e.g. curated pairs added to training_pairs.db) doesn't re-fetch, and
+            # the edited file's new hash is what downstream stages see
+            checks += [("code", stage.code), ("outputs", stage.outputs)]
+        for kind, paths in checks:
+            changed = [p for p, h in self.snapshot(paths).items() if record[kind].get(p) != h]
+            if changed:
+                return f"{kind} changed: {', '.join(changed)}"
+        return None
+
+    def adoptable(self, stage):
+        """A fetching stage whose existing outputs aren't in the manifest (yet, or since an edit)."""
+        if not stage.adopt or not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        with self._lock:
+            record = self.data["stages"].get(stage.name)
+        return record is None or record["outputs"] != self.snapshot(stage.outputs)
+
+    def record(self, stage, before, seconds):
+        # Code/inputs as they were when the stage started, outputs as it left them
+        entry = {
+            "code": before["code"],
+            "inputs": before["inputs"],
+            "outputs": self.snapshot(stage.outputs),
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": round(seconds, 1),
+        }
+        with self._lock:
+            self.data["stages"][stage.name] = entry
+            self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+# --- GRAPH ---
+def upstream_of(stages):
+    """{stage name: names of the stages producing its inputs}."""
+    producer = {}
+    for stage in stages:
+        for path in stage.outputs:
+            producer[path] = stage.name
+    return {stage.name: {producer[p] for p in stage.inputs if p in producer and producer[p] != stage.name}
+            for stage in stages}
+
+def select(stages, targets):
+    """The target stages plus everything they (transitively) depend on, in declaration order."""
+    if not targets:
+        return list(stages)
+    deps = upstream_of(stages)
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(deps[name])
+    return [stage for stage in stages if stage.name in needed]
+
+# --- RUNNER ---
+def run_stage(stage):
+    """Runs the stage's scripts in order; returns (ok, seconds, log path)."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+    start = time.time()
+    with open(log_path, 'w') as log:
+        for script in stage.scripts:
+            log.write(f"$ {' '.join(script)}\n")
+            log.flush()
+            result = subprocess.run([sys.executable, os.path.join(REPO_DIR, script[0])] + script[1:],
+                                    stdout=log, stderr=subprocess.STDOUT)
+            if result.returncode != 0:
+                return False, time.time() - start, log_path
+    # Some scripts report a problem (e.g. no API key) and exit 0 without writing anything
+    missing = [path for path in stage.outputs if not os.path.exists(path)]
+    if missing:
+        with open(log_path, 'a') as log:
+            log.write(f"pipeline: expected outputs missing: {', '.join(missing)}\n")
+        return False, time.time() - start, log_path
+    return True, time.time() - start, log_path
+
+def run(stages, manifest, jobs=DEFAULT_JOBS, force=(), dry_run=False):
+    """
+    Runs out-of-date stages as soon as their upstream stages are settled, up to `jobs`
+    at a time. A stage whose upstream re-ran is re-checked against the new hashes, so
+    a rerun that reproduces identical artifacts still stops the cascade.
+    Returns {stage name: "ran" | "skipped" | "failed" | "blocked" | "would run"}.
+    """
+    deps = upstream_of(stages)
+    by_name = {stage.name: stage for stage in stages}
+    status = {}
+    running = {}
+
+    def settle(stage):
+        """Decides a stage whose upstream is settled; returns a reason to run it, or None."""
+        upstream = {status[d] for d in deps[stage.name] if d in status}
+        if upstream & {"failed", "blocked"}:
+            status[stage.name] = "blocked"
+            print(f"[{stage.name}] blocked: an upstream stage failed")
+            return None
+        if stage.name in force or "all" in force:
+            return "forced"
+        if dry_run and "would run" in upstream:
+            return "upstream will re-run"
+        if manifest.adoptable(stage):
+            print(f"[{stage.name}] adopting existing {', '.join(stage.outputs)}")
+            if not dry_run:
+                manifest.record(stage, {"code": manifest.snapshot(stage.code),
+                                        "inputs": manifest.snapshot(stage.inputs)}, 0)
+            return None
+        return manifest.reason_to_run(stage)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        pending = list(stages)
+        while pending or running:
+            for stage in list(pending):
+                if any(d not in status for d in deps[stage.name]):
+                    continue
+                pending.remove(stage)
+                reason = settle(stage)
+                if stage.name in status:
+                    continue
+                if reason is None:
+                    status[stage.name] = "skipped"
+                    print(f"[{stage.name}] up to date")
+                elif dry_run:
+                    status[stage.name] = "would run"
+                    print(f"[{stage.name}] would run ({reason})")
+                else:
+                    print(f"[{stage.name}] running ({reason})...")
+                    before = {"code": manifest.snapshot(stage.code), "inputs": manifest.snapshot(stage.inputs)}
+                    running[pool.submit(run_stage, stage)] = (stage.name, before)
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, before = running.pop(future)
+                ok, seconds, log_path = future.result()
+                if ok:
+                    manifest.record(by_name[name], before, seconds)
+                    status[name] = "ran"
+                    print(f"[{name}] done in {seconds:.1f}s")
+                else:
+                    status[name] = "failed"
+                    print(f"[{name}] FAILED after {seconds:.1f}s, see {log_path}")
+    return status
+
+if __name__ == "__main__":
+    names = [stage.name for stage in STAGES]
+    parser = argparse.ArgumentParser(description="Run the offline pipeline, skipping stages whose inputs didn't change.")
+    parser.add_argument("targets", nargs="*", metavar="STAGE",
+                        help=f"Stages to bring up to date, with their dependencies (default: all). One of: {', '.join(names)}")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Stages run in parallel at most")
+    parser.add_argument("--force", nargs="+", default=[], choices=names + ["all"], metavar="STAGE",
+                        help="Re-run these stages even if nothing changed ('all' for every stage)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would run and why")
+    args = parser.parse_args()
+    unknown = [name for name in args.targets if name not in names]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    status = run(select(STAGES, args.targets), Manifest(), args.jobs, set(args.force), args.dry_run)
+    counts = {s: sum(1 for v in status.values() if v == s) for s in dict.fromkeys(status.values())}
+    print("Summary: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+    sys.exit(1 if "failed" in counts or "blocked" in counts else 0)
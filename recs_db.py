@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import uuid
+
+# --- SCHEMA ---
+# One row per (source, rank); WITHOUT ROWID keeps each list contiguous in the primary key B-tree
+PREDS_SCHEMA = """
+CREATE TABLE preds (
+    source_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (source_id, rank)
+) WITHOUT ROWID
+"""
+# Built after the bulk insert, not before ("who lists me" lookups)
+PREDS_INDEXES = ["CREATE INDEX idx_target ON preds (target_id)"]
+
+# Safe only because the staging file is thrown away on any failure
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MB
+]
+
+def staging_path(db_file):
+    return f"{db_file}.tmp"
+
+def open_staging(db_file, copy_existing=False):
+    """
+    Opens a private staging copy of db_file with bulk-load pragmas.
+    copy_existing starts from the current published database (incremental runs),
+    otherwise the staging database starts empty.
+    """
+    tmp_path = staging_path(db_file)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    if copy_existing and os.path.exists(db_file):
+        src = sqlite3.connect(db_file)
+        src.backup(conn)
+        src.close()
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def create_preds(conn):
+    conn.execute("DROP TABLE IF EXISTS preds")
+    conn.execute(PREDS_SCHEMA)
+
+def build_indexes(conn):
+    for statement in PREDS_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+def validate(conn, expected_rows, expected_lists=None):
+    """Raises RuntimeError if preds doesn't hold exactly what the caller wrote."""
+    rows = conn.execute("SELECT COUNT(*) FROM preds").fetchone()[0]
+    if rows != expected_rows:
+        raise RuntimeError(f"preds has {rows} rows, expected {expected_rows}")
+    if expected_lists is not None:
+        lists = conn.execute("SELECT COUNT(DISTINCT source_id) FROM preds").fetchone()[0]
+        if lists != expected_lists:
+            raise RuntimeError(f"preds has {lists} source lists, expected {expected_lists}")
+
+def publish(conn, db_file, artifacts=()):
+    """
+    Closes the staging database and atomically renames it over db_file, then does the
+    same for every artifact staged at staging_path(artifact). Artifacts go after the
+    database: they are derived from it and carry its build_id, so a crash in between
+    leaves an artifact the readers can tell is stale, never one ahead of the database.
+    """
+    conn.commit()
+    conn.close()
+    os.replace(staging_path(db_file), db_file)
+    for path in artifacts:
+        os.replace(staging_path(path), path)
+
+def discard(conn, db_file, artifacts=()):
+    conn.close()
+    for path in (db_file, *artifacts):
+        tmp_path = staging_path(path)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def stamp_build(conn):
+    """Gives this database a fresh build_id (returned) for the artifacts exported from it."""
+    new_id = uuid.uuid4().hex
+    conn.execute("CREATE TABLE IF NOT EXISTS build_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR REPLACE INTO build_meta VALUES ('build_id', ?)", (new_id,))
+    conn.commit()
+    return new_id
+
+def build_id(conn):
+    """ID of the build that wrote this database (None for databases that predate it)."""
+    try:
+        row = conn.execute("SELECT value FROM build_meta WHERE key = 'build_id'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
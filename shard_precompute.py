@@ -0,0 +1,317 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import pickle
+import socket
+import time
+import uuid
+import numpy as np
+import compute_recommendations as cr
+import recs_db
+from array_file import save_arrays, load_arrays
+from feature_cache import file_digest
+from sparse_scorer import SparseScorer
+
+# Sharded, resumable precompute (sparse engine). The catalog is split into source-ID
+# ranges listed in a manifest; any number of workers (processes on one host, or hosts
+# sharing SHARD_DIR) claim shards through lock files and write one artifact per finished
+# shard. Finished shards are never redone, so a crash only loses the shards in flight.
+#   python shard_precompute.py plan --shards 64
+#   python shard_precompute.py work              # on every host, as often as wanted
+#   python shard_precompute.py merge             # once all shards are done
+#   python shard_precompute.py run --procs 4     # all three on this host
+#   python shard_precompute.py status
+
+# --- CONFIG ---
+SHARD_DIR = "shards"
+MANIFEST_FILE = "manifest.json"
+DEFAULT_SHARDS = 64
+STALE_AFTER = 900  # Seconds without a heartbeat before another worker may take a claim over
+
+def catalog_file():
+    return cr.STORE_FILE if os.path.exists(cr.STORE_FILE) else cr.MOVIES_FILE
+
+def shard_path(shard_dir, shard):
+    return os.path.join(shard_dir, f"shard_{shard['shard']:05d}.bin")
+
+def lock_path(shard_dir, shard):
+    return os.path.join(shard_dir, f"shard_{shard['shard']:05d}.lock")
+
+# --- MANIFEST ---
+def load_manifest(shard_dir):
+    path = os.path.join(shard_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise RuntimeError(f"No shard manifest in {shard_dir}. Run `shard_precompute.py plan` first.")
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def build_key(genre_filter):
+    """What every shard must have been computed from: catalog + weights + settings."""
+    return {"catalog": file_digest(catalog_file()), "build": cr.build_fingerprint(genre_filter)}
+
+def plan(shard_dir=SHARD_DIR, n_shards=DEFAULT_SHARDS, genre_filter=True, replan=False):
+    """
+    Writes the shard manifest: sorted source IDs cut into `n_shards` ranges.
+    An existing manifest for the same catalog and weights is kept (so finished shards
+    still count); one for another build is only replaced with `replan`.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, MANIFEST_FILE)
+    key = build_key(genre_filter)
+    if os.path.exists(path):
+        old = load_manifest(shard_dir)
+        if {k: old[k] for k in key} == key:
+            print(f"Manifest for this build already exists ({len(old['shards'])} shards), keeping it.")
+            return old
+        if not replan:
+            raise RuntimeError(f"{path} belongs to another catalog/weights build. Use --replan to start over.")
+        for shard in old["shards"]:
+            for p in (shard_path(shard_dir, shard), lock_path(shard_dir, shard)):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    store = cr.load_catalog()
+    ids = np.sort(np.asarray(store.ids, dtype=np.int64))
+    chunks = [c for c in np.array_split(ids, max(1, min(n_shards, len(ids)))) if len(c)]
+    manifest = dict(key, genre_filter=genre_filter, top_k=cr.TOP_K,
+                    created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    shards=[{"shard": i, "first_id": int(c[0]), "last_id": int(c[-1]), "sources": len(c)}
+                            for i, c in enumerate(chunks)])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    print(f"Planned {len(chunks)} shards over {len(ids)} movies in {shard_dir}.")
+    return manifest
+
+# --- CLAIMS ---
+class ClaimLost(Exception):
+    """Our lock was taken over (we stalled past STALE_AFTER): the shard belongs to someone else now."""
+
+def lock_token(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("token")
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _take_over(path, token):
+    """
+    Moves a stale lock out of the way. Returns True to retry the claim, False to give up.
+    Two workers can both judge one lock stale; the slower one's rename would then move the
+    faster one's fresh claim. So the moved file is checked once it is private (nobody can
+    touch it any more): if it turns out fresh, it is linked back.
+    """
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return True  # Released meanwhile
+    if age < STALE_AFTER:
+        return False
+    moved = f"{path}.stale.{token}"
+    try:
+        os.rename(path, moved)
+    except FileNotFoundError:
+        return False  # Another worker moved it first
+    age = time.time() - os.stat(moved).st_mtime
+    if age < STALE_AFTER:
+        try:
+            os.link(moved, path)
+        except FileExistsError:
+            pass  # Re-claimed in between: its first owner finds out at its next heartbeat
+        os.remove(moved)
+        return False
+    os.remove(moved)
+    print(f"Took over {path} (no heartbeat for {age:.0f}s)")
+    return True
+
+def try_claim(path, token):
+    """
+    The lock is written to a private temp file and hard-linked into place: os.link fails
+    if the lock exists (atomic on local filesystems and NFS), and a lock is never seen
+    half-written. A lock whose heartbeat is older than STALE_AFTER belongs to a dead
+    worker and is taken over (_take_over). The claim holds only if the lock then carries
+    `token`; heartbeat() keeps checking that while the shard is computed.
+    """
+    tmp = f"{path}.{token}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"token": token, "host": socket.gethostname(), "pid": os.getpid(),
+                   "claimed": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+    try:
+        for _ in range(2):
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                if not _take_over(path, token):
+                    return False
+                continue
+            return lock_token(path) == token
+        return False
+    finally:
+        os.remove(tmp)
+
+def heartbeat(path, token):
+    """Refreshes our lock; raises ClaimLost if it isn't ours any more."""
+    if lock_token(path) != token:
+        raise ClaimLost(path)
+    os.utime(path)
+
+def release(path, token):
+    # Only remove our own lock (it may have been taken over while we were stalled)
+    if lock_token(path) == token:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# --- WORKER ---
+def compute_shard(scorer, rows, learned_weights, genre_filter, heartbeat):
+    """Top-K lists of `rows` (dense indices, ascending source ID) as flat arrays."""
+    source_ids, counts, targets, scores = [], [], [], []
+    for start in range(0, len(rows), cr.BLOCK_SIZE):
+        for source_id, top in scorer.top_k(rows[start:start + cr.BLOCK_SIZE], learned_weights, cr.TOP_K, genre_filter):
+            source_ids.append(source_id)
+            counts.append(len(top))
+            scores.extend(score for score, _ in top)
+            targets.extend(tid for _, tid in top)
+        heartbeat()
+    offsets = np.zeros(len(source_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    return {
+        "source_ids": np.array(source_ids, dtype=np.int64),
+        "offsets": offsets,
+        "targets": np.array(targets, dtype=np.int64),
+        "scores": np.array(scores, dtype=np.float64),  # Full precision, as stored in preds
+    }
+
+def work(shard_dir=SHARD_DIR, max_shards=None):
+    """Claims and computes unfinished shards until none is left to claim. Returns how many it did."""
+    manifest = load_manifest(shard_dir)
+    genre_filter = manifest["genre_filter"]
+    key = build_key(genre_filter)
+    if {k: manifest[k] for k in key} != key:
+        raise RuntimeError("Local catalog/weights differ from the ones the shards were planned for.")
+
+    todo = [s for s in manifest["shards"] if not os.path.exists(shard_path(shard_dir, s))]
+    if not todo:
+        return 0
+
+    store = cr.load_catalog()
+    learned_weights = pickle.load(open(cr.WEIGHTS_FILE, "rb"))
+    keyword_weights = pickle.load(open(cr.KEYWORD_W_FILE, "rb"))
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    order = np.argsort(scorer.ids, kind='stable')
+    sorted_ids = scorer.ids[order]
+
+    token = uuid.uuid4().hex
+    done = 0
+    for shard in todo:
+        if max_shards is not None and done >= max_shards:
+            break
+        lock = lock_path(shard_dir, shard)
+        if not try_claim(lock, token):
+            continue
+        try:
+            out = shard_path(shard_dir, shard)
+            if os.path.exists(out):  # Finished by someone else between the scan and the claim
+                continue
+            start = time.time()
+            lo = np.searchsorted(sorted_ids, shard["first_id"])
+            hi = np.searchsorted(sorted_ids, shard["last_id"], side='right')
+            try:
+                arrays = compute_shard(scorer, order[lo:hi], learned_weights, genre_filter,
+                                       lambda: heartbeat(lock, token))
+                heartbeat(lock, token)
+            except ClaimLost:
+                print(f"Lost the claim on shard {shard['shard']} (taken over while stalled), skipping it")
+                continue
+            # save_arrays goes through a temp file + rename: a shard file is always complete
+            save_arrays(out, arrays, meta=dict(key, kind="topk_shard", shard=shard["shard"]))
+            done += 1
+            print(f"[{socket.gethostname()}:{os.getpid()}] shard {shard['shard']} "
+                  f"({hi - lo} sources) in {time.time() - start:.1f}s")
+        finally:
+            release(lock, token)
+    return done
+
+def _work_process(shard_dir, max_shards):
+    work(shard_dir, max_shards)
+
+# --- MERGE ---
+def status(shard_dir=SHARD_DIR):
+    manifest = load_manifest(shard_dir)
+    shards = manifest["shards"]
+    finished = [s for s in shards if os.path.exists(shard_path(shard_dir, s))]
+    claimed = [s for s in shards if s not in finished and os.path.exists(lock_path(shard_dir, s))]
+    return manifest, finished, claimed
+
+def merge(shard_dir=SHARD_DIR):
+    """Assembles recommendations.db (+ the Top-K artifact) from the finished shards."""
+    manifest, finished, _ = status(shard_dir)
+    if len(finished) != len(manifest["shards"]):
+        raise RuntimeError(f"Only {len(finished)}/{len(manifest['shards'])} shards are finished.")
+    genre_filter = manifest["genre_filter"]
+    key = build_key(genre_filter)
+    if {k: manifest[k] for k in key} != key:
+        raise RuntimeError("Local catalog/weights differ from the ones the shards were computed from.")
+
+    conn = recs_db.open_staging(cr.DB_FILE)
+    recs_db.create_preds(conn)
+    total_rows = total_lists = 0
+    try:
+        for shard in manifest["shards"]:
+            arrays, meta = load_arrays(shard_path(shard_dir, shard), mmap=False)
+            if meta.get("kind") != "topk_shard" or {k: meta.get(k) for k in key} != key:
+                raise RuntimeError(f"{shard_path(shard_dir, shard)} is from another build.")
+            counts = np.diff(arrays["offsets"])
+            sources = np.repeat(arrays["source_ids"], counts)
+            ranks = np.arange(len(sources)) - np.repeat(arrays["offsets"][:-1], counts)
+            conn.executemany("INSERT INTO preds VALUES (?,?,?,?)",
+                             zip(sources.tolist(), ranks.tolist(), arrays["targets"].tolist(),
+                                 arrays["scores"].tolist()))
+            total_rows += len(sources)
+            total_lists += int(np.count_nonzero(counts))
+        conn.commit()
+
+        print("Building indexes...")
+        recs_db.build_indexes(conn)
+        recs_db.validate(conn, total_rows, total_lists)
+        store = cr.load_catalog()
+        cr.save_state(conn, cr.movie_fingerprints(store), cr.build_fingerprint(genre_filter))
+        cr.export_topk(conn, recs_db.staging_path(cr.TOPK_FILE))
+    except BaseException:
+        recs_db.discard(conn, cr.DB_FILE, [cr.TOPK_FILE])
+        raise
+    recs_db.publish(conn, cr.DB_FILE, [cr.TOPK_FILE])
+    print(f"Merged {len(finished)} shards ({total_rows} rows) into {cr.DB_FILE}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded, resumable Top-K precompute (sparse engine).")
+    parser.add_argument("command", choices=["plan", "work", "merge", "run", "status"])
+    parser.add_argument("--shard-dir", default=SHARD_DIR, help="Directory shared by every worker")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help="Shards to plan")
+    parser.add_argument("--cross-genre", action="store_true",
+                        help="Plan without the genre-disjoint filter (stored in the manifest)")
+    parser.add_argument("--replan", action="store_true", help="Replace a manifest from another build")
+    parser.add_argument("--procs", type=int, default=1, help="Local worker processes (work / run)")
+    parser.add_argument("--max-shards", type=int, help="Stop each worker (process) after this many shards")
+    args = parser.parse_args()
+
+    if args.command in ("plan", "run"):
+        plan(args.shard_dir, args.shards, not args.cross_genre, args.replan)
+    if args.command in ("work", "run"):
+        if args.procs > 1:
+            procs = [mp.Process(target=_work_process, args=(args.shard_dir, args.max_shards))
+                     for _ in range(args.procs)]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+        else:
+            work(args.shard_dir, args.max_shards)
+    if args.command == "status" or args.command == "work":
+        manifest, finished, claimed = status(args.shard_dir)
+        print(f"{len(finished)}/{len(manifest['shards'])} shards finished, {len(claimed)} claimed.")
+    if args.command in ("merge", "run"):
+        merge(args.shard_dir)
@@ -0,0 +1,41 @@
+from multiprocessing import shared_memory
+import numpy as np
+from sparse_scorer import SparseScorer
+
+def share_scorer(scorer):
+    """
+    Copies the encoded catalog (incl. the IDF keyword weights baked into it)
+    into named shared-memory blocks, once.
+    Returns (spec, blocks): `spec` is small and picklable, `blocks` must be kept
+    alive by the owner and released with release() when the workers are done.
+    """
+    spec = {}
+    blocks = []
+    for name, arr in scorer.to_arrays().items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+        blocks.append(shm)
+    return spec, blocks
+
+def attach_scorer(spec):
+    """
+    Maps the shared blocks described by `spec` into a read-only SparseScorer.
+    The returned blocks back the arrays and must outlive the scorer.
+    """
+    arrays = {}
+    blocks = []
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[name] = arr
+        blocks.append(shm)
+    return SparseScorer.from_arrays(arrays), blocks
+
+def release(blocks, unlink=True):
+    for shm in blocks:
+        shm.close()
+        if unlink:
+            shm.unlink()
@@ -0,0 +1,296 @@
+import numpy as np
+import scipy.sparse as sp
+from movie_store import MovieStore
+from metrics import NULL_METRICS
+
+FEATURE_NAMES = ['Genres', 'Keywords', 'Cast', 'Director', 'Year', 'Rating']
+
+# Everything get_features() needs; used to move a scorer between processes
+_MATRICES = ['genres', 'directors', 'keywords', 'keywords_w',
+             'cast', 'cast_bin', 'cast_levels', 'cast_levels_w']
+_VECTORS = ['ids', 'genre_size', 'director_size', 'keyword_mass', 'cast_mass', 'year', 'rating']
+
+class SparseScorer:
+    """
+    Matrix version of FeatureExtractor.
+    Encodes the whole catalog once and scores a block of sources against
+    every movie with sparse products instead of per-pair set operations.
+    Set `metrics` to a metrics.Metrics to record per-feature time and pair counts.
+    """
+    metrics = NULL_METRICS
+
+    def __init__(self, movies, keyword_weights):
+        # Same de-duplication as the {id: movie} maps used elsewhere (last copy wins)
+        self._encode(MovieStore.from_vectors(movies), keyword_weights)
+
+    @classmethod
+    def from_store(cls, store, keyword_weights):
+        """Builds the matrices straight from a MovieStore's CSR arrays (no string hashing)."""
+        self = cls.__new__(cls)
+        self._encode(store, keyword_weights)
+        return self
+
+    # --- SERIALIZATION ---
+    def to_arrays(self):
+        """Flattens the encoded catalog into {name: ndarray} (CSR parts included)."""
+        arrays = {name: getattr(self, name) for name in _VECTORS}
+        for name in _MATRICES:
+            mat = getattr(self, name)
+            arrays[f"{name}.data"] = mat.data
+            arrays[f"{name}.indices"] = mat.indices
+            arrays[f"{name}.indptr"] = mat.indptr
+            arrays[f"{name}.shape"] = np.array(mat.shape, dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuilds a scorer around existing arrays without copying them."""
+        self = cls.__new__(cls)
+        for name in _VECTORS:
+            setattr(self, name, arrays[name])
+        for name in _MATRICES:
+            shape = tuple(int(x) for x in arrays[f"{name}.shape"])
+            mat = sp.csr_matrix(shape, dtype=arrays[f"{name}.data"].dtype)
+            mat.data = arrays[f"{name}.data"]
+            mat.indices = arrays[f"{name}.indices"]
+            mat.indptr = arrays[f"{name}.indptr"]
+            setattr(self, name, mat)
+        self.index = {mid: i for i, mid in enumerate(self.ids.tolist())}
+        return self
+
+    # --- ENCODING ---
+    def _encode(self, store, keyword_weights):
+        n = len(store)
+        self.ids = np.asarray(store.ids, dtype=np.int64)
+        self.index = store.index
+
+        def csr(field, data=None):
+            indptr = store.arrays[f'{field}.indptr']
+            ids = store.arrays[f'{field}.ids']
+            data = np.ones(len(ids), dtype=np.float64) if data is None else data
+            return sp.csr_matrix((data, ids, indptr), shape=(n, len(store.vocab[field])))
+
+        # 1. Genres & Directors: binary incidence matrices
+        self.genres = sp.csr_matrix(store.genre_matrix())
+        self.directors = csr('directors')
+        self.genre_size = np.asarray(self.genres.sum(axis=1)).ravel()
+        self.director_size = np.asarray(self.directors.sum(axis=1)).ravel()
+
+        # 2. Keywords: binary incidence + IDF weighted copy
+        kw_w = np.array([keyword_weights.get(k, 0) for k in store.vocab['keywords'].tolist()], dtype=np.float64)
+        self.keywords = csr('keywords')
+        self.keywords_w = csr('keywords', kw_w[store.arrays['keywords.ids']])
+        self.keyword_mass = np.asarray(self.keywords_w.sum(axis=1)).ravel()
+
+        # 3. Cast: rank-decay scores + level matrix for the sum of minimums
+        self._build_cast(store, csr('cast', np.asarray(store.cast_scores, dtype=np.float64)))
+
+        # 4. Year & Rating: dense columns
+        self.year = np.asarray(store.year, dtype=np.float64)
+        self.rating = np.asarray(store.rating, dtype=np.float64)
+
+    def _build_cast(self, store, cast):
+        n, n_actors = cast.shape
+        self.cast = cast
+        self.cast_bin = cast.copy()
+        self.cast_bin.data[:] = 1.0
+        self.cast_mass = np.asarray(cast.sum(axis=1)).ravel()
+
+        # The fuzzy denominator is sum(max) = sum(A) + sum(B) - sum(min) over shared actors.
+        # min(a, b) = sum over score levels v_l of (v_l - v_l+1) * [a >= v_l] * [b >= v_l],
+        # so each actor is expanded into one column per level it reaches.
+        scores = cast.data
+        levels = np.unique(scores)[::-1]
+        steps = levels - np.append(levels[1:], 0.0)
+        n_levels = len(levels)
+
+        # Levels are descending: a score at position p reaches levels p..n_levels-1
+        pos = n_levels - 1 - np.searchsorted(levels[::-1], scores)
+        reach = n_levels - pos
+        entry_rows = np.repeat(np.arange(n), np.diff(cast.indptr))
+        first = cast.indices.astype(np.int64) * n_levels + pos
+        lcols = np.repeat(first, reach) + (np.arange(reach.sum()) - np.repeat(np.cumsum(reach) - reach, reach))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(entry_rows, weights=reach, minlength=n)).astype(np.int64)
+
+        self.cast_levels = sp.csr_matrix(
+            (np.ones(len(lcols)), lcols, indptr), shape=(n, n_actors * n_levels))
+        self.cast_levels_w = (self.cast_levels @ sp.diags(np.tile(steps, n_actors))).tocsr()
+
+    # --- FEATURES ---
+    @staticmethod
+    def _take(x, cols):
+        # Full-catalog blocks skip the copy a fancy-indexed slice would make
+        return x if cols is None else x[cols]
+
+    def _jaccard(self, mat, sizes, rows, cols):
+        inter = (mat[rows] @ self._take(mat, cols).T).toarray()
+        sizes_tgt = self._take(sizes, cols)[None, :]
+        union = sizes[rows][:, None] + sizes_tgt - inter
+        both = (sizes[rows][:, None] > 0) & (sizes_tgt > 0)
+        return np.divide(inter, union, out=np.zeros_like(inter), where=both & (union > 0))
+
+    def get_features(self, rows, cols=None):
+        """
+        Returns the 6 feature matrices for sources `rows` against targets `cols`
+        (dense indices, default: every movie), each of shape (len(rows), len(cols)):
+        [Genre, Keyword, Cast, Director, Year, Rating]
+        Every entry only depends on its own (row, col) pair, so a sub-block is
+        bit-identical to the same cells of the full matrix.
+        """
+        rows = np.asarray(rows)
+        if cols is not None:
+            cols = np.asarray(cols)
+        take = self._take
+        timer = self.metrics.timer
+        self.metrics.add("feature_evaluations", len(rows) * (len(self.ids) if cols is None else len(cols)))
+
+        with timer("feature.Genres"):
+            genre = self._jaccard(self.genres, self.genre_size, rows, cols)
+
+        # Keywords: weighted Jaccard
+        with timer("feature.Keywords"):
+            num = (self.keywords_w[rows] @ take(self.keywords, cols).T).toarray()
+            den = self.keyword_mass[rows][:, None] + take(self.keyword_mass, cols)[None, :] - num
+            keyword = np.divide(num, den, out=np.zeros_like(num), where=den > 1e-12)
+
+        # Cast: average numerator / max denominator
+        with timer("feature.Cast"):
+            num = ((self.cast[rows] @ take(self.cast_bin, cols).T) +
+                   (self.cast_bin[rows] @ take(self.cast, cols).T)).toarray() / 2
+            shared_min = (self.cast_levels_w[rows] @ take(self.cast_levels, cols).T).toarray()
+            den = self.cast_mass[rows][:, None] + take(self.cast_mass, cols)[None, :] - shared_min
+            cast = np.divide(num, den, out=np.zeros_like(num), where=den > 1e-12)
+
+        with timer("feature.Director"):
+            director = self._jaccard(self.directors, self.director_size, rows, cols)
+
+        # Year: Gaussian decay, Rating: linear decay (0 = unknown)
+        with timer("feature.Year"):
+            y_src = self.year[rows][:, None]
+            y_tgt = take(self.year, cols)[None, :]
+            year = np.exp(-((y_src - y_tgt) ** 2) / 100.0)
+            year[(y_src == 0) | (y_tgt == 0)] = 0.0
+
+        with timer("feature.Rating"):
+            r_src = self.rating[rows][:, None]
+            r_tgt = take(self.rating, cols)[None, :]
+            rating = np.maximum(0.0, 1.0 - np.abs(r_src - r_tgt) / 10.0)
+            rating[(r_src == 0) | (r_tgt == 0)] = 0.0
+
+        return [genre, keyword, cast, director, year, rating]
+
+    def pair_features(self, a, b, batch_size=65536):
+        """
+        Features for explicit pairs (a[i], b[i]) of dense indices, shape (len(a), 6).
+        Same formulas as get_features(), but row-wise: only the listed pairs are computed.
+        """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        out = np.zeros((len(a), len(FEATURE_NAMES)))
+        for start in range(0, len(a), batch_size):
+            ra = a[start:start + batch_size]
+            rb = b[start:start + batch_size]
+            out[start:start + len(ra)] = self._pair_block(ra, rb)
+        return out
+
+    def _pair_block(self, ra, rb):
+        timer = self.metrics.timer
+        self.metrics.add("feature_evaluations", len(ra))
+
+        def rowdot(x, y):
+            return np.asarray(x[ra].multiply(y[rb]).sum(axis=1)).ravel()
+
+        def jaccard(mat, sizes):
+            inter = rowdot(mat, mat)
+            union = sizes[ra] + sizes[rb] - inter
+            both = (sizes[ra] > 0) & (sizes[rb] > 0)
+            return np.divide(inter, union, out=np.zeros_like(inter), where=both & (union > 0))
+
+        with timer("feature.Genres"):
+            genre = jaccard(self.genres, self.genre_size)
+
+        with timer("feature.Keywords"):
+            num = rowdot(self.keywords_w, self.keywords)
+            den = self.keyword_mass[ra] + self.keyword_mass[rb] - num
+            keyword = np.divide(num, den, out=np.zeros_like(num), where=den > 1e-12)
+
+        with timer("feature.Cast"):
+            num = (rowdot(self.cast, self.cast_bin) + rowdot(self.cast_bin, self.cast)) / 2
+            den = self.cast_mass[ra] + self.cast_mass[rb] - rowdot(self.cast_levels_w, self.cast_levels)
+            cast = np.divide(num, den, out=np.zeros_like(num), where=den > 1e-12)
+
+        with timer("feature.Director"):
+            director = jaccard(self.directors, self.director_size)
+
+        with timer("feature.Year"):
+            y_a, y_b = self.year[ra], self.year[rb]
+            year = np.exp(-((y_a - y_b) ** 2) / 100.0)
+            year[(y_a == 0) | (y_b == 0)] = 0.0
+
+        with timer("feature.Rating"):
+            r_a, r_b = self.rating[ra], self.rating[rb]
+            rating = np.maximum(0.0, 1.0 - np.abs(r_a - r_b) / 10.0)
+            rating[(r_a == 0) | (r_b == 0)] = 0.0
+
+        return np.column_stack([genre, keyword, cast, director, year, rating])
+
+    @staticmethod
+    def combine(feats, learned_weights):
+        total = np.zeros_like(feats[0])
+        for name, f in zip(FEATURE_NAMES, feats):
+            w = learned_weights.get(name, 0)
+            if w:
+                total += f * w
+        return total
+
+    def score(self, rows, learned_weights, cols=None):
+        return self.combine(self.get_features(rows, cols), learned_weights)
+
+    def masked_scores(self, rows, learned_weights, genre_filter=True, cols=None):
+        """
+        Final scores with -inf for pairs the heap loop in compute() would never consider:
+        self-pairs, genre-disjoint pairs (genre_filter) or pairs sharing no token at all.
+        """
+        rows = np.asarray(rows)
+        cols = np.arange(len(self.ids)) if cols is None else np.asarray(cols)
+        feats = self.get_features(rows, cols)
+        scores = self.combine(feats, learned_weights)
+        is_self = rows[:, None] == cols[None, :]
+        scores[is_self] = -np.inf
+        # Jaccard is 0 exactly when nothing is shared, same for the other set features
+        if genre_filter:
+            pruned = feats[0] == 0
+        else:
+            pruned = ~((feats[0] > 0) | (feats[1] > 0) | (feats[2] > 0) | (feats[3] > 0))
+        scores[pruned] = -np.inf
+
+        n_self = int(np.count_nonzero(is_self))
+        self.metrics.add("pairs_considered", scores.size - n_self)
+        self.metrics.add("pairs_pruned_genre" if genre_filter else "pairs_pruned_disjoint",
+                         int(np.count_nonzero(pruned & ~is_self)))
+        return scores
+
+    def top_k(self, rows, learned_weights, k, genre_filter=True):
+        """
+        Yields (source_id, [(score, target_id), ...]) for each source in `rows`,
+        best first. Ties are broken by the lower target ID, so the lists are
+        deterministic no matter how the rows are blocked.
+        """
+        rows = np.asarray(rows)
+        scores = self.masked_scores(rows, learned_weights, genre_filter)
+
+        kk = min(k, scores.shape[1])
+        if kk == 0:
+            for r in rows:
+                yield int(self.ids[r]), []
+            return
+        part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        for b, r in enumerate(rows):
+            # Everything tied with the k-th best competes for the last slots
+            kth = scores[b, part[b]].min()
+            cand = np.nonzero(scores[b] >= kth)[0] if np.isfinite(kth) else part[b]
+            cand = cand[np.isfinite(scores[b, cand])]
+            order = np.lexsort((self.ids[cand], -scores[b, cand]))
+            cand = cand[order][:kk]
+            yield int(self.ids[r]), [(float(scores[b, c]), int(self.ids[c])) for c in cand]
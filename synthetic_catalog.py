@@ -0,0 +1,163 @@
+import argparse
+import math
+import os
+import numpy as np
+from ndjson_io import NDJSONWriter, iter_records, resolve
+
+# --- CONFIG ---
+REAL_FILE = "tmdb_10k_movies_detailed.ndjson"  # Crawl the profile is fitted from (when present)
+OUTPUT_FILE = "synthetic_movies.ndjson"
+SET_FIELDS = ['keywords', 'cast', 'directors']
+SAMPLE_SIZE = 5000  # Year / rating values kept in a profile
+
+# Fallback when the crawl isn't on this machine: rough shape of the 10k TMDB snapshot.
+# count_pmf[i] = share of movies with i tokens; vocab = distinct tokens at ref_size movies;
+# zipf = rank-frequency exponent; heaps = vocabulary growth exponent (V ~ n^heaps)
+DEFAULT_PROFILE = {
+    "ref_size": 10000,
+    "genres": {
+        "names": ["Drama", "Comedy", "Thriller", "Action", "Adventure", "Horror", "Romance", "Crime",
+                  "Science Fiction", "Fantasy", "Family", "Mystery", "Animation", "History", "Music",
+                  "War", "Documentary", "Western", "TV Movie"],
+        "freq": [0.45, 0.33, 0.26, 0.25, 0.17, 0.14, 0.15, 0.15, 0.12, 0.10, 0.09, 0.08, 0.07,
+                 0.05, 0.04, 0.03, 0.02, 0.02, 0.01],
+        "count_pmf": [0.005, 0.20, 0.38, 0.29, 0.10, 0.025],
+    },
+    "keywords": {"count_pmf": [0.04] + [0.96 / 30] * 30, "vocab": 26000, "zipf": 0.9, "heaps": 0.75},
+    "cast": {"count_pmf": [0.01, 0.01, 0.01, 0.01, 0.02, 0.02, 0.03, 0.03, 0.04, 0.05, 0.77],
+             "vocab": 52000, "zipf": 0.6, "heaps": 0.85},
+    "directors": {"count_pmf": [0.01, 0.92, 0.06, 0.01], "vocab": 5200, "zipf": 0.5, "heaps": 0.8},
+    "years": list(range(1960, 2026)),
+    "ratings": [round(5.0 + 0.1 * i, 1) for i in range(31)],
+}
+
+# --- PROFILE ---
+def _pmf(counts):
+    hist = np.bincount(np.asarray(counts, dtype=np.int64))
+    return (hist / hist.sum()).tolist()
+
+def _zipf_exponent(freqs):
+    # Slope of log(frequency) vs log(rank) over the head of the distribution
+    f = np.sort(np.asarray(freqs, dtype=np.float64))[::-1]
+    f = f[:max(10, len(f) // 10)]
+    if len(f) < 3:
+        return 1.0
+    slope = np.polyfit(np.log(np.arange(1, len(f) + 1)), np.log(f), 1)[0]
+    return float(max(0.1, -slope))
+
+def fit_profile(path):
+    """Cardinality profile of a real crawl (per-movie token counts, vocab growth, Zipf)."""
+    movies = list(iter_records(path))
+    n = len(movies)
+    profile = {"ref_size": n}
+
+    genre_freq = {}
+    for m in movies:
+        for g in set(m.get('genres', [])):
+            genre_freq[g] = genre_freq.get(g, 0) + 1
+    names = sorted(genre_freq, key=genre_freq.get, reverse=True)
+    profile["genres"] = {"names": names, "freq": [genre_freq[g] / n for g in names],
+                         "count_pmf": _pmf([len(set(m.get('genres', []))) for m in movies])}
+
+    for field in SET_FIELDS:
+        token_lists = []
+        for m in movies:
+            tokens = m.get(field, [])
+            if field == 'cast':
+                tokens = [c['name'] for c in tokens]
+            token_lists.append(list(dict.fromkeys(tokens)))
+        freq = {}
+        for tokens in token_lists:
+            for t in tokens:
+                freq[t] = freq.get(t, 0) + 1
+        half = len(set().union(*map(set, token_lists[:n // 2]))) if n > 1 else 1
+        heaps = math.log(len(freq) / half, 2) if half and len(freq) > half else 0.8
+        profile[field] = {"count_pmf": _pmf([len(t) for t in token_lists]), "vocab": len(freq),
+                          "zipf": _zipf_exponent(list(freq.values())), "heaps": heaps}
+
+    rng = np.random.default_rng(0)
+    years = [int(str(m.get('year', ''))[:4]) for m in movies if str(m.get('year', ''))[:4].isdigit()]
+    ratings = [float(m['rating']) for m in movies if m.get('rating')]
+    profile["years"] = rng.choice(years, size=min(SAMPLE_SIZE, len(years)), replace=False).tolist() if years else DEFAULT_PROFILE["years"]
+    profile["ratings"] = rng.choice(ratings, size=min(SAMPLE_SIZE, len(ratings)), replace=False).tolist() if ratings else DEFAULT_PROFILE["ratings"]
+    return profile
+
+def load_profile(path=REAL_FILE):
+    path = resolve(path)
+    if os.path.exists(path):
+        print(f"Fitting cardinality profile from {path}...")
+        return fit_profile(path)
+    print(f"{REAL_FILE} not found, using the built-in profile.")
+    return DEFAULT_PROFILE
+
+# --- GENERATOR ---
+def _token_sampler(spec, ref_size, size, rng):
+    # Vocabulary grows with the catalog (Heaps' law), popularity follows Zipf
+    vocab = max(1, int(spec["vocab"] * (size / ref_size) ** spec["heaps"]))
+    p = 1.0 / np.arange(1, vocab + 1) ** spec["zipf"]
+    cdf = np.cumsum(p / p.sum())
+    pmf = np.asarray(spec["count_pmf"])
+    pmf = pmf / pmf.sum()
+
+    def draw(n_movies):
+        counts = rng.choice(len(pmf), size=n_movies, p=pmf)
+        ranks = np.minimum(np.searchsorted(cdf, rng.random(counts.sum())), vocab - 1)
+        return counts, ranks
+    return draw
+
+def generate(size, profile=DEFAULT_PROFILE, seed=0, chunk=10000):
+    """Yields `size` raw movie records in the crawl (load_complete_data) format."""
+    rng = np.random.default_rng(seed)
+    ref = profile["ref_size"]
+    samplers = {field: _token_sampler(profile[field], ref, size, rng) for field in SET_FIELDS}
+
+    genres = profile["genres"]
+    genre_p = np.asarray(genres["freq"]) / np.sum(genres["freq"])
+    genre_pmf = np.asarray(genres["count_pmf"]) / np.sum(genres["count_pmf"])
+    years = np.asarray(profile["years"])
+    ratings = np.asarray(profile["ratings"])
+
+    for start in range(0, size, chunk):
+        n = min(chunk, size - start)
+        drawn = {field: samplers[field](n) for field in SET_FIELDS}
+        offsets = {field: np.concatenate([[0], np.cumsum(drawn[field][0])]) for field in SET_FIELDS}
+        n_genres = np.minimum(rng.choice(len(genre_pmf), size=n, p=genre_pmf), len(genre_p))
+        year = rng.choice(years, size=n)
+        rating = rng.choice(ratings, size=n)
+
+        for i in range(n):
+            tokens = {}
+            for field in SET_FIELDS:
+                ranks = drawn[field][1][offsets[field][i]:offsets[field][i + 1]]
+                tokens[field] = [f"{field[:3]}{r}" for r in dict.fromkeys(ranks.tolist())]
+            g = rng.choice(len(genre_p), size=n_genres[i], replace=False, p=genre_p) if n_genres[i] else []
+            mid = start + i + 1
+            yield {
+                "id": mid,
+                "title": f"Synthetic Movie {mid}",
+                "year": str(int(year[i])),
+                "rating": float(rating[i]),
+                "vote_count": int(rng.integers(100, 20000)),
+                "genres": [genres["names"][j] for j in sorted(g)],
+                "keywords": tokens['keywords'],
+                "cast": [{"name": name, "order": o} for o, name in enumerate(tokens['cast'])],
+                "directors": tokens['directors'],
+            }
+
+def write_catalog(path, size, profile=DEFAULT_PROFILE, seed=0):
+    if os.path.exists(path):
+        os.remove(path)
+    with NDJSONWriter(path, fsync_every=100000) as out:
+        for record in generate(size, profile, seed):
+            out.write(record)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic crawl with TMDB-like cardinalities.")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", default=REAL_FILE, help="Crawl to fit the profile from")
+    args = parser.parse_args()
+
+    write_catalog(args.output, args.size, load_profile(args.profile), args.seed)
+    print(f"SUCCESS: {args.size} synthetic movies written to {args.output}")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The pipeline is a set of flat scripts in the repo root (and web/), not a package
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pytest
+from array_file import save_arrays, load_arrays
+
+WEB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web")
+
+def sample_arrays():
+    return {
+        "ids": np.array([3, 1, 2], dtype=np.int64),
+        "scores": np.linspace(0, 1, 7, dtype=np.float64),
+        "mask": np.array([1, 0, 5], dtype=np.uint8),  # Odd sizes exercise the alignment padding
+        "grid": np.arange(12, dtype=np.int32).reshape(3, 4),
+        "empty": np.zeros(0, dtype=np.float32),
+    }
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("meta", [None, {"kind": "test"}, {"kind": "test", "pad": "x" * 61}])
+def test_round_trip(tmp_path, mmap, meta):
+    path = tmp_path / "arrays.bin"
+    arrays = sample_arrays()
+    save_arrays(str(path), arrays, meta=meta)
+
+    loaded, loaded_meta = load_arrays(str(path), mmap=mmap)
+    assert loaded_meta == (meta or {})
+    assert list(loaded) == list(arrays)
+    for name, arr in arrays.items():
+        assert loaded[name].dtype == arr.dtype
+        np.testing.assert_array_equal(loaded[name], arr)
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not_arrays.bin"
+    path.write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        load_arrays(str(path))
+
+def test_web_maps_pipeline_files(tmp_path, monkeypatch):
+    # web/ reads the artifacts the pipeline writes, through the same implementation
+    monkeypatch.syspath_prepend(WEB_DIR)
+    from array_io import map_arrays
+
+    path = tmp_path / "arrays.bin"
+    save_arrays(str(path), sample_arrays(), meta={"kind": "test"})
+    loaded, meta = map_arrays(str(path))
+    assert meta == {"kind": "test"}
+    assert isinstance(loaded["ids"], np.memmap) and not loaded["ids"].flags.writeable
+    np.testing.assert_array_equal(loaded["grid"], sample_arrays()["grid"])
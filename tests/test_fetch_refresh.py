@@ -0,0 +1,172 @@
+import functools
+import json
+import pickle
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pytest
+import fetch_final_data
+import tmdb_client
+from tmdb_cache import ResponseCache
+from tmdb_client import MOVIE_DETAILS_PARAMS
+
+class MockTMDB(BaseHTTPRequestHandler):
+    """
+    /movie/changes plus /movie/{id} with ETags; `failing` IDs answer 500, and
+    `scripted[id]` is a queue of (status, headers) answers sent before the real one.
+    """
+    changes = []
+    movies = {}
+    failing = set()
+    scripted = {}
+    seen = []
+    arrivals = []  # time.monotonic() of every request
+
+    def do_GET(self):
+        MockTMDB.arrivals.append(time.monotonic())
+        path = urlparse(self.path).path
+        MockTMDB.seen.append((path, self.headers.get('If-None-Match')))
+        if path == "/movie/changes":
+            return self.reply(200, {"results": [{"id": mid} for mid in MockTMDB.changes], "total_pages": 1})
+        mid = int(path.rsplit('/', 1)[1])
+        if MockTMDB.scripted.get(mid):
+            status, headers = MockTMDB.scripted[mid].pop(0)
+            return self.reply(status, {}, headers=headers)
+        if mid in MockTMDB.failing:
+            return self.reply(500, {})
+        body = MockTMDB.movies[mid]
+        etag = f'"{mid}-{body["overview"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, None, etag)
+        return self.reply(200, body, etag)
+
+    def reply(self, status, body, etag=None, headers=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def tmdb(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockTMDB)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fetcher = functools.partial(tmdb_client.TMDBFetcher, base_url=f"http://127.0.0.1:{server.server_port}",
+                                max_retries=1, backoff_base=0.01)
+    monkeypatch.setattr(fetch_final_data, "TMDBFetcher", fetcher)
+    MockTMDB.base_url = f"http://127.0.0.1:{server.server_port}"
+    MockTMDB.changes, MockTMDB.movies, MockTMDB.failing, MockTMDB.scripted = [], {}, set(), {}
+    MockTMDB.seen, MockTMDB.arrivals = [], []
+    yield MockTMDB
+    server.shutdown()
+    server.server_close()
+
+def movie(mid, overview, rating=6.0):
+    return {'id': mid, 'title': f"Movie {mid}", 'year': 2000, 'rating': rating, 'overview': overview,
+            'poster_url': "", 'tmdb_url': "", 'popularity': 0, 'vote_count': 0}
+
+def meta(mid, overview, vote_average=6.0):
+    return {'id': mid, 'overview': overview, 'poster_path': f"/{mid}.jpg", 'popularity': 1.5,
+            'vote_count': 10, 'vote_average': vote_average}
+
+def read_final():
+    with open(fetch_final_data.FINAL_FILE, 'rb') as f:
+        return {m['id']: m for m in pickle.load(f)}
+
+def test_refresh_reuses_304_and_retries_failures(tmdb):
+    with open(fetch_final_data.FINAL_FILE, 'wb') as f:
+        pickle.dump([movie(1, "old 1"), movie(2, "old 2"), movie(3, "old 3"), movie(4, "old 4")], f)
+
+    # Movie 1 is cached with the ETag the server still has: a conditional request, answered 304
+    cached = meta(1, "cached 1")
+    cache = ResponseCache()
+    cache.store("/movie/1", MOVIE_DETAILS_PARAMS, 200, cached, etag='"1-cached 1"')
+    cache.close()
+
+    tmdb.changes = [1, 2, 3, 99]  # 99 isn't in the catalog
+    tmdb.movies = {1: cached, 2: meta(2, "new 2", vote_average=7.0), 3: meta(3, "new 3"), 4: meta(4, "new 4")}
+    tmdb.failing = {3}
+    fetch_final_data.refresh()
+
+    movies = read_final()
+    assert ("/movie/1", '"1-cached 1"') in tmdb.seen
+    assert movies[1]['overview'] == "cached 1"   # Body reused from the cache on 304
+    assert movies[2]['overview'] == "new 2"
+    assert movies[2]['rating'] == 6.0            # Ratings stay what the vectors were built from
+    assert movies[3]['overview'] == "old 3"      # Failed: previous values kept...
+    assert movies[4]['overview'] == "old 4"      # Unchanged on TMDB: not fetched at all
+    assert not any(path in ("/movie/4", "/movie/99") for path, _ in tmdb.seen)
+    with open(fetch_final_data.SYNC_STATE_FILE) as f:
+        assert json.load(f)['pending'] == [3]    # ...and queued for the next run
+
+    # Next run: no new changes, the pending movie is retried and succeeds
+    tmdb.changes = []
+    tmdb.failing = set()
+    fetch_final_data.refresh()
+
+    assert read_final()[3]['overview'] == "new 3"
+    with open(fetch_final_data.SYNC_STATE_FILE) as f:
+        assert json.load(f)['pending'] == []
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Every time.sleep() the client makes (still sleeping for real)."""
+    recorded = []
+    real_sleep = time.sleep
+    def sleep(seconds):
+        recorded.append(seconds)
+        real_sleep(seconds)
+    monkeypatch.setattr(tmdb_client.time, "sleep", sleep)
+    return recorded
+
+def test_429_honours_retry_after(tmdb, sleeps):
+    tmdb.movies = {5: meta(5, "five")}
+    tmdb.scripted = {5: [(429, {'Retry-After': '0.4'})]}
+    fetcher = tmdb_client.TMDBFetcher("key", base_url=tmdb.base_url, backoff_base=0.01)
+
+    start = time.monotonic()
+    assert fetcher.movie_details(5)['overview'] == "five"
+    assert time.monotonic() - start >= 0.4
+    # The bucket holds callers for Retry-After (+ up to backoff_base of jitter)
+    assert 0.35 <= sum(sleeps) <= 0.4 + 0.01 + 0.05
+    assert [path for path, _ in tmdb.seen] == ["/movie/5", "/movie/5"]
+    assert (fetcher.stats["rate_limited"], fetcher.stats["retries"], fetcher.stats["ok"]) == (1, 1, 1)
+
+def test_5xx_retries_are_bounded(tmdb, sleeps):
+    tmdb.scripted = {6: [(503, {})] * 10}
+    fetcher = tmdb_client.TMDBFetcher("key", base_url=tmdb.base_url, max_retries=3, backoff_base=0.01)
+
+    assert fetcher.movie_details(6) is None
+    assert len(tmdb.seen) == 4                    # First try + max_retries
+    assert len(tmdb.scripted[6]) == 6
+    # Jittered exponential backoff: attempt i sleeps at most backoff_base * 2**i
+    assert len(sleeps) == 4
+    assert all(0 <= s <= 0.01 * 2 ** i for i, s in enumerate(sleeps))
+    assert fetcher.stats["server_errors"] == 4
+    assert (fetcher.stats["retries"], fetcher.stats["failed"], fetcher.stats["ok"]) == (3, 1, 0)
+
+def test_rate_limit_holds_under_map(tmdb):
+    tmdb.movies = {mid: meta(mid, f"m{mid}") for mid in range(60)}
+    rate, burst = 50.0, 5
+    fetcher = tmdb_client.TMDBFetcher("key", base_url=tmdb.base_url, rate=rate, burst=burst, concurrency=8)
+
+    start = time.monotonic()
+    results = dict(fetcher.map(fetcher.movie_details, range(60)))
+    elapsed = time.monotonic() - start
+    assert all(results[mid]['overview'] == f"m{mid}" for mid in range(60))
+    assert elapsed >= (60 - burst) / rate * 0.95
+    # No window of arrivals holds more than the bucket can release (1 of slack for scheduling)
+    arrivals = sorted(tmdb.arrivals)
+    for i in range(len(arrivals)):
+        for j in range(i + 1, len(arrivals)):
+            assert j - i + 1 <= burst + rate * (arrivals[j] - arrivals[i]) + 1
@@ -0,0 +1,113 @@
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import pytest
+import compute_recommendations as cr
+import recs_db
+from movie_store import MovieStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+from topk_store import TopKStore
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi"]
+KEYWORDS = [f"kw{i}" for i in range(60)]
+CAST = [f"actor{i}" for i in range(80)]
+DIRECTORS = [f"director{i}" for i in range(25)]
+WEIGHTS = {'Genres': 0.33, 'Keywords': 0.32, 'Cast': 0.05, 'Director': 0.05, 'Year': 0.2, 'Rating': 0.05}
+
+def random_movie(rng, mid):
+    return {
+        "id": mid, "title": f"Movie {mid}", "year": rng.randint(1970, 2024), "rating": round(rng.uniform(4, 9), 1),
+        "genres": set(rng.sample(GENRES, rng.randint(1, 3))),
+        "keywords": set(rng.sample(KEYWORDS, rng.randint(0, 6))),
+        "cast": {a: 1.0 / (r + 1) for r, a in enumerate(rng.sample(CAST, rng.randint(0, 5)))},
+        "directors": set(rng.sample(DIRECTORS, rng.randint(0, 1))),
+    }
+
+def write_catalog(movies):
+    MovieStore.from_vectors(movies).save(cr.STORE_FILE)
+
+def preds():
+    with sqlite3.connect(cr.DB_FILE) as conn:
+        return conn.execute("SELECT source_id, rank, target_id, score FROM preds ORDER BY source_id, rank").fetchall()
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(7)
+    with open(cr.WEIGHTS_FILE, 'wb') as f:
+        pickle.dump(WEIGHTS, f)
+    with open(cr.KEYWORD_W_FILE, 'wb') as f:
+        pickle.dump({k: rng.uniform(0.5, 3) for k in KEYWORDS}, f)
+    return tmp_path
+
+def test_update_matches_full_rebuild(workdir):
+    rng = random.Random(1)
+    movies = [random_movie(rng, mid) for mid in range(1, 301)]
+    write_catalog(movies)
+    cr.compute("sparse")
+
+    # Change 10 movies, remove 5, add 8 (new tokens included, so vocab IDs shift too)
+    for m in rng.sample(movies, 10):
+        m.update(random_movie(rng, m["id"]), title=m["title"])
+    removed = {m["id"] for m in rng.sample(movies, 5)}
+    movies = [m for m in movies if m["id"] not in removed]
+    movies += [dict(random_movie(rng, mid), keywords={"aaa-new", "kw1"}) for mid in range(1001, 1009)]
+    write_catalog(movies)
+
+    cr.update()
+    patched = preds()
+    cr.compute("sparse")
+    rebuilt = preds()
+
+    assert len(patched) == len(rebuilt)
+    assert [r[:3] for r in patched] == [r[:3] for r in rebuilt]
+    assert [r[3] for r in patched] == pytest.approx([r[3] for r in rebuilt], abs=1e-12)
+
+def test_artifact_belongs_to_published_database(workdir):
+    write_catalog([random_movie(random.Random(2), mid) for mid in range(1, 101)])
+    cr.compute("sparse")
+    store = TopKStore(cr.TOPK_FILE)
+    with sqlite3.connect(cr.DB_FILE) as conn:
+        assert store.build_id is not None and store.build_id == recs_db.build_id(conn)
+    source_id = preds()[0][0]
+    stored = [(tid, score) for sid, _, tid, score in preds() if sid == source_id]
+    looked_up = store.lookup(source_id)
+    assert [tid for tid, _ in looked_up] == [tid for tid, _ in stored]
+    assert [s for _, s in looked_up] == pytest.approx([s for _, s in stored], rel=1e-6)
+
+def test_failed_build_publishes_nothing(workdir, monkeypatch):
+    write_catalog([random_movie(random.Random(3), mid) for mid in range(1, 101)])
+    cr.compute("sparse")
+    before = open(cr.TOPK_FILE, 'rb').read(), preds()
+
+    def fail(conn, path=None):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(cr, "export_topk", fail)
+    with pytest.raises(RuntimeError):
+        cr.compute("sparse")
+    assert (open(cr.TOPK_FILE, 'rb').read(), preds()) == before
+    assert not (workdir / recs_db.staging_path(cr.TOPK_FILE)).exists()
+    assert not (workdir / recs_db.staging_path(cr.DB_FILE)).exists()
+
+def test_web_skips_artifact_of_another_build(workdir, monkeypatch):
+    write_catalog([random_movie(random.Random(4), mid) for mid in range(1, 101)])
+    cr.compute("sparse")
+
+    # Crash between publishing the database and the artifact
+    replace = recs_db.os.replace
+    def crash_on_artifact(src, dst):
+        if dst == cr.TOPK_FILE:
+            raise OSError("killed")
+        replace(src, dst)
+    monkeypatch.setattr(recs_db.os, "replace", crash_on_artifact)
+    with pytest.raises(OSError):
+        cr.compute("sparse")
+
+    import app
+    assert app.open_topk_store() is None
+    monkeypatch.setattr(recs_db.os, "replace", replace)
+    cr.compute("sparse")
+    assert app.open_topk_store() is not None
@@ -0,0 +1,25 @@
+from movie_store import MovieStore
+from compute_recommendations import movie_fingerprints
+
+def movie(mid, **changes):
+    m = {"id": mid, "title": f"M{mid}", "year": 2000 + mid, "rating": 6.5,
+         "genres": {"Drama"}, "keywords": {"heist", "train"}, "cast": {"Ann": 1.0, "Bob": 0.5},
+         "directors": {"Dee"}}
+    m.update(changes)
+    return m
+
+def test_fingerprints_ignore_vocab_shifts():
+    before = movie_fingerprints(MovieStore.from_vectors([movie(1), movie(2, keywords={"train"})]))
+    # New tokens sort before the old ones, so every store ID and genre bit moves
+    after = movie_fingerprints(MovieStore.from_vectors([
+        movie(1), movie(2, keywords={"train"}),
+        movie(3, genres={"Action", "Drama"}, keywords={"aaa"}, cast={"Aaron": 1.0}, directors={"Al"})]))
+    assert after[1] == before[1] and after[2] == before[2]
+    assert len(set(after.values())) == 3
+
+def test_fingerprints_see_every_scored_field():
+    base = movie_fingerprints(MovieStore.from_vectors([movie(1)]))[1]
+    for change in ({"genres": {"Comedy"}}, {"keywords": {"heist"}}, {"cast": {"Ann": 1.0, "Bob": 0.4}},
+                   {"cast": {"Ann": 1.0}, "keywords": {"heist", "train", "Bob"}}, {"directors": set()},
+                   {"year": 2002}, {"rating": 6.6}):
+        assert movie_fingerprints(MovieStore.from_vectors([movie(1, **change)]))[1] != base, change
@@ -0,0 +1,40 @@
+import os
+import pipeline
+
+def stage(name):
+    return next(s for s in pipeline.STAGES if s.name == name)
+
+def code_files(name):
+    return {os.path.basename(path) for path in stage(name).code}
+
+def test_local_imports_follow_repo_modules_transitively(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "REPO_DIR", str(tmp_path))
+    (tmp_path / "main.py").write_text("import os\nimport numpy as np\nfrom helper import f\n"
+                                      "def g():\n    import lazy\n")
+    (tmp_path / "helper.py").write_text("from base import CONST\nimport main\n")
+    (tmp_path / "base.py").write_text("CONST = 1\n")
+    (tmp_path / "lazy.py").write_text("")
+    assert pipeline.local_imports("main.py") == ["base.py", "helper.py", "lazy.py"]
+
+def test_stage_code_covers_every_imported_helper():
+    assert {"compute_recommendations.py", "candidate_index.py", "lsh_index.py", "shared_catalog.py",
+            "metrics.py", "feature_extractor.py", "array_file.py", "sparse_scorer.py", "recs_db.py",
+            "movie_store.py"} <= code_files("compute_recommendations")
+    assert {"train_weights.py", "movie_store.py", "array_file.py", "sparse_scorer.py", "metrics.py",
+            "feature_cache.py", "pair_store.py"} <= code_files("train_weights")
+
+def test_helper_edit_reruns_the_stage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = pipeline.Manifest(str(tmp_path / "manifest.json"))
+    target = stage("compute_recommendations")
+    record = {kind: manifest.snapshot(paths) for kind, paths in
+              (("code", target.code), ("inputs", target.inputs), ("outputs", target.outputs))}
+    for path in target.outputs:
+        open(path, "w").close()
+    record["outputs"] = manifest.snapshot(target.outputs)
+    manifest.data["stages"][target.name] = record
+    assert manifest.reason_to_run(target) is None
+
+    helper = os.path.join(pipeline.REPO_DIR, "lsh_index.py")
+    manifest.data["stages"][target.name]["code"][helper] = "stale"
+    assert manifest.reason_to_run(target) == f"code changed: {helper}"
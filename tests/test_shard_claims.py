@@ -0,0 +1,49 @@
+import os
+import time
+import pytest
+import shard_precompute as sp
+
+def make_stale(path):
+    old = time.time() - sp.STALE_AFTER - 60
+    os.utime(path, (old, old))
+
+def test_claim_is_exclusive(tmp_path):
+    lock = str(tmp_path / "shard_00000.lock")
+    assert sp.try_claim(lock, "a")
+    assert not sp.try_claim(lock, "b")
+    assert sp.lock_token(lock) == "a"
+    sp.release(lock, "b")  # Not ours: kept
+    assert os.path.exists(lock)
+    sp.release(lock, "a")
+    assert not os.path.exists(lock)
+    assert os.listdir(tmp_path) == []
+
+def test_stale_lock_is_taken_over(tmp_path):
+    lock = str(tmp_path / "shard_00000.lock")
+    assert sp.try_claim(lock, "a")
+    make_stale(lock)
+    assert sp.try_claim(lock, "b")
+    assert sp.lock_token(lock) == "b"
+    with pytest.raises(sp.ClaimLost):
+        sp.heartbeat(lock, "a")
+    sp.heartbeat(lock, "b")
+    assert os.listdir(tmp_path) == ["shard_00000.lock"]
+
+def test_racing_takeovers_leave_one_owner(tmp_path, monkeypatch):
+    # b judges the lock stale, then c takes it over and claims it before b's rename:
+    # b must hand c's fresh claim back instead of claiming the shard as well
+    lock = str(tmp_path / "shard_00000.lock")
+    assert sp.try_claim(lock, "a")
+    make_stale(lock)
+    rename = os.rename
+
+    def racing_rename(src, dst):
+        monkeypatch.setattr(sp.os, "rename", rename)
+        assert sp.try_claim(lock, "c")
+        rename(src, dst)
+
+    monkeypatch.setattr(sp.os, "rename", racing_rename)
+    assert not sp.try_claim(lock, "b")
+    assert sp.lock_token(lock) == "c"
+    sp.heartbeat(lock, "c")
+    assert os.listdir(tmp_path) == ["shard_00000.lock"]
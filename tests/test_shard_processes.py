@@ -0,0 +1,87 @@
+import os
+import pickle
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import Counter
+import pytest
+import synthetic_catalog
+from movie_store import MovieStore
+from movie_vectorizer import process_movie
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARDS = 12
+WEIGHTS = {'Genres': 0.33, 'Keywords': 0.32, 'Cast': 0.05, 'Director': 0.05, 'Year': 0.2, 'Rating': 0.05}
+
+def run(script, *args, cwd):
+    out = subprocess.run([sys.executable, os.path.join(REPO_DIR, script), *args], cwd=cwd,
+                         capture_output=True, text=True, timeout=300)
+    assert out.returncode == 0, out.stdout + out.stderr
+    return out.stdout
+
+def computed_shards(output):
+    """Shard numbers the workers report having computed (worker lines may interleave)."""
+    return [int(n) for n in re.findall(r"\[[^\]]+:\d+\] shard (\d+) \(", output)]
+
+def preds(workdir):
+    with sqlite3.connect(os.path.join(workdir, "recommendations.db")) as conn:
+        return conn.execute("SELECT source_id, rank, target_id, score FROM preds ORDER BY source_id, rank").fetchall()
+
+@pytest.fixture
+def catalog_dir(tmp_path):
+    raw = list(synthetic_catalog.generate(600, seed=5))
+    rng = random.Random(5)
+    keyword_weights = {k: rng.uniform(0.5, 4) for m in raw for k in m['keywords']}
+    MovieStore.from_vectors([process_movie(m, keyword_weights) for m in raw]).save(str(tmp_path / "movie_store.bin"))
+    with open(tmp_path / "keyword_weights.pkl", 'wb') as f:
+        pickle.dump(keyword_weights, f)
+    with open(tmp_path / "learned_weights.pkl", 'wb') as f:
+        pickle.dump(WEIGHTS, f)
+    return tmp_path
+
+def single_process_build(catalog_dir, tmp_path_factory):
+    ref = tmp_path_factory.mktemp("single")
+    for name in ("movie_store.bin", "keyword_weights.pkl", "learned_weights.pkl"):
+        shutil.copy(catalog_dir / name, ref / name)
+    run("compute_recommendations.py", cwd=ref)
+    return preds(ref)
+
+def test_processes_split_shards_and_merge_matches_single_build(catalog_dir, tmp_path_factory):
+    run("shard_precompute.py", "plan", "--shards", str(SHARDS), cwd=catalog_dir)
+
+    # --max-shards caps every --procs worker
+    first = computed_shards(run("shard_precompute.py", "work", "--procs", "3", "--max-shards", "1", cwd=catalog_dir))
+    assert len(first) == 3 and len(set(first)) == 3
+
+    rest = computed_shards(run("shard_precompute.py", "work", "--procs", "4", cwd=catalog_dir))
+    assert Counter(first + rest) == Counter(range(SHARDS))  # Every shard computed exactly once
+
+    run("shard_precompute.py", "merge", cwd=catalog_dir)
+    assert preds(catalog_dir) == single_process_build(catalog_dir, tmp_path_factory)
+
+def test_racing_processes_take_each_stale_lock_once(catalog_dir):
+    shard_dir = catalog_dir / "shards"
+    run("shard_precompute.py", "plan", "--shards", str(SHARDS), cwd=catalog_dir)
+    # Every shard starts claimed by a dead worker
+    old = time.time() - 3600
+    for shard in range(SHARDS):
+        lock = shard_dir / f"shard_{shard:05d}.lock"
+        lock.write_text('{"token": "dead"}')
+        os.utime(lock, (old, old))
+
+    # Separate commands, started together, all racing for the same stale locks
+    procs = [subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "shard_precompute.py"), "work"],
+                              cwd=catalog_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+             for _ in range(4)]
+    outputs = [p.communicate(timeout=300)[0] for p in procs]
+    assert all(p.returncode == 0 for p in procs), outputs
+
+    done = [n for out in outputs for n in computed_shards(out)]
+    assert Counter(done) == Counter(range(SHARDS))
+    taken_over = [int(n) for out in outputs for n in re.findall(r"Took over \S*shard_(\d+)\.lock", out)]
+    assert Counter(taken_over) == Counter(range(SHARDS))  # One winner per stale lock
+    assert sorted(os.listdir(shard_dir)) == ["manifest.json"] + [f"shard_{s:05d}.bin" for s in range(SHARDS)]
@@ -0,0 +1,56 @@
+import random
+import numpy as np
+import pytest
+import synthetic_catalog
+from feature_extractor import FeatureExtractor
+from movie_store import MovieStore
+from movie_vectorizer import process_movie
+from sparse_scorer import SparseScorer
+
+TOL = 1e-12
+TOP_K = 25
+WEIGHTS = {'Genres': 0.33, 'Keywords': 0.32, 'Cast': 0.05, 'Director': 0.05, 'Year': 0.2, 'Rating': 0.05}
+
+@pytest.fixture(scope="module")
+def catalog():
+    raw = list(synthetic_catalog.generate(400, seed=3))
+    rng = random.Random(3)
+    # Like keyword_weigher: every keyword of the crawl gets a weight (a few are 0)
+    keyword_weights = {k: rng.choice([0.0, rng.uniform(0.5, 4)]) for m in raw for k in m['keywords']}
+    vectors = [process_movie(m, keyword_weights) for m in raw]
+    store = MovieStore.from_vectors(vectors)
+    scorer = SparseScorer.from_store(store, keyword_weights)
+    by_id = {v['id']: v for v in vectors}
+    return [by_id[mid] for mid in scorer.ids.tolist()], scorer, FeatureExtractor(keyword_weights)
+
+def reference_features(extractor, vectors, rows, cols):
+    return np.array([[extractor.get_features(vectors[r], vectors[c]) for c in cols] for r in rows])
+
+def test_block_features_match_extractor(catalog):
+    vectors, scorer, extractor = catalog
+    rows = np.arange(0, 400, 9)
+    got = np.stack(scorer.get_features(rows), axis=-1)
+    want = reference_features(extractor, vectors, rows, range(len(vectors)))
+    np.testing.assert_allclose(got, want, rtol=0, atol=TOL)
+
+def test_pair_features_match_extractor(catalog):
+    vectors, scorer, extractor = catalog
+    rng = np.random.default_rng(0)
+    a, b = rng.integers(0, len(vectors), 3000), rng.integers(0, len(vectors), 3000)
+    want = np.array([extractor.get_features(vectors[i], vectors[j]) for i, j in zip(a, b)])
+    np.testing.assert_allclose(scorer.pair_features(a, b), want, rtol=0, atol=TOL)
+
+def test_top_k_matches_extractor(catalog):
+    vectors, scorer, extractor = catalog
+    weights = [WEIGHTS[name] for name in ('Genres', 'Keywords', 'Cast', 'Director', 'Year', 'Rating')]
+    rows = np.arange(0, 400, 7)
+    for (source_id, top), r in zip(scorer.top_k(rows, WEIGHTS, TOP_K), rows):
+        src = vectors[r]
+        assert source_id == src['id']
+        ref = sorted(((sum(f * w for f, w in zip(extractor.get_features(src, tgt), weights)), tgt['id'])
+                      for tgt in vectors if tgt is not src and src['genres'] & tgt['genres']),
+                     key=lambda e: (-e[0], e[1]))[:TOP_K]
+        assert [s for s, _ in top] == pytest.approx([s for s, _ in ref], abs=TOL)
+        # Targets may only swap places with ones tied (within TOL) at the cut-off
+        cut = ref[-1][0] + TOL
+        assert {t for s, t in top if s > cut} == {t for s, t in ref if s > cut}
@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web"))
+import app as web_app
+
+@pytest.fixture
+def client():
+    return web_app.app.test_client()
+
+@pytest.mark.parametrize("path, body, field", [
+    ("/api/recommend/batch", {"movie_ids": [1], "offset": "abc"}, "offset"),
+    ("/api/recommend/batch", {"movie_ids": [1], "limit": None}, "limit"),
+    ("/api/recommend/batch", {"movie_ids": [1, "x"]}, "movie_ids"),
+    ("/api/recommend", {"movie_id": "abc"}, "movie_id"),
+    ("/api/recommend", {"movie_ids": [2, 3], "limit": "ten"}, "limit"),
+])
+def test_bad_integers_are_400(client, path, body, field):
+    resp = client.post(path, json=body)
+    assert resp.status_code == 400
+    assert field in resp.get_json()["error"]
+
+def test_non_object_body_is_400(client):
+    assert client.post("/api/recommend", data="not json").status_code == 400
+    assert client.post("/api/recommend/batch", json=[1, 2]).status_code == 400
+    assert client.post("/api/recommend/batch", json={"movie_ids": 5}).status_code == 400
+
+def test_page_args_clamp():
+    assert web_app.page_args({"offset": -5, "limit": -3}) == (0, 1)
+    assert web_app.page_args({"offset": "7", "limit": 1000}) == (7, web_app.MAX_PAGE)
+    assert web_app.page_args({}) == (0, 10)
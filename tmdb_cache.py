@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURATION ---
+CACHE_FILE = os.environ.get("TMDB_CACHE_FILE", "tmdb_cache.db")
+CACHE_TTL = float(os.environ.get("TMDB_CACHE_TTL", 7 * 24 * 3600))  # Seconds; 0 disables expiry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    body TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+)
+"""
+
+def cache_key(path, params):
+    """Endpoint + request params (api_key excluded), order-independent."""
+    canonical = json.dumps({k: str(v) for k, v in (params or {}).items() if k != 'api_key'}, sort_keys=True)
+    return hashlib.sha1(f"{path}?{canonical}".encode()).hexdigest(), canonical
+
+class ResponseCache:
+    """
+    On-disk TMDB response cache shared by every fetch script (one SQLite file, WAL mode,
+    so two scripts can run against it at once). Stores 200 bodies and 404s; an entry
+    older than `ttl` is a miss, but stays in the file until it is refetched.
+    """
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, fetched_at):
+        return not self.ttl or time.time() - fetched_at < self.ttl
+
+    def _entry(self, key):
+        row = self.conn.execute(
+            "SELECT status, body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'status': row[0], 'body': json.loads(row[1]) if row[1] is not None else None,
+                'etag': row[2], 'last_modified': row[3], 'fetched_at': row[4]}
+
+    def peek(self, path, params):
+        """The stored entry regardless of age, without counting a hit or miss."""
+        key, _ = cache_key(path, params)
+        with self.lock:
+            return self._entry(key)
+
+    def lookup(self, path, params):
+        """
+        Returns (hit, entry). entry is the stored row as a dict (also for expired rows,
+        so the caller can revalidate with its ETag), or None.
+        """
+        key, _ = cache_key(path, params)
+        with self.lock:
+            entry = self._entry(key)
+            hit = entry is not None and self._fresh(entry['fetched_at'])
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit, entry
+
+    def store(self, path, params, status, body, etag=None, last_modified=None):
+        key, canonical = cache_key(path, params)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path, canonical, status, json.dumps(body) if body is not None else None,
+                 etag, last_modified, time.time()))
+            self.conn.commit()
+
+    def touch(self, path, params):
+        """Marks an entry fresh again after a 304 revalidation."""
+        key, _ = cache_key(path, params)
+        with self.lock:
+            self.conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return f"cache: {self.hits} hits, {self.misses} misses ({self.hit_rate():.1%} hit rate)"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
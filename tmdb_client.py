@@ -0,0 +1,207 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# --- CONFIGURATION ---
+# Point TMDB_BASE_URL at a local stand-in server to run a crawl without network access
+TMDB_BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+RATE_LIMIT = 35.0      # Requests per second, kept under TMDB's ~40-50/s per IP
+BURST = 10             # Requests the bucket may release back to back
+CONCURRENCY = 8        # Requests in flight
+MAX_RETRIES = 5        # Per request, for 429 / 5xx / connection errors
+BACKOFF_BASE = 0.5     # Seconds; doubles per attempt, with full jitter
+TIMEOUT = 10           # Seconds per HTTP request
+
+# Every per-movie script asks for the same full record, so one cached response
+# serves the crawl, the metadata enrichment and the franchise scan.
+MOVIE_DETAILS_PARAMS = {"append_to_response": "credits,keywords", "language": "en-US"}
+
+class TokenBucket:
+    """Thread-safe token bucket. acquire() blocks until a request may be sent."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Holds every caller for `seconds` (a 429 applies to the whole API key, not one thread)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+def retry_after_seconds(value):
+    """Parses a Retry-After header (delta seconds or HTTP date); None if missing/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TMDBFetcher:
+    """
+    Concurrent TMDB client: a thread pool sends requests as fast as the token bucket
+    allows, retries 429/5xx/connection errors a bounded number of times with jittered
+    exponential backoff (honoring Retry-After), and counts what happened.
+    With a ResponseCache, fresh cached responses are returned without a network call.
+    """
+    def __init__(self, api_key, base_url=TMDB_BASE_URL, rate=RATE_LIMIT, burst=BURST,
+                 concurrency=CONCURRENCY, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, timeout=TIMEOUT,
+                 cache=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.cache = cache
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "retries": 0,
+                      "server_errors": 0, "connection_errors": 0, "failed": 0, "not_found": 0, "not_modified": 0}
+        self.started = time.monotonic()
+
+    def _session(self):
+        # requests.Session isn't guaranteed thread-safe: one per worker thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt):
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def get(self, path, params=None, cached=True, revalidate=False):
+        """
+        GET {base_url}{path}. Returns the decoded JSON on 200, None otherwise
+        (404/other client errors immediately, 429/5xx/network errors after MAX_RETRIES).
+        cached=False bypasses the response cache (time-dependent feeds).
+        revalidate=True always asks the server, as a conditional request
+        (If-None-Match / If-Modified-Since) when a cached copy exists; a 304
+        returns the cached body.
+        """
+        use_cache = cached and self.cache is not None
+        entry = None
+        if use_cache:
+            if revalidate:
+                entry = self.cache.peek(path, params)
+            else:
+                hit, entry = self.cache.lookup(path, params)
+                if hit:
+                    return entry['body']
+
+        headers = {}
+        if revalidate and entry is not None and entry['status'] == 200:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        url = f"{self.base_url}{path}"
+        query = dict(params or {}, api_key=self.api_key)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                r = self._session().get(url, params=query, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                self._count("connection_errors")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if r.status_code == 200:
+                self._count("ok")
+                data = r.json()
+                if use_cache:
+                    self.cache.store(path, params, 200, data,
+                                     r.headers.get('ETag'), r.headers.get('Last-Modified'))
+                return data
+            if r.status_code == 304 and headers:
+                self._count("not_modified")
+                self.cache.touch(path, params)
+                return entry['body']
+            if r.status_code == 429:
+                self._count("rate_limited")
+                wait = retry_after_seconds(r.headers.get('Retry-After'))
+                wait = self._backoff(attempt) if wait is None else wait + random.uniform(0, self.backoff_base)
+                self.bucket.pause(wait)
+                continue
+            if r.status_code >= 500:
+                self._count("server_errors")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if r.status_code == 404:
+                self._count("not_found")
+                if use_cache:
+                    self.cache.store(path, params, 404, None)
+            else:
+                self._count("failed")
+            return None
+
+        self._count("failed")
+        return None
+
+    def movie_details(self, movie_id):
+        """/movie/{id} with credits and keywords (the shared, cacheable request)."""
+        return self.get(f"/movie/{movie_id}", MOVIE_DETAILS_PARAMS)
+
+    def map(self, fn, items):
+        """
+        Runs fn(item) on the pool and yields (item, result) in input order.
+        At most a few batches are in flight, so memory stays flat for huge ID lists.
+        """
+        window = self.concurrency * 4
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            for item in items:
+                pending.append((item, pool.submit(fn, item)))
+                if len(pending) >= window:
+                    done_item, future = pending.popleft()
+                    yield done_item, future.result()
+            while pending:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        s = self.stats
+        rate = s["requests"] / elapsed if elapsed > 0 else 0.0
+        return (f"{s['requests']} requests in {elapsed:.1f}s ({rate:.1f} req/s): "
+                f"{s['ok']} ok, {s['not_modified']} not modified, {s['rate_limited']} x 429, {s['retries']} retries, "
+                f"{s['server_errors']} x 5xx, {s['connection_errors']} connection errors, "
+                f"{s['not_found']} not found, {s['failed']} failed"
+                + (f"; {self.cache.summary()}" if self.cache is not None else ""))
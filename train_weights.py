@@ -1,57 +1,86 @@
 import pickle
+import os
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
-from feature_extractor import FeatureExtractor
+from movie_store import MovieStore
+from sparse_scorer import SparseScorer, FEATURE_NAMES
+from feature_cache import FeatureCache, file_digest, pair_keys
+from pair_store import PairStore, PAIRS_FILE, SEED, seeded_split
 
 # --- CONFIG ---
 MOVIES_FILE = "movie_vectors.pkl"
+STORE_FILE = "movie_store.bin"  # Preferred over MOVIES_FILE when present
 WEIGHTS_FILE = "keyword_weights.pkl"
-TRAINING_DATA = "training_pairs.csv"
+TRAINING_DATA = PAIRS_FILE
+TEST_SIZE = 0.2
 OUTPUT_MODEL = "learned_weights.pkl"
 
+def build_feature_matrix(store, keyword_weights, training_df, cache):
+    """
+    (pairs x 6) feature matrix + targets for every pair whose movies are in the store.
+    Pairs already in `cache` are read back; only new ones are computed, all at once
+    with SparseScorer.pair_features.
+    """
+    id_a = training_df['movie_A'].astype(np.int64).to_numpy()
+    id_b = training_df['movie_B'].astype(np.int64).to_numpy()
+    rows_a = pd.Series(id_a).map(store.index)
+    rows_b = pd.Series(id_b).map(store.index)
+    valid = (rows_a.notna() & rows_b.notna()).to_numpy()
+
+    missing_count = int((~valid).sum())
+    if missing_count > 0:
+        print(f"Skipped {missing_count} pairs (data missing).")
+
+    keys = pair_keys(id_a[valid], id_b[valid])
+    X, found = cache.lookup(keys)
+    new = ~found
+    print(f"Feature cache: {int(found.sum())} pairs cached, {int(new.sum())} to compute.")
+
+    if new.any():
+        scorer = SparseScorer.from_store(store, keyword_weights)
+        ra = rows_a.to_numpy()[valid][new].astype(np.int64)
+        rb = rows_b.to_numpy()[valid][new].astype(np.int64)
+        X[new] = scorer.pair_features(ra, rb)
+        cache.add(keys[new], X[new])
+
+    y = training_df['target'].astype(int).to_numpy()[valid]
+    return X, y
+
+def load_training_features(training_file=TRAINING_DATA):
+    """
+    Loads the catalog, keyword weights and pair store and returns (X, y) through the
+    feature cache, for training here or trying other models on the same features.
+    Pairs come out of the store deduplicated, in key order (splits shuffle them).
+    """
+    catalog_file = STORE_FILE if os.path.exists(STORE_FILE) else MOVIES_FILE
+    if catalog_file == STORE_FILE:
+        store = MovieStore.load(STORE_FILE)
+    else:
+        store = MovieStore.from_vectors(pickle.load(open(MOVIES_FILE, "rb")))
+    keyword_weights = pickle.load(open(WEIGHTS_FILE, "rb"))
+    if not os.path.exists(training_file):
+        raise FileNotFoundError(f"{training_file} not found (pair_store.py import <csv> migrates a pair CSV)")
+    with PairStore(training_file) as pairs:
+        training_df = pairs.load()
+
+    cache = FeatureCache(file_digest(catalog_file), file_digest(WEIGHTS_FILE))
+    print(f"Processing {len(training_df)} training pairs...")
+    return build_feature_matrix(store, keyword_weights, training_df, cache)
+
 def train():
-    # 1. Load Resources
+    # 1. Load Resources & 2. Build Feature Vectors
     print("Loading resources...")
     try:
-        movies_vec = pickle.load(open(MOVIES_FILE, "rb"))
-        keyword_weights = pickle.load(open(WEIGHTS_FILE, "rb"))
-        training_df = pd.read_csv(TRAINING_DATA)
+        X, y = load_training_features()
     except FileNotFoundError as e:
         print(f"Error: Missing file. {e}")
         return
 
-    # Create ID Lookup Map
-    movie_map = {m['id']: m for m in movies_vec}
-    extractor = FeatureExtractor(keyword_weights)
-
-    X = [] 
-    y = [] 
-    
-    print(f"Processing {len(training_df)} training pairs...")
-    
-    # 2. Build Feature Vectors
-    missing_count = 0
-    for index, row in training_df.iterrows():
-        id_A = int(row['movie_A'])
-        id_B = int(row['movie_B'])
-        target = int(row['target'])
-        
-        if id_A not in movie_map or id_B not in movie_map:
-            missing_count += 1
-            continue
-            
-        features = extractor.get_features(movie_map[id_A], movie_map[id_B])
-        X.append(features)
-        y.append(target)
-
-    if missing_count > 0:
-        print(f"Skipped {missing_count} pairs (data missing).")
-
-    # 3. Split & Validate
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # 3. Split & Validate (seeded permutation, so the same store always gives the same split)
+    train_idx, test_idx = seeded_split(len(y), TEST_SIZE, SEED)
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
 
     # --- THE FIX: Use LinearRegression ---
     # positive=True forces weights to be non-negative
@@ -74,7 +103,7 @@ def train():
     clf.fit(X, y)
 
     # 5. Extract and Normalize Weights
-    feature_names = ['Genres', 'Keywords', 'Cast', 'Director', 'Year', 'Rating']
+    feature_names = FEATURE_NAMES
     coefficients = clf.coef_ # LinearRegression stores weights here
     
     # Handle case where all weights are 0 (rare safety check)
@@ -1,65 +1,385 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, g, abort
 import sqlite3
 import pickle
+import os
+import threading
+import json
+import gzip
+import hashlib
+import time
+from topk_store import TopKStore
+from lru_cache import LRUCache
+from serving_bundle import ServingBundle
+from title_search import normalize, MAX_LIMIT as MAX_SEARCH_LIMIT
+from prometheus import REGISTRY, CONTENT_TYPE, Histogram, Sampled
 
 app = Flask(__name__)
 
-# --- LOAD ENRICHED DATA ---
-try:
-    # CHANGED: Load the final rich dataset
-    movies_data = pickle.load(open("movie_data_final.pkl", "rb"))
-    
-    # Dropdown Options (ID, Title, Poster)
-    MOVIE_OPTIONS = [{
-        'id': m['id'], 
-        'text': f"{m['title']} ({m['year']})",
-        'poster': m['poster_url']
-    } for m in movies_data]
-    
-    # Fast Lookup
-    MOVIE_LOOKUP = {m['id']: m for m in movies_data}
-    
-except FileNotFoundError:
-    print("Error: movie_data_final.pkl not found. Run create_final_data.py!")
-    MOVIE_OPTIONS = []
-    MOVIE_LOOKUP = {}
-
-def get_db_connection():
-    conn = sqlite3.connect('recommendations.db')
-    conn.row_factory = sqlite3.Row
+# --- METRICS ---
+# Scraped from /metrics (Prometheus text format)
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'nxt_http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method', 'status')))
+LOOKUP_LATENCY = REGISTRY.register(Histogram(
+    'nxt_recs_lookup_duration_seconds', 'Precomputed list lookups by backend (topk artifact or sqlite).',
+    ('backend',)))
+ONLINE_LATENCY = REGISTRY.register(Histogram(
+    'nxt_online_score_duration_seconds', 'Online scorer calls by number of seeds.', ('seeds',)))
+
+# NXT_PROFILE=<dir> writes one cProfile file per request there (debugging only, it is slow).
+# Sampling profilers need no hook: py-spy record -o web.svg -- python app.py
+if os.environ.get('NXT_PROFILE'):
+    from werkzeug.middleware.profiler import ProfilerMiddleware
+    os.makedirs(os.environ['NXT_PROFILE'], exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, stream=None, profile_dir=os.environ['NXT_PROFILE'])
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=request.endpoint or 'unmatched',
+                                method=request.method, status=response.status_code)
+    return response
+
+# --- LOAD CATALOG ---
+# serving_bundle.bin (python serving_bundle.py) is memory-mapped: workers boot in
+# milliseconds and share one copy of the catalog. Without it the same bundle is built
+# in memory from the pickles, which is slower but serves identically.
+BUNDLE_FILE = 'serving_bundle.bin'
+MOVIES_FILE = 'movie_data_final.pkl'
+LEARNED_WEIGHTS_FILE = 'learned_weights.pkl'
+KEYWORD_WEIGHTS_FILE = 'keyword_weights.pkl'
+
+def open_catalog():
+    if os.path.exists(BUNDLE_FILE):
+        if os.path.exists(MOVIES_FILE) and os.path.getmtime(MOVIES_FILE) > os.path.getmtime(BUNDLE_FILE):
+            print(f"Warning: {MOVIES_FILE} is newer than {BUNDLE_FILE}. Rebuild it with serving_bundle.py.")
+        try:
+            return ServingBundle.open(BUNDLE_FILE)
+        except ValueError as e:
+            print(f"Warning: {e}. Loading the pickles instead.")
+
+    try:
+        movies_data = pickle.load(open(MOVIES_FILE, "rb"))
+    except FileNotFoundError:
+        print("Error: movie_data_final.pkl not found. Run create_final_data.py!")
+        movies_data = []
+    try:
+        learned_weights = pickle.load(open(LEARNED_WEIGHTS_FILE, "rb"))
+        keyword_weights = pickle.load(open(KEYWORD_WEIGHTS_FILE, "rb"))
+    except FileNotFoundError as e:
+        print(f"Warning: {e.filename} not found. Online scoring disabled.")
+        learned_weights = keyword_weights = None
+    return ServingBundle.from_movies(movies_data, learned_weights, keyword_weights)
+
+CATALOG = open_catalog()
+
+# --- LOAD TOP-K ARTIFACT ---
+# recommendations.bin (written by compute_recommendations.py) answers lookups from
+# memory; recommendations.db stays as the fallback when it's missing.
+TOPK_FILE = 'recommendations.bin'
+DB_FILE = 'recommendations.db'
+CACHE_SIZE = int(os.environ.get('RECS_CACHE_SIZE', 2048))
+
+def db_build_id():
+    try:
+        conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM build_meta WHERE key = 'build_id'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+def open_topk_store():
+    try:
+        store = TopKStore(TOPK_FILE) if os.path.exists(TOPK_FILE) else None
+    except ValueError as e:
+        print(f"Warning: {e}. Falling back to SQLite.")
+        return None
+    # The precompute publishes the database first: an artifact from another build is stale
+    if store is not None and os.path.exists(DB_FILE) and store.build_id != db_build_id():
+        print(f"Warning: {TOPK_FILE} is from another build than {DB_FILE}. Falling back to SQLite.")
+        return None
+    return store
+
+TOPK_STORE = None
+# Hydrated recommendation lists, keyed by (generation, source_id, offset, limit)
+RESULT_CACHE = LRUCache(CACHE_SIZE)
+
+# Online scoring (CATALOG.online_scorer) answers movies without a precomputed list
+# and multi-movie watchlists at request time
+MAX_SEEDS = 20
+MAX_BATCH = 100  # Movies per /api/recommend/batch request
+MAX_PAGE = 25    # = TOP_K of the precompute, the longest stored list
+
+# --- GENERATION TRACKING ---
+# The precompute publishes both files with an atomic rename, so a new inode/mtime
+# means a new generation: reopen the artifact, reconnect and drop cached lists.
+_generation = None
+_generation_lock = threading.Lock()
+_local = threading.local()
+
+def recs_generation():
+    gen = []
+    for path in (TOPK_FILE, DB_FILE):
+        try:
+            st = os.stat(path)
+            gen.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            gen.append(None)
+    return tuple(gen)
+
+def current_generation():
+    global _generation, TOPK_STORE
+    gen = recs_generation()
+    if gen != _generation:
+        with _generation_lock:
+            if gen != _generation:
+                TOPK_STORE = open_topk_store()
+                RESULT_CACHE.clear()
+                _generation = gen
+    return gen
+
+def get_db_connection(gen):
+    """One read-only connection per worker thread, reopened when the database is republished."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.gen != gen:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+        _local.gen = gen
     return conn
 
+def get_recommendation_pages(source_ids, offset, limit, gen):
+    """
+    {source_id: [target_id, ...]} with entries offset..offset+limit of each stored list,
+    read for every source in one go. Sources without a stored list are left out
+    (one whose list ends before `offset` maps to []).
+    """
+    store = TOPK_STORE
+    if store is not None:
+        with LOOKUP_LATENCY.time(backend='topk'):
+            return {sid: [tid for tid, _ in entries]
+                    for sid, entries in store.lookup_many(source_ids, offset, limit).items()}
+    if gen[1] is None or not source_ids:
+        # No recommendations.db at all: nothing precomputed
+        return {}
+
+    with LOOKUP_LATENCY.time(backend='sqlite'):
+        conn = get_db_connection(gen)
+        # rank 0 is always read, so a source whose page is empty still shows up
+        query = (f"SELECT source_id, rank, target_id FROM preds WHERE source_id IN ({','.join('?' * len(source_ids))}) "
+                 "AND (rank = 0 OR (rank >= ? AND rank < ?)) ORDER BY source_id, rank")
+        rows = conn.execute(query, (*source_ids, offset, offset + limit)).fetchall()
+    pages = {}
+    for row in rows:
+        page = pages.setdefault(row['source_id'], [])
+        if row['rank'] >= offset:
+            page.append(row['target_id'])
+    return pages
+
+def online_recommend(seed_ids, limit):
+    with ONLINE_LATENCY.time(seeds='1' if len(seed_ids) == 1 else 'many'):
+        return [tid for tid, _ in CATALOG.online_scorer.recommend(seed_ids, limit)]
+
+def hydrate(target_ids):
+    results = []
+    for target_id in target_ids:
+        # {title, poster, overview, url}, serialized when the bundle was built
+        card = CATALOG.card(target_id)
+        if card:
+            results.append(card)
+    return results
+
+def get_recommendation_batch(source_ids, offset=0, limit=10):
+    """
+    {source_id: (hydrated page, has_more)} for several movies. Pages already in
+    RESULT_CACHE are reused; the rest come from one read of the stored lists, and
+    movies without a precomputed list (e.g. added after the last build) are scored online.
+    """
+    gen = current_generation()
+    pages = {}
+    missing = []
+    for source_id in dict.fromkeys(source_ids):
+        page = RESULT_CACHE.get((gen, source_id, offset, limit))
+        if page is None:
+            missing.append(source_id)
+        else:
+            pages[source_id] = page
+
+    if missing:
+        # One entry past the page tells whether there is another one
+        stored = get_recommendation_pages(missing, offset, limit + 1, gen)
+        for source_id in missing:
+            target_ids = stored.get(source_id)
+            if target_ids is None:
+                target_ids = []
+                if CATALOG.online_scorer is not None:
+                    target_ids = online_recommend([source_id], offset + limit + 1)[offset:]
+            page = (hydrate(target_ids[:limit]), len(target_ids) > limit)
+            RESULT_CACHE.put((gen, source_id, offset, limit), page)
+            pages[source_id] = page
+    return pages
+
+def get_recommendations(source_id, limit=10, offset=0):
+    """Hydrated recommendation list of one movie, served from RESULT_CACHE when possible."""
+    return get_recommendation_batch([source_id], offset, limit)[source_id][0]
+
+def get_watchlist_recommendations(seed_ids, limit=10):
+    """Recommendations for several seed movies at once, scored online and cached."""
+    if CATALOG.online_scorer is None:
+        return []
+    gen = current_generation()
+    key = (gen, 'watchlist', tuple(sorted(set(seed_ids))), limit)
+    results = RESULT_CACHE.get(key)
+    if results is None:
+        results = hydrate(online_recommend(seed_ids, limit))
+        RESULT_CACHE.put(key, results)
+    return results
+
+# --- PRE-SERIALIZED JSON RESPONSES ---
+class JSONPayload:
+    """A JSON body serialized once, with its gzip variant and a content-hash ETag."""
+    def __init__(self, obj=None, body=None, gzipped=None):
+        # Either an object to serialize, or an already serialized body (+ its gzip)
+        self.body = json.dumps(obj, separators=(',', ':')).encode() if body is None else body
+        self.gzipped = gzip.compress(self.body, compresslevel=6) if gzipped is None else gzipped
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+
+    def response(self, max_age=3600):
+        if request.if_none_match.contains(self.etag):
+            resp = Response(status=304)
+        elif 'gzip' in request.accept_encodings and len(self.gzipped) < len(self.body):
+            resp = Response(self.gzipped, mimetype='application/json')
+            resp.headers['Content-Encoding'] = 'gzip'
+        else:
+            resp = Response(self.body, mimetype='application/json')
+        resp.set_etag(self.etag)
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.headers['Cache-Control'] = f'public, max-age={max_age}'
+        return resp
+
+_all_movies_payload = None
+
+def all_movies_payload():
+    # Built on first use: only old clients still fetch the whole option list
+    global _all_movies_payload
+    if _all_movies_payload is None:
+        body, gzipped = CATALOG.payload
+        _all_movies_payload = JSONPayload(body=body, gzipped=gzipped)
+    return _all_movies_payload
+
+def warm():
+    """Builds everything that is otherwise loaded on first use (gunicorn.conf.py, before forking)."""
+    CATALOG.warm()
+    all_movies_payload()
+
+# (normalized query, clamped limit) -> JSONPayload; the catalog is static for the process lifetime
+SEARCH_CACHE = LRUCache(int(os.environ.get('SEARCH_CACHE_SIZE', 4096)))
+
+CACHES = {'results': RESULT_CACHE, 'search': SEARCH_CACHE}
+
+def _cache_stat(stat):
+    return lambda: {(name,): cache.stats()[stat] for name, cache in CACHES.items()}
+
+for _stat, _kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('size', 'gauge')):
+    REGISTRY.register(Sampled(f"nxt_cache_{_stat}" + ('_total' if _kind == 'counter' else ''),
+                              f"LRU cache {_stat}.", _kind, _cache_stat(_stat), ('cache',)))
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/api/movies')
 def api_movies():
-    return jsonify({'results': MOVIE_OPTIONS})
+    """
+    /api/movies?q=<text>&limit=<n> returns the top matches (default 20, max 50).
+    Without q, the full option list (precompressed) for old clients.
+    """
+    query = request.args.get('q')
+    if query is None:
+        return all_movies_payload().response()
+
+    # Same key for every spelling/limit that gives the same result ("Star  Wars", "star wars")
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_SEARCH_LIMIT))
+    key = (normalize(query), limit)
+    payload = SEARCH_CACHE.get(key)
+    if payload is None:
+        payload = JSONPayload({'results': CATALOG.title_index.search(query, limit)})
+        SEARCH_CACHE.put(key, payload)
+    return payload.response()
+
+@app.errorhandler(400)
+def bad_request(e):
+    return jsonify({'error': e.description}), 400
+
+def json_body():
+    """The request's JSON object, or a 400."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Expected a JSON object body")
+    return data
+
+def int_arg(value, name):
+    """int(value), or a 400 naming the field (a bad ID or page size is the client's error, not a 500)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        abort(400, description=f"'{name}' must be an integer")
+
+def id_list(data, max_ids):
+    ids = data.get('movie_ids', [])
+    if not isinstance(ids, list):
+        abort(400, description="'movie_ids' must be a list")
+    return [int_arg(mid, 'movie_ids') for mid in ids[:max_ids]]
+
+def page_args(data, default_limit=10):
+    """(offset, limit) from the body; negative offsets clamp to 0, limits to [1, MAX_PAGE]."""
+    offset = max(0, int_arg(data.get('offset', 0), 'offset'))
+    limit = max(1, min(int_arg(data.get('limit', default_limit), 'limit'), MAX_PAGE))
+    return offset, limit
 
 @app.route('/api/recommend', methods=['POST'])
 def api_recommend():
-    data = request.json
-    source_id = int(data.get('movie_id'))
-    
-    conn = get_db_connection()
-    query = "SELECT target_id, score FROM preds WHERE source_id = ? ORDER BY score DESC LIMIT 10"
-    cursor = conn.execute(query, (source_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    results = []
-    for row in rows:
-        movie = MOVIE_LOOKUP.get(row['target_id'])
-        if movie:
-            results.append({
-                'title': f"{movie['title']} ({movie['year']})",
-                'poster': movie['poster_url'],
-                'overview': movie['overview'],    # NEW
-                'url': movie['tmdb_url']
-            })
-        
-    return jsonify({'recommendations': results})
+    """
+    Body: {"movie_id": id} for one movie, or {"movie_ids": [ids]} for a watchlist.
+    Optional "limit" (default 10, max 25), and "offset" into a single movie's stored list.
+    """
+    data = json_body()
+    offset, limit = page_args(data)
+    if data.get('movie_ids'):
+        seed_ids = id_list(data, MAX_SEEDS)
+        if len(seed_ids) > 1:
+            return jsonify({'recommendations': get_watchlist_recommendations(seed_ids, limit)})
+        source_id = seed_ids[0]
+    else:
+        source_id = int_arg(data.get('movie_id'), 'movie_id')
+    return jsonify({'recommendations': get_recommendations(source_id, limit, offset)})
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def api_recommend_batch():
+    """
+    Body: {"movie_ids": [ids], "offset": 0, "limit": 10} (up to 100 movies, limit max 25).
+    One page of every movie's list, in request order:
+    {"results": [{"movie_id", "recommendations", "has_more"}, ...]}
+    """
+    data = json_body()
+    offset, limit = page_args(data)
+    source_ids = list(dict.fromkeys(id_list(data, MAX_BATCH)))
+    pages = get_recommendation_batch(source_ids, offset, limit)
+    return jsonify({'results': [{'movie_id': sid, 'recommendations': pages[sid][0], 'has_more': pages[sid][1]}
+                                for sid in source_ids]})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
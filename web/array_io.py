@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The repo's array file format, from array_file.py in the repo root (one implementation
+# for the pipeline that writes the files and the app that maps them). web/ runs from a
+# checkout of the whole repo, so the root only needs to be importable.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+
+from array_file import save_arrays as write_arrays, load_arrays
+
+def map_arrays(path):
+    """({name: read-only memory-mapped ndarray}, meta). Costs one header read."""
+    return load_arrays(path, mmap=True)
@@ -0,0 +1,51 @@
+import argparse
+import pickle
+import random
+import time
+import numpy as np
+from online_scorer import OnlineScorer
+
+# Latency benchmark for the online scorer, on the same files the app loads.
+# Usage (from web/): python bench_online.py --queries 2000 --seeds 1 5
+
+MOVIES_FILE = "movie_data_final.pkl"
+LEARNED_WEIGHTS_FILE = "learned_weights.pkl"
+KEYWORD_WEIGHTS_FILE = "keyword_weights.pkl"
+
+def percentiles(samples_ms):
+    a = np.array(samples_ms)
+    return {p: float(np.percentile(a, p)) for p in (50, 90, 99)} | {'max': float(a.max())}
+
+def main():
+    parser = argparse.ArgumentParser(description="Online scorer latency (p50/p90/p99).")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per watchlist size")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 5], help="Watchlist sizes to test")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed for the query mix")
+    args = parser.parse_args()
+
+    movies = pickle.load(open(MOVIES_FILE, "rb"))
+    learned_weights = pickle.load(open(LEARNED_WEIGHTS_FILE, "rb"))
+    keyword_weights = pickle.load(open(KEYWORD_WEIGHTS_FILE, "rb"))
+
+    start = time.perf_counter()
+    scorer = OnlineScorer(movies, learned_weights, keyword_weights)
+    print(f"Built online scorer for {len(scorer.ids)} movies in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(args.seed)
+    ids = scorer.ids.tolist()
+    for n_seeds in args.seeds:
+        queries = [rng.sample(ids, n_seeds) for _ in range(args.queries)]
+        for q in queries[:20]:  # warm-up
+            scorer.recommend(q, args.k)
+        samples = []
+        for q in queries:
+            t = time.perf_counter()
+            scorer.recommend(q, args.k)
+            samples.append((time.perf_counter() - t) * 1000)
+        p = percentiles(samples)
+        print(f"{n_seeds} seed(s): p50 {p[50]:.2f} ms, p90 {p[90]:.2f} ms, "
+              f"p99 {p[99]:.2f} ms, max {p['max']:.2f} ms ({args.queries} queries)")
+
+if __name__ == "__main__":
+    main()
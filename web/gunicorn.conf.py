@@ -0,0 +1,16 @@
+import gc
+import os
+
+# gunicorn -c gunicorn.conf.py app:app   (from web/)
+# The app is loaded once in the master and workers are forked from it, so they start
+# with the catalog bundle mapped and the lazy parts (title index, online scorer) built.
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', 4))
+preload_app = True
+
+def when_ready(server):
+    import app
+    app.warm()
+    # Objects created so far move to the permanent generation: the collector then never
+    # touches (and un-shares) the pages the workers inherited from the master.
+    gc.freeze()
@@ -0,0 +1,216 @@
+import numpy as np
+
+# Same feature order as FeatureExtractor / learned_weights.pkl
+FEATURE_NAMES = ['Genres', 'Keywords', 'Cast', 'Director', 'Year', 'Rating']
+
+FIELDS = ['genres', 'directors', 'keywords', 'cast']
+
+class _Postings:
+    """
+    One token type as flat CSR arrays in both directions:
+    movie position -> its tokens (fwd_*), token -> movie positions (ptr/rows/values).
+    Only arrays, so a scorer can be written to and memory-mapped from a file.
+    """
+    ARRAYS = ['fwd_ptr', 'fwd_tok', 'fwd_val', 'ptr', 'rows', 'values']
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, token_lists, value_lists=None):
+        """Returns (postings, {token: token index}); each movie keeps its tokens' given order."""
+        vocab = {}
+        fwd_tok, fwd_val, fwd_ptr = [], [], [0]
+        for pos, tokens in enumerate(token_lists):
+            values = value_lists[pos] if value_lists is not None else [1.0] * len(tokens)
+            for tok, val in zip(tokens, values):
+                fwd_tok.append(vocab.setdefault(tok, len(vocab)))
+                fwd_val.append(val)
+            fwd_ptr.append(len(fwd_tok))
+
+        fwd_ptr = np.array(fwd_ptr, dtype=np.int64)
+        fwd_tok = np.array(fwd_tok, dtype=np.int64)
+        fwd_val = np.array(fwd_val, dtype=np.float64)
+        # Stable sort: each token's movies stay in position order
+        order = np.argsort(fwd_tok, kind='stable')
+        rows = np.repeat(np.arange(len(token_lists), dtype=np.int32), np.diff(fwd_ptr))[order]
+        ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(np.bincount(fwd_tok, minlength=len(vocab)))
+        return cls({'fwd_ptr': fwd_ptr, 'fwd_tok': fwd_tok, 'fwd_val': fwd_val,
+                    'ptr': ptr, 'rows': rows, 'values': fwd_val[order]}), vocab
+
+    def tokens(self, pos):
+        """(token indexes, values) of the movie at `pos`."""
+        lo, hi = self.fwd_ptr[pos], self.fwd_ptr[pos + 1]
+        return self.fwd_tok[lo:hi], self.fwd_val[lo:hi]
+
+    def gather(self, tokens):
+        """(movie positions, entry values, index into `tokens`) for every posting of `tokens`."""
+        starts = self.ptr[tokens]
+        lens = self.ptr[tokens + 1] - starts
+        which = np.repeat(np.arange(len(tokens)), lens)
+        idx = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+        return self.rows[idx], self.values[idx], which
+
+class OnlineScorer:
+    """
+    Request-time scorer over the catalog the app already holds in memory.
+    Inverted indexes per token type turn a seed's genres/keywords/cast/directors into
+    per-movie overlap sums with a few bincounts, and the dense year/rating columns
+    cover the rest, so one query touches only the seed's posting lists plus O(n) numpy.
+    Scores match the precompute (same formulas, same genre filter and tie-breaking).
+    Everything lives in flat arrays (to_arrays/from_arrays), so the scorer can be
+    served from a memory-mapped bundle shared by every worker.
+    """
+    _VECTORS = ['ids', 'sorted_ids', 'sorted_pos', 'weights', 'keyword_token_w', 'genre_size',
+                'director_size', 'keyword_mass', 'cast_mass', 'year', 'rating']
+
+    def __init__(self, movies, learned_weights, keyword_weights, genre_filter=True):
+        self._attach(self.build_arrays(movies, learned_weights, keyword_weights), genre_filter)
+
+    @staticmethod
+    def build_arrays(movies, learned_weights, keyword_weights):
+        # Same de-duplication as the precompute (last copy of an ID wins)
+        movies = list({m['id']: m for m in movies}.values())
+        ids = np.array([m['id'] for m in movies], dtype=np.int64)
+        arrays = {
+            'ids': ids,
+            'sorted_pos': np.argsort(ids, kind='stable'),
+            'weights': np.array([learned_weights.get(name, 0) for name in FEATURE_NAMES], dtype=np.float64),
+        }
+        arrays['sorted_ids'] = ids[arrays['sorted_pos']]
+
+        # Token order per movie matters: it fixes the summation order of the float features
+        token_lists = {
+            'genres': [sorted(m['genres']) for m in movies],
+            'directors': [sorted(m['directors']) for m in movies],
+            'keywords': [sorted(m['keywords']) for m in movies],
+            'cast': [list(m['cast']) for m in movies],
+        }
+        for field in FIELDS:
+            values = [list(m['cast'].values()) for m in movies] if field == 'cast' else None
+            postings, vocab = _Postings.build(token_lists[field], values)
+            for name in _Postings.ARRAYS:
+                arrays[f"{field}.{name}"] = getattr(postings, name)
+            if field == 'keywords':
+                arrays['keyword_token_w'] = np.array([keyword_weights.get(k, 0) for k in vocab], dtype=np.float64)
+
+        arrays['genre_size'] = np.array([len(m['genres']) for m in movies], dtype=np.float64)
+        arrays['director_size'] = np.array([len(m['directors']) for m in movies], dtype=np.float64)
+        arrays['keyword_mass'] = np.array([sum(keyword_weights.get(k, 0) for k in m['keywords']) for m in movies],
+                                          dtype=np.float64)
+        arrays['cast_mass'] = np.array([sum(m['cast'].values()) for m in movies], dtype=np.float64)
+        arrays['year'] = np.array([m['year'] for m in movies], dtype=np.float64)
+        arrays['rating'] = np.array([m['rating'] for m in movies], dtype=np.float64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, genre_filter=True):
+        """Wraps existing arrays (e.g. memory-mapped) without copying them."""
+        self = cls.__new__(cls)
+        self._attach(arrays, genre_filter)
+        return self
+
+    def to_arrays(self):
+        arrays = {name: getattr(self, name) for name in self._VECTORS}
+        for field in FIELDS:
+            postings = getattr(self, field)
+            for name in _Postings.ARRAYS:
+                arrays[f"{field}.{name}"] = getattr(postings, name)
+        return arrays
+
+    def _attach(self, arrays, genre_filter):
+        for name in self._VECTORS:
+            setattr(self, name, arrays[name])
+        for field in FIELDS:
+            setattr(self, field, _Postings({name: arrays[f"{field}.{name}"] for name in _Postings.ARRAYS}))
+        self.genre_filter = genre_filter
+
+    def position(self, movie_id):
+        i = int(np.searchsorted(self.sorted_ids, movie_id))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == movie_id:
+            return int(self.sorted_pos[i])
+        return None
+
+    def __contains__(self, movie_id):
+        return self.position(movie_id) is not None
+
+    def _jaccard(self, postings, sizes, seed_pos):
+        tokens, _ = postings.tokens(seed_pos)
+        rows, _, _ = postings.gather(tokens)
+        inter = np.bincount(rows, minlength=len(self.ids)).astype(np.float64)
+        size = sizes[seed_pos]
+        union = size + sizes - inter
+        return np.divide(inter, union, out=np.zeros_like(inter), where=(size > 0) & (sizes > 0) & (union > 0))
+
+    def features(self, seed_pos):
+        """The 6 feature columns of one seed against every movie, shape (6, n)."""
+        n = len(self.ids)
+
+        genre = self._jaccard(self.genres, self.genre_size, seed_pos)
+        director = self._jaccard(self.directors, self.director_size, seed_pos)
+
+        # Keywords: weighted Jaccard (num = weight mass of the shared keywords)
+        kws, _ = self.keywords.tokens(seed_pos)
+        rows, _, which = self.keywords.gather(kws)
+        kw_w = self.keyword_token_w[kws]
+        num = np.bincount(rows, weights=kw_w[which] if len(rows) else None, minlength=n)
+        den = self.keyword_mass[seed_pos] + self.keyword_mass - num
+        keyword = np.divide(num, den, out=np.zeros(n), where=den > 1e-12)
+
+        # Cast: average numerator / max denominator (sum max = sum A + sum B - sum min)
+        actors, seed_scores = self.cast.tokens(seed_pos)
+        rows, tgt_score, which = self.cast.gather(actors)
+        src_score = seed_scores[which] if len(rows) else np.zeros(0)
+        num = np.bincount(rows, weights=(src_score + tgt_score) / 2, minlength=n)
+        shared_min = np.bincount(rows, weights=np.minimum(src_score, tgt_score), minlength=n)
+        den = self.cast_mass[seed_pos] + self.cast_mass - shared_min
+        cast = np.divide(num, den, out=np.zeros(n), where=den > 1e-12)
+
+        # Year: Gaussian decay, Rating: linear decay (0 = unknown)
+        y = self.year[seed_pos]
+        year = np.exp(-((y - self.year) ** 2) / 100.0)
+        year[(y == 0) | (self.year == 0)] = 0.0
+        r = self.rating[seed_pos]
+        rating = np.maximum(0.0, 1.0 - np.abs(r - self.rating) / 10.0)
+        rating[(r == 0) | (self.rating == 0)] = 0.0
+
+        return np.vstack([genre, keyword, cast, director, year, rating])
+
+    def _combine(self, feats):
+        # Accumulated in feature order like the precompute, so equal pairs tie exactly
+        score = np.zeros(feats.shape[1])
+        for f, w in zip(feats, self.weights):
+            if w:
+                score += f * w
+        return score
+
+    def recommend(self, seed_ids, k=10):
+        """
+        [(target_id, score)] for one seed or a watchlist of several, best first.
+        With several seeds a movie's score is the mean of its per-seed scores, counting
+        a seed it isn't eligible for (no shared genre, or nothing shared) as 0.
+        Seeds themselves are never recommended; unknown seed IDs are ignored.
+        """
+        seeds = [p for p in map(self.position, dict.fromkeys(seed_ids)) if p is not None]
+        if not seeds or k <= 0:
+            return []
+
+        total = np.zeros(len(self.ids))
+        eligible = np.zeros(len(self.ids), dtype=bool)
+        for pos in seeds:
+            feats = self.features(pos)
+            ok = feats[0] > 0 if self.genre_filter else (feats[:4] > 0).any(axis=0)
+            total += np.where(ok, self._combine(feats), 0.0)
+            eligible |= ok
+        scores = total / len(seeds)
+        eligible[seeds] = False
+
+        cand = np.nonzero(eligible)[0]
+        if len(cand) > k:
+            # Everything tied with the k-th best competes for the last slots
+            kth = np.partition(-scores[cand], k - 1)[k - 1]
+            cand = cand[-scores[cand] <= kth]
+        order = np.lexsort((self.ids[cand], -scores[cand]))[:k]
+        return [(int(self.ids[c]), float(scores[c])) for c in cand[order]]
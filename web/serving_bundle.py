@@ -0,0 +1,164 @@
+import argparse
+import gzip
+import json
+import pickle
+import time
+from functools import cached_property
+import numpy as np
+from array_io import map_arrays, write_arrays
+from online_scorer import OnlineScorer
+from title_search import TitleIndex
+
+# Prebuilt, read-only serving bundle: everything app.py needs from movie_data_final.pkl
+# and the weight files, as flat arrays in one memory-mappable file.
+#   python serving_bundle.py   (from web/, after fetch_final_data.py / train_weights.py)
+# Workers map it instead of unpickling the catalog, so boot is O(header) and every
+# worker shares the same page cache instead of holding its own copy.
+
+# --- CONFIG ---
+BUNDLE_FILE = "serving_bundle.bin"
+MOVIES_FILE = "movie_data_final.pkl"
+LEARNED_WEIGHTS_FILE = "learned_weights.pkl"
+KEYWORD_WEIGHTS_FILE = "keyword_weights.pkl"
+
+def _blob(chunks):
+    """Concatenates byte strings into (uint8 blob, int64 offsets)."""
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(c) for c in chunks])
+    return np.frombuffer(b"".join(chunks), dtype=np.uint8), offsets
+
+def _json(obj):
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+def build_arrays(movies, learned_weights=None, keyword_weights=None):
+    """
+    ({name: ndarray}, meta) for a catalog (the movie_data_final.pkl list).
+    - cards: the hydrated recommendation entry of every movie, pre-serialized, by sorted ID
+    - payload: the full /api/movies response body and its gzip variant
+    - popularity: per dropdown option, for the title index (NaN = not fetched)
+    - scorer.*: the online scorer, when both weight files are given
+    """
+    lookup = {m['id']: m for m in movies}  # Last copy of an ID wins, like everywhere else
+    ids = np.array(sorted(lookup), dtype=np.int64)
+    cards, card_offsets = _blob([_json({
+        'title': f"{m['title']} ({m['year']})",
+        'poster': m['poster_url'],
+        'overview': m['overview'],
+        'url': m['tmdb_url'],
+    }) for m in (lookup[mid] for mid in ids.tolist())])
+
+    body = _json({'results': [{
+        'id': m['id'],
+        'text': f"{m['title']} ({m['year']})",
+        'poster': m['poster_url'],
+    } for m in movies]})
+
+    arrays = {
+        'ids': ids,
+        'cards': cards,
+        'card_offsets': card_offsets,
+        'payload': np.frombuffer(body, dtype=np.uint8),
+        'payload_gzip': np.frombuffer(gzip.compress(body, compresslevel=6), dtype=np.uint8),
+        'popularity': np.array([m.get('popularity', np.nan) for m in movies], dtype=np.float64),
+    }
+    has_scorer = learned_weights is not None and keyword_weights is not None
+    if has_scorer:
+        for name, arr in OnlineScorer.build_arrays(movies, learned_weights, keyword_weights).items():
+            arrays[f"scorer.{name}"] = arr
+    return arrays, {"kind": "serving_bundle", "movies": len(ids), "online_scorer": has_scorer}
+
+class ServingBundle:
+    """
+    Read-only catalog view for the web tier. Card lookups are a binary search plus a
+    slice of the cards blob; the title index, the option list and the online scorer
+    are only built on first use (warm() builds them up front, e.g. before forking).
+    """
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        self.ids = arrays['ids']
+
+    @classmethod
+    def open(cls, path=BUNDLE_FILE):
+        arrays, meta = map_arrays(path)
+        if meta.get("kind") != "serving_bundle":
+            raise ValueError(f"{path} is not a serving bundle")
+        return cls(arrays, meta)
+
+    @classmethod
+    def from_movies(cls, movies, learned_weights=None, keyword_weights=None):
+        """Same bundle built in memory (no prebuilt file)."""
+        return cls(*build_arrays(movies, learned_weights, keyword_weights))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, movie_id):
+        i = int(np.searchsorted(self.ids, movie_id))
+        if i < len(self.ids) and self.ids[i] == movie_id:
+            return i
+        return None
+
+    def __contains__(self, movie_id):
+        return self.position(movie_id) is not None
+
+    def card_bytes(self, movie_id):
+        """Pre-serialized {title, poster, overview, url} JSON of a movie, or None."""
+        i = self.position(movie_id)
+        if i is None:
+            return None
+        offsets = self.arrays['card_offsets']
+        return self.arrays['cards'][offsets[i]:offsets[i + 1]].tobytes()
+
+    def card(self, movie_id):
+        raw = self.card_bytes(movie_id)
+        return None if raw is None else json.loads(raw)
+
+    @cached_property
+    def payload(self):
+        """(body, gzipped body) of the full /api/movies response."""
+        return self.arrays['payload'].tobytes(), self.arrays['payload_gzip'].tobytes()
+
+    @cached_property
+    def options(self):
+        return json.loads(self.arrays['payload'].tobytes())['results']
+
+    @cached_property
+    def title_index(self):
+        popularity = self.arrays['popularity']
+        return TitleIndex(self.options, {o['id']: float(p) for o, p in zip(self.options, popularity.tolist())
+                                         if not np.isnan(p)})
+
+    @cached_property
+    def online_scorer(self):
+        if not self.meta.get("online_scorer"):
+            return None
+        prefix = "scorer."
+        return OnlineScorer.from_arrays({name[len(prefix):]: arr for name, arr in self.arrays.items()
+                                         if name.startswith(prefix)})
+
+    def warm(self):
+        """Builds every lazy part now (call in the master before forking workers)."""
+        for name in ('payload', 'title_index', 'online_scorer'):
+            getattr(self, name)
+
+def save_bundle(path, movies, learned_weights=None, keyword_weights=None):
+    arrays, meta = build_arrays(movies, learned_weights, keyword_weights)
+    write_arrays(path, arrays, meta)
+    return meta
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mapped serving bundle for the web app.")
+    parser.add_argument("--output", default=BUNDLE_FILE)
+    args = parser.parse_args()
+
+    start = time.time()
+    movies = pickle.load(open(MOVIES_FILE, "rb"))
+    try:
+        learned_weights = pickle.load(open(LEARNED_WEIGHTS_FILE, "rb"))
+        keyword_weights = pickle.load(open(KEYWORD_WEIGHTS_FILE, "rb"))
+    except FileNotFoundError as e:
+        print(f"Warning: {e.filename} not found. Bundle built without the online scorer.")
+        learned_weights = keyword_weights = None
+    meta = save_bundle(args.output, movies, learned_weights, keyword_weights)
+    print(f"SUCCESS: {meta['movies']} movies bundled into {args.output} in {time.time() - start:.1f}s.")
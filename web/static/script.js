@@ -8,7 +8,7 @@ document.addEventListener("DOMContentLoaded", function () {
         placeholder: "Type a movie name...",
 
         load: function (query, callback) {
-            fetch('/api/movies')
+            fetch('/api/movies?q=' + encodeURIComponent(query) + '&limit=20')
                 .then(r => r.json())
                 .then(d => callback(d.results))
                 .catch(() => callback());
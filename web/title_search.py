@@ -0,0 +1,68 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+SHORT_PREFIX = 2  # Queries up to this length are answered from precomputed word-prefix lists
+MAX_LIMIT = 50
+
+def normalize(text):
+    """Lowercase, strip accents, collapse everything that isn't a letter/digit to one space."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^0-9a-z]+', ' ', text.lower()).strip()
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TitleIndex:
+    """
+    In-memory title search over the dropdown options.
+    Entries are stored in popularity order, so a position doubles as the rank and every
+    posting list is already sorted best-first: a search walks the shortest list and
+    stops as soon as it has `limit` verified matches.
+    - 1-2 characters: precomputed top matches per word prefix
+    - 3+ characters: rarest trigram posting list, then a substring check
+    """
+    def __init__(self, options, popularity=None):
+        # options: [{'id', 'text', 'poster'}], popularity: {id: score} (default: given order)
+        order = list(range(len(options)))
+        if popularity:
+            order.sort(key=lambda i: (-popularity.get(options[i]['id'], 0), i))
+        self.entries = [options[i] for i in order]
+        self.titles = [normalize(e['text']) for e in self.entries]
+
+        self.grams = defaultdict(list)
+        self.short = defaultdict(list)
+        for pos, title in enumerate(self.titles):
+            for gram in trigrams(title):
+                self.grams[gram].append(pos)
+            seen = set()
+            for word in title.split():
+                for n in range(1, SHORT_PREFIX + 1):
+                    prefix = word[:n]
+                    if len(prefix) == n and prefix not in seen and len(self.short[prefix]) < MAX_LIMIT:
+                        seen.add(prefix)
+                        self.short[prefix].append(pos)
+
+    def search(self, query, limit=20):
+        """Returns up to `limit` option dicts matching `query`, most popular first."""
+        q = normalize(query)
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not q:
+            return self.entries[:limit]
+        if len(q) <= SHORT_PREFIX:
+            return [self.entries[pos] for pos in self.short.get(q, [])[:limit]]
+
+        # Every trigram of q occurs in a matching title, so the rarest one bounds the scan;
+        # the substring check on that short list is exact.
+        postings = [self.grams.get(q[i:i + 3], []) for i in range(len(q) - 2)]
+        shortest = min(postings, key=len)
+
+        results = []
+        for pos in shortest:
+            if q in self.titles[pos]:
+                results.append(self.entries[pos])
+                if len(results) == limit:
+                    break
+        return results
@@ -0,0 +1,58 @@
+import numpy as np
+from array_io import map_arrays
+
+# Reader for the recommendations.bin artifact written by compute_recommendations.export_topk.
+
+class TopKStore:
+    """
+    Memory-mapped Top-K lists. Opening costs one header read; a lookup is a binary
+    search over the sorted source IDs plus an array slice, with no database round trip.
+    Nothing is copied into the process, so every worker shares the same page cache.
+    """
+    def __init__(self, path):
+        arrays, meta = map_arrays(path)
+        if meta.get("kind") != "topk":
+            raise ValueError(f"{path} is not a Top-K artifact")
+
+        self.path = path
+        self.build_id = meta.get("build_id")  # Same as build_meta.build_id of the database it came from
+        self.source_ids = arrays["source_ids"]  # sorted, position = index into offsets
+        self.offsets = arrays["offsets"]
+        self.targets = arrays["targets"]
+        self.scores = arrays["scores"]
+
+    def position(self, source_id):
+        i = int(np.searchsorted(self.source_ids, source_id))
+        if i < len(self.source_ids) and self.source_ids[i] == source_id:
+            return i
+        return None
+
+    def lookup(self, source_id, limit=None):
+        """Returns [(target_id, score), ...] best first ([] for unknown movies)."""
+        i = self.position(source_id)
+        if i is None:
+            return []
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return list(zip(self.targets[start:end].tolist(), self.scores[start:end].tolist()))
+
+    def lookup_many(self, source_ids, offset=0, limit=None):
+        """
+        {source_id: [(target_id, score), ...]} holding entries offset..offset+limit of
+        each list, for every known ID (one vectorized search for the whole batch).
+        """
+        ids = np.asarray(source_ids, dtype=np.int64)
+        if not len(self.source_ids) or not len(ids):
+            return {}
+        pos = np.minimum(np.searchsorted(self.source_ids, ids), len(self.source_ids) - 1)
+        found = self.source_ids[pos] == ids
+
+        pages = {}
+        for source_id, i in zip(ids[found].tolist(), pos[found].tolist()):
+            end = int(self.offsets[i + 1])
+            start = min(int(self.offsets[i]) + offset, end)
+            if limit is not None:
+                end = min(end, start + limit)
+            pages[source_id] = list(zip(self.targets[start:end].tolist(), self.scores[start:end].tolist()))
+        return pages